@@ -0,0 +1,127 @@
+"""Write an analysis into a DOCX: a summary section plus native Word comments.
+
+Anchors are chosen beforehand against the original document (see
+docx_processing._annotate_document), so this module never searches the
+document. Comment ids are allocated once, and every comment and range marker
+is spliced in with constant-time XML operations. Annotation time therefore
+grows linearly with the number of issues.
+"""
+import copy
+import datetime as dt
+from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import OxmlElement, parse_xml
+from docx.oxml.ns import nsdecls, qn
+from docx.text.paragraph import Paragraph
+import config
+
+_COMMENT_TEMPLATE = parse_xml(
+    f'<w:comment {nsdecls("w")} w:id="0" w:author="">'
+    '<w:p><w:pPr><w:pStyle w:val="CommentText"/></w:pPr>'
+    '<w:r><w:rPr><w:rStyle w:val="CommentReference"/></w:rPr><w:annotationRef/></w:r></w:p>'
+    '</w:comment>'
+)
+_REFERENCE_RUN = parse_xml(
+    f'<w:r {nsdecls("w")}><w:rPr><w:rStyle w:val="CommentReference"/></w:rPr>'
+    '<w:commentReference w:id="0"/></w:r>'
+)
+
+
+def _text_run(text):
+    run = OxmlElement("w:r")
+    t = OxmlElement("w:t")
+    t.text = text
+    t.set("{http://www.w3.org/XML/1998/namespace}space", "preserve")
+    run.append(t)
+    return run
+
+
+def _new_comment(comment_id, lines, date):
+    comment = copy.deepcopy(_COMMENT_TEMPLATE)
+    comment.set(qn("w:id"), str(comment_id))
+    comment.set(qn("w:author"), config.COMMENT_AUTHOR)
+    comment.set(qn("w:initials"), config.COMMENT_INITIALS)
+    comment.set(qn("w:date"), date)
+    first = comment[0]
+    first.append(_text_run(lines[0]))
+    for line in lines[1:]:
+        p = OxmlElement("w:p")
+        p.append(copy.deepcopy(first[0]))  # CommentText style
+        p.append(_text_run(line))
+        comment.append(p)
+    return comment
+
+
+def _mark_range(p, comment_id):
+    """Anchor comment `comment_id` on all runs of paragraph element `p`."""
+    start = OxmlElement("w:commentRangeStart", attrs={qn("w:id"): str(comment_id)})
+    pPr = p.find(qn("w:pPr"))
+    if pPr is not None:
+        pPr.addnext(start)
+    else:
+        p.insert(0, start)
+    p.append(OxmlElement("w:commentRangeEnd", attrs={qn("w:id"): str(comment_id)}))
+    reference = copy.deepcopy(_REFERENCE_RUN)
+    reference[-1].set(qn("w:id"), str(comment_id))
+    p.append(reference)
+
+
+def _append_paragraphs(doc, lines):
+    """Append one paragraph per line at the end of the body; returns the Paragraphs."""
+    first = doc.add_paragraph(lines[0])  # the only lookup of the body's end
+    paragraphs = [first]
+    for text in lines[1:]:
+        p = OxmlElement("w:p")
+        paragraphs[-1]._p.addnext(p)
+        paragraph = Paragraph(p, first._parent)
+        paragraph.add_run(text)
+        paragraphs.append(paragraph)
+    return paragraphs
+
+
+def _issue_lines(issue):
+    severity = issue.get("severity", "")
+    head = f"[{severity}] " if severity else ""
+    lines = [f"{head}{issue.get('issue', '')}"]
+    if issue.get("suggestion"):
+        lines.append(f"Suggestion: {issue['suggestion']}")
+    if issue.get("citation_if_any"):
+        lines.append(f"Reference: {issue['citation_if_any']}")
+    if issue.get("provenance") == "carried_forward":
+        lines.append(f"Carried forward from {issue.get('carried_from') or 'an earlier version'}")
+    return lines
+
+
+def apply_review(doc, pf, anchors):
+    """Append the review summary to `doc` and add one Word comment per compliance issue.
+
+    `anchors` holds a w:p element (from the original document) or None for each
+    issue in pf["compliance_issues"]. Issues without an anchor are commented on
+    their line of the summary's issue list. Returns the number of comments added.
+    """
+    issues = [i if isinstance(i, dict) else {"issue": str(i)} for i in pf["compliance_issues"]]
+
+    # === Summary section, appended in one splice ===
+    lines = ["=== AI REVIEW SUMMARY ===", f"Document Type: {pf['chosen_type']}", "Summary:",
+             f"- {pf['review_json'].get('summary', '')}", f"Issues Found ({len(issues)}):"]
+    first_issue_line = len(lines)
+    lines.extend(f"{idx}. {issue.get('issue', '')}" for idx, issue in enumerate(issues, start=1))
+    if pf["review_json"].get("recommendations"):
+        lines.append("Recommendations:")
+        lines.extend(f"- {rec}" for rec in pf["review_json"]["recommendations"])
+    summary = _append_paragraphs(doc, lines)
+    summary[0].alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+    summary[0].runs[0].bold = True
+    if not issues:
+        return 0
+
+    # === Comments: ids allocated once, every edit is a local splice ===
+    comments_element = doc.part._comments_part.element
+    used = [int(c.get(qn("w:id"))) for c in comments_element.iterchildren(qn("w:comment"))]
+    next_id = max(used, default=-1) + 1
+    date = dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    for offset, (issue, anchor) in enumerate(zip(issues, anchors)):
+        comment_id = next_id + offset
+        comments_element.append(_new_comment(comment_id, _issue_lines(issue), date))
+        target = anchor if anchor is not None else summary[first_issue_line + offset]._p
+        _mark_range(target, comment_id)
+    return len(issues)
@@ -0,0 +1,484 @@
+"""Offline throughput benchmark for the analysis pipeline.
+
+Every chain's Groq model is replaced by a deterministic fake chat model with a
+configurable latency, so runs need no network access and are reproducible. The
+corpus is the DOCX templates in ADGM_SOURCES_DIR, optionally inflated into larger
+documents and repeated into larger batches.
+
+    python benchmark.py --mode both --batch-size 8 --inflate 4 --latency 0.5
+    python benchmark.py --output data/benchmarks/after.json --compare data/benchmarks/before.json
+    python benchmark.py --mode annotation --annotation-issues 50,200,800
+    python benchmark.py --mode retrieval --batch-size 60 --hybrid-k 3
+"""
+import os
+import io
+import re
+import sys
+import copy
+import json
+import time
+import hashlib
+import argparse
+import platform
+import resource
+from typing import Any, List
+
+# The benchmark must not touch Groq or measure cached answers unless asked to
+os.environ.setdefault("GROQ_API_KEY", "offline-benchmark")
+if "--use-cache" not in sys.argv:
+    os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+import numpy as np
+from docx import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+import config
+import metrics
+from metrics import LLMMetricsHandler
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for ChatGroq that answers like one of our chains.
+
+    Each call sleeps `latency` seconds, spread by up to +/- `jitter` (a fraction of
+    the latency) seeded from the prompt, so identical prompts always take the same
+    time and get the same answer. Token usage is reported like Groq's.
+    """
+
+    kind: str
+    latency: float = 0.5
+    jitter: float = 0.2
+    labels: List[str] = []
+
+    @property
+    def _llm_type(self):
+        return "fake-groq"
+
+    def _answer(self, prompt, rng):
+        if self.kind == "doc_type":
+            return self.labels[int(rng.integers(len(self.labels)))] if self.labels else "Unknown"
+        if self.kind == "doc_type_batch":
+            numbers = re.findall(r"^### Document (\d+)", prompt, re.M)
+            return json.dumps({n: self.labels[int(rng.integers(len(self.labels)))] for n in numbers})
+        if self.kind == "review":
+            return json.dumps({
+                "summary": f"Synthetic review of {len(prompt)} characters.",
+                "recommendations": [f"Recommendation {i + 1}" for i in range(int(rng.integers(1, 4)))]
+            })
+        lines = [l.strip() for l in prompt.splitlines() if len(l.strip()) > 20]
+        issues = []
+        for i in range(int(rng.integers(1, 4))):
+            section = lines[int(rng.integers(len(lines)))][:60] if lines else "N/A"
+            issues.append({
+                "section": section,
+                "issue": f"Synthetic issue {int(rng.integers(1000))}",
+                "severity": ["Low", "Medium", "High"][int(rng.integers(3))],
+                "suggestion": "Synthetic suggestion"
+            })
+        return json.dumps(issues)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        prompt = "\n".join(str(m.content) for m in messages)
+        seed = int(hashlib.sha256(f"{self.kind}:{prompt}".encode("utf-8")).hexdigest()[:8], 16)
+        rng = np.random.default_rng(seed)
+        time.sleep(max(0.0, self.latency * (1 + self.jitter * (2 * rng.random() - 1))))
+        text = self._answer(prompt, rng)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=text))],
+            llm_output={"token_usage": usage}
+        )
+
+
+def install_fake_llm(latency, jitter):
+    """Swap the LLM of every pipeline chain for a FakeChatModel."""
+    import docx_processing
+    from chains.doc_type_chain import ALL_DOC_TYPES
+
+    for name, chain in (("doc_type", docx_processing.doc_type_chain),
+                        ("doc_type_batch", docx_processing.doc_type_batch_chain),
+                        ("review", docx_processing.review_chain),
+                        ("compliance", docx_processing.compliance_chain)):
+        chain.combine_documents_chain.llm_chain.llm = FakeChatModel(
+            kind=name, latency=latency, jitter=jitter, labels=ALL_DOC_TYPES,
+            callbacks=[LLMMetricsHandler(name)]
+        )
+
+
+# === Corpus ===
+def inflate_docx(data, factor):
+    """Repeat a document's body `factor` times to build a larger DOCX."""
+    if factor <= 1:
+        return data
+    doc = Document(io.BytesIO(data))
+    body = doc.element.body
+    blocks = [el for el in body if not el.tag.endswith("}sectPr")]
+    anchor = blocks[-1] if blocks else None
+    for _ in range(factor - 1):
+        for el in blocks:
+            clone = copy.deepcopy(el)
+            anchor.addnext(clone)
+            anchor = clone
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def load_corpus(batch_size, inflate=1, sources_dir=None):
+    """Return (names, payloads) for a batch of `batch_size` DOCX files.
+
+    Source templates are reused round-robin when the batch is larger than the corpus.
+    """
+    sources_dir = sources_dir or config.ADGM_SOURCES_DIR
+    paths = sorted(
+        os.path.join(sources_dir, f) for f in os.listdir(sources_dir)
+        if f.lower().endswith(".docx")
+    )
+    if not paths:
+        raise SystemExit(f"No DOCX files found in {sources_dir}")
+    templates = []
+    for path in paths:
+        with open(path, "rb") as f:
+            templates.append((os.path.basename(path), inflate_docx(f.read(), inflate)))
+    names, payloads = [], []
+    for i in range(batch_size):
+        name, data = templates[i % len(templates)]
+        names.append(name if i < len(templates) else f"{i // len(templates)}_{name}")
+        payloads.append(data)
+    return names, payloads
+
+
+# === Runners ===
+def _run_direct(names, payloads, concurrency):
+    from docx_processing import analyze_and_comment_docx_batch
+
+    _, report = analyze_and_comment_docx_batch(
+        payloads, uploaded_filenames=names, concurrency=concurrency, include_timings=True
+    )
+    return report
+
+
+def _make_api_runner(concurrency):
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError as e:
+        raise SystemExit(f"API mode needs the FastAPI test client (pip install httpx): {e}")
+    if concurrency is not None:
+        config.ANALYSIS_CONCURRENCY = concurrency
+    from main import app
+
+    client = TestClient(app)
+
+    def run(names, payloads, _concurrency):
+        files = [("files", (name, data, "application/octet-stream")) for name, data in zip(names, payloads)]
+        response = client.post(
+            "/analyze-documents", files=files,
+            params={"include_timings": "true", "response_format": "links"}
+        )
+        response.raise_for_status()
+        return response.json()["combined_report"]
+
+    return run
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _token_totals():
+    return {
+        ":".join(v for _, v in labels): value
+        for labels, value in metrics.counter_values("corporate_agent_llm_tokens_total").items()
+    }
+
+
+def run_benchmark(runner, names, payloads, runs, warmup, concurrency):
+    """Time `runs` batches (after `warmup` untimed ones) and summarize them."""
+    for _ in range(warmup):
+        runner(names, payloads, concurrency)
+
+    tokens_before = _token_totals()
+    latencies = []
+    stages = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        report = runner(names, payloads, concurrency)
+        latencies.append(time.perf_counter() - start)
+        for stage, entry in report.get("timings", {}).get("stages", {}).items():
+            total = stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            total["count"] += entry["count"]
+            total["seconds"] += entry["seconds"]
+
+    total_time = sum(latencies)
+    tokens = {
+        name: round((value - tokens_before.get(name, 0)) / runs, 1)
+        for name, value in sorted(_token_totals().items())
+    }
+    return {
+        "runs": runs,
+        "documents_per_run": len(payloads),
+        "docs_per_sec": round(len(payloads) * runs / total_time, 3) if total_time else None,
+        "latency_p50": round(float(np.percentile(latencies, 50)), 4),
+        "latency_p95": round(float(np.percentile(latencies, 95)), 4),
+        "latency_mean": round(total_time / runs, 4),
+        "peak_rss_mb": _peak_rss_mb(),
+        # Per-run averages; stage seconds overlap when work runs concurrently
+        "stages": {
+            stage: {"count": round(v["count"] / runs, 2), "seconds": round(v["seconds"] / runs, 4)}
+            for stage, v in sorted(stages.items())
+        },
+        # Per-run averages by chain:direction (fake counts, about 4 characters per token)
+        "llm_tokens": tokens
+    }
+
+
+def run_annotation_benchmark(data, issue_counts, runs):
+    """Time annotating one document with growing numbers of synthetic issues.
+
+    Half the issues carry a block id, like chunked compliance findings; the rest go
+    through the semantic match. Each timing covers anchoring, the summary, the
+    comments and saving. A flat ms_per_issue column means annotation scales linearly.
+    """
+    import docx_blocks
+    from docx_processing import _annotate_document
+
+    results = []
+    for n in issue_counts:
+        timings = []
+        for _ in range(max(1, runs)):
+            doc = Document(io.BytesIO(data))
+            blocks = docx_blocks.extract_blocks(doc)
+            ids = [b["id"] for b in blocks if b["text"].strip()] or [None]
+            issues = []
+            for i in range(n):
+                issue = {"section": "N/A", "issue": f"Synthetic issue {i}", "severity": "Low",
+                         "suggestion": f"Synthetic suggestion {i}", "citation_if_any": ""}
+                if i % 2 == 0:
+                    issue["block_id"] = ids[i % len(ids)]
+                issues.append(issue)
+            pf = {"chosen_type": "Benchmark", "review_json": {"summary": "Synthetic review."},
+                  "compliance_issues": issues}
+            start = time.perf_counter()
+            _annotate_document(doc, blocks, pf)
+            doc.save(io.BytesIO())
+            timings.append(time.perf_counter() - start)
+        seconds = float(np.median(timings))
+        results.append({"issues": n, "seconds": round(seconds, 4),
+                        "ms_per_issue": round(seconds * 1000 / n, 3) if n else None})
+    return results
+
+
+def _words(text):
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def run_retrieval_benchmark(payloads, k, hybrid_k, runs):
+    """Compare the dense retriever with hybrid (and reranked) retrieval on the corpus.
+
+    Every document is used as a query, as in the pipeline. Per variant this reports
+    query latency (the shared query embedding excluded), the context it would
+    stuff into each prompt (characters and about 4 characters per token), how often
+    a document's statutory references ("Section 17", "Form 3") appear in its
+    context, and the overlap with the dense results.
+    """
+    import docx_blocks
+    from retrieval import embed_query_text, retrieve_context, _REFERENCE_RE
+
+    texts = list(dict.fromkeys(
+        docx_blocks.full_text(docx_blocks.extract_blocks_from_file(data)) for data in payloads
+    ))
+    texts = [t for t in texts if t.strip()]
+    vectors = [embed_query_text(t) for t in texts]
+
+    variants = [("dense", {"mode": "dense", "k": k, "rerank": False}),
+                ("hybrid", {"mode": "hybrid", "k": hybrid_k, "rerank": False})]
+    try:
+        import sentence_transformers  # noqa: F401
+        variants.append(("hybrid_rerank", {"mode": "hybrid", "k": hybrid_k, "rerank": True}))
+    except ImportError:
+        print("ℹ️ sentence-transformers is not installed, skipping the reranked variant.")
+
+    results, dense_ids = {}, None
+    for name, kwargs in variants:
+        latencies, chars, ids = [], [], []
+        with_refs = hits = 0
+        for text, vector in zip(texts, vectors):
+            for _ in range(max(1, runs)):
+                start = time.perf_counter()
+                context = retrieve_context(text, vector, **kwargs)
+                latencies.append(time.perf_counter() - start)
+            contents = [c["document"].page_content for c in context]
+            chars.append(sum(len(c) for c in contents))
+            ids.append({c["id"] for c in context})
+            refs = {_words(m.group(0)) for m in _REFERENCE_RE.finditer(text[:config.RETRIEVAL_QUERY_CHARS])}
+            if refs:
+                with_refs += 1
+                joined = " ".join(_words(c) for c in contents)
+                hits += any(ref in joined for ref in refs)
+        if dense_ids is None:
+            dense_ids = ids
+        overlap = [len(a & b) / len(a | b) if a | b else 1.0 for a, b in zip(ids, dense_ids)]
+        results[name] = {
+            "k": kwargs["k"],
+            "queries": len(texts),
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)) * 1000, 3),
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)) * 1000, 3),
+            "context_chars_mean": round(float(np.mean(chars)), 1),
+            "context_tokens_mean": round(float(np.mean(chars)) / 4, 1),
+            "reference_hit_rate": round(hits / with_refs, 4) if with_refs else None,
+            "queries_with_references": with_refs,
+            "overlap_with_dense": round(float(np.mean(overlap)), 4),
+        }
+    return results
+
+
+# === Results ===
+def compare_results(current, baseline):
+    """Print per-mode deltas of the headline numbers and stage times against a baseline."""
+    for mode, cur in current["results"].items():
+        base = baseline.get("results", {}).get(mode)
+        if base is None:
+            print(f"⚠️ Baseline has no '{mode}' results, skipping comparison.")
+            continue
+        print(f"\n📊 {mode}: current vs baseline ({baseline.get('name', 'baseline')})")
+        rows = [(k, cur.get(k), base.get(k)) for k in
+                ("docs_per_sec", "latency_p50", "latency_p95", "latency_mean", "peak_rss_mb")]
+        for stage in sorted(set(cur["stages"]) | set(base.get("stages", {}))):
+            rows.append((
+                f"stage:{stage}",
+                cur["stages"].get(stage, {}).get("seconds"),
+                base.get("stages", {}).get(stage, {}).get("seconds")
+            ))
+        for name in sorted(set(cur.get("llm_tokens", {})) | set(base.get("llm_tokens", {}))):
+            rows.append((
+                f"tokens:{name}", cur.get("llm_tokens", {}).get(name), base.get("llm_tokens", {}).get(name)
+            ))
+        for name, now, before in rows:
+            if now is None or before is None:
+                print(f"  {name:<32} {now!s:>12} {before!s:>12}")
+                continue
+            change = f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"  {name:<32} {now:>12} {before:>12} {change:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark with a stubbed LLM.")
+    parser.add_argument("--mode", choices=("direct", "api", "both", "annotation", "retrieval"), default="both",
+                        help="Call analyze_and_comment_docx_batch, POST /analyze-documents, both, "
+                             "or only time annotation of the largest document / compare retrievers.")
+    parser.add_argument("--batch-size", type=int, default=4, help="Documents per batch.")
+    parser.add_argument("--inflate", type=int, default=1, help="Repeat each template's body this many times.")
+    parser.add_argument("--runs", type=int, default=3, help="Timed batches per mode.")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed batches per mode.")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Files analyzed in parallel (defaults to ANALYSIS_CONCURRENCY).")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency per call (seconds).")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency spread as a fraction of --latency.")
+    parser.add_argument("--doc-type-mode", choices=("per_file", "packed"), default=None,
+                        help="LLM classification mode (defaults to DOC_TYPE_BATCH_MODE).")
+    parser.add_argument("--annotation-issues", default="50,200,800",
+                        help="Comma-separated issue counts for --mode annotation.")
+    parser.add_argument("--retrieval-k", type=int, default=None,
+                        help="Chunks per query for the dense retriever in --mode retrieval (defaults to RETRIEVAL_K).")
+    parser.add_argument("--hybrid-k", type=int, default=None,
+                        help="Chunks per query for the hybrid retrievers (defaults to --retrieval-k).")
+    parser.add_argument("--use-cache", action="store_true", help="Keep the result cache enabled.")
+    parser.add_argument("--name", default=None, help="Label stored with the results.")
+    parser.add_argument("--output", default=None, help="Where to save the JSON results.")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against.")
+    args = parser.parse_args(argv)
+
+    if args.doc_type_mode:
+        config.DOC_TYPE_BATCH_MODE = args.doc_type_mode
+    concurrency = args.concurrency if args.concurrency is not None else config.ANALYSIS_CONCURRENCY
+    print(f"📂 Building a batch of {args.batch_size} documents (inflate x{args.inflate})...")
+    names, payloads = load_corpus(args.batch_size, args.inflate)
+
+    start = time.perf_counter()
+    install_fake_llm(args.latency, args.jitter)
+    pipeline_load_seconds = round(time.perf_counter() - start, 3)
+
+    runners = {}
+    if args.mode in ("direct", "both"):
+        runners["direct"] = _run_direct
+    if args.mode in ("api", "both"):
+        runners["api"] = _make_api_runner(concurrency)
+
+    results = {}
+    for mode, runner in runners.items():
+        print(f"⏱️ Running {mode} ({args.warmup} warmup + {args.runs} timed batches)...")
+        results[mode] = run_benchmark(runner, names, payloads, args.runs, args.warmup, concurrency)
+        r = results[mode]
+        print(f"✅ {mode}: {r['docs_per_sec']} docs/s, p50 {r['latency_p50']}s, "
+              f"p95 {r['latency_p95']}s, peak RSS {r['peak_rss_mb']} MB")
+
+    annotation_results = None
+    if args.mode == "annotation":
+        counts = [int(c) for c in args.annotation_issues.split(",") if c.strip()]
+        largest = max(payloads, key=len)
+        print(f"⏱️ Timing annotation of a {len(largest)} byte document with {counts} issues...")
+        annotation_results = run_annotation_benchmark(largest, counts, args.runs)
+        for r in annotation_results:
+            print(f"✅ {r['issues']} issues: {r['seconds']}s ({r['ms_per_issue']} ms/issue)")
+
+    retrieval_results = None
+    if args.mode == "retrieval":
+        k = args.retrieval_k or config.RETRIEVAL_K
+        hybrid_k = args.hybrid_k or k
+        print(f"⏱️ Comparing retrievers (dense k={k}, hybrid k={hybrid_k})...")
+        retrieval_results = run_retrieval_benchmark(payloads, k, hybrid_k, args.runs)
+        for name, r in retrieval_results.items():
+            print(f"✅ {name}: p50 {r['latency_ms_p50']} ms, ~{r['context_tokens_mean']} context tokens, "
+                  f"reference hits {r['reference_hit_rate']}, overlap with dense {r['overlap_with_dense']}")
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    output = {
+        "name": args.name or timestamp,
+        "created_at": timestamp,
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "name")},
+        "pipeline": {
+            "concurrency": concurrency,
+            "doc_type_fast_path": config.DOC_TYPE_FAST_PATH,
+            "doc_type_batch_mode": config.DOC_TYPE_BATCH_MODE,
+            "compliance_chunking": config.COMPLIANCE_CHUNKING,
+            "retrieval_k": config.RETRIEVAL_K,
+            "retrieval_mode": config.RETRIEVAL_MODE,
+            "reranker": config.RERANKER_MODEL if config.RERANKER_ENABLED else None,
+            "prompt_token_budgets": config.PROMPT_TOKEN_BUDGETS,
+            "embeddings_model": config.EMBEDDINGS_MODEL,
+            "embeddings_backend": config.EMBEDDINGS_BACKEND,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "corpus": {
+            "documents": len(payloads),
+            "total_bytes": sum(len(p) for p in payloads),
+        },
+        "pipeline_load_seconds": pipeline_load_seconds,
+        "results": results,
+    }
+    if annotation_results is not None:
+        output["annotation"] = annotation_results
+    if retrieval_results is not None:
+        output["retrieval"] = retrieval_results
+
+    path = args.output or os.path.join("data", "benchmarks", f"bench_{timestamp}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"🎯 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare_results(output, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import config
+
+
+def _normalize(text):
+    """Collapse whitespace so trivially reformatted resubmissions share a key."""
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+
+def current_index_version():
+    """Version of the FAISS index on disk, as written by preprocess.build_index."""
+    meta_path = os.path.join(config.VECTORSTORE_DIR, "meta.json")
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        # Older indexes have no explicit version; fall back to the file mtime
+        return str(meta.get("index_version") or os.path.getmtime(meta_path))
+    except (OSError, ValueError):
+        return "no-index"
+
+
+class ResultCache:
+    """Persistent SQLite cache for chain outputs with size and TTL eviction.
+
+    Keys hash (normalized prompt text, retrieved context, chain name, prompt template,
+    model, index version), so rebuilding the index or editing a prompt never serves
+    stale answers, and neither does the same text stuffed with other context.
+    """
+
+    def __init__(self, path, max_entries, ttl_seconds):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, chain TEXT, value TEXT, created_at REAL, last_used REAL)"
+        )
+        self._conn.commit()
+
+    def make_key(self, chain_name, prompt_template, text, index_version=None, context=None):
+        """Key of a chain call; `context` holds the texts stuffed into the prompt, None when
+        the chain retrieves its own (then decided by the text and the settings below)."""
+        if index_version is None:
+            index_version = current_index_version()
+        if context is not None:
+            context = hashlib.sha256("\x1e".join(context).encode("utf-8")).hexdigest()
+        payload = json.dumps([
+            _normalize(text), context, chain_name, prompt_template, config.GROQ_MODEL, index_version,
+            # These decide which context is retrieved for the prompt
+            config.EMBEDDINGS_BACKEND, config.RETRIEVAL_MODE, config.RETRIEVAL_K, config.RETRIEVAL_FETCH_K,
+            config.RETRIEVAL_MMR, config.RETRIEVAL_MMR_LAMBDA, config.RETRIEVAL_QUERY_CHARS,
+            config.RERANKER_MODEL if config.RERANKER_ENABLED else None,
+            # ...and this how much of it fits
+            config.PROMPT_TOKEN_BUDGETS.get(chain_name, 0), config.PROMPT_TOKENIZER
+        ])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, chain_name, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, chain, value, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, chain_name, value, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # Drop expired entries, then least recently used ones beyond the size cap
+        self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM results WHERE key IN ("
+            "SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM results")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": size}
+
+
+def _open_cache():
+    if not config.RESULT_CACHE_ENABLED:
+        return None
+    return ResultCache(
+        config.RESULT_CACHE_PATH,
+        max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+        ttl_seconds=config.RESULT_CACHE_TTL
+    )
+
+
+result_cache = _open_cache()
+
+
+def invalidate_results():
+    """Remove every cached chain output (called after the index is rebuilt)."""
+    if result_cache is not None:
+        result_cache.clear()
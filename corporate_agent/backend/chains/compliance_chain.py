@@ -1,14 +1,11 @@
 # compliance_chain.py
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-import config
+import registry
+from llm_client import build_chat_model
 
 def build_compliance_chain():
-    embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDINGS_MODEL)
-    vectorstore = FAISS.load_local(config.VECTORSTORE_DIR, embeddings, allow_dangerous_deserialization=True)
+    vectorstore = registry.get_vectorstore()
     retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
 
     template = """
@@ -35,11 +32,7 @@ Clause:
 """
     prompt = PromptTemplate(input_variables=["context", "question"], template=template)
 
-    llm = ChatGroq(
-        groq_api_key=config.GROQ_API_KEY,
-        model_name=config.GROQ_MODEL,
-        temperature=0
-    )
+    llm = build_chat_model("compliance")  # shared Groq client: rate limits, retries, breaker
 
     return RetrievalQA.from_chain_type(
         llm=llm,
@@ -1,10 +1,8 @@
 import json
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain_groq import ChatGroq
-import config
+import registry
+from llm_client import build_chat_model
 
 with open("checklist_mapping.json", "r") as f:
     CHECKLISTS = json.load(f)
@@ -12,11 +10,10 @@ with open("checklist_mapping.json", "r") as f:
 ALL_DOC_TYPES = []
 for docs in CHECKLISTS.values():
     ALL_DOC_TYPES.extend(docs)
-ALL_DOC_TYPES = list(set(ALL_DOC_TYPES))  # unique
+ALL_DOC_TYPES = list(dict.fromkeys(ALL_DOC_TYPES))  # unique, in a stable order so the prompt (and cache key) is reproducible
 
 def build_doc_type_chain():
-    embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDINGS_MODEL)
-    vectorstore = FAISS.load_local(config.VECTORSTORE_DIR, embeddings, allow_dangerous_deserialization=True)
+    vectorstore = registry.get_vectorstore()
     retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
 
     template = f"""
@@ -24,7 +21,7 @@ You are an ADGM document classifier.
 Given the context and the document snippet, determine the document type.
 
 Choose ONLY from the following list:
-{json.dumps(ALL_DOC_TYPES, indent=2)}
+{json.dumps(ALL_DOC_TYPES)}
 
 Return ONLY the document type string exactly as shown in the list above.
 Never return "Unknown Document Type".
@@ -37,12 +34,42 @@ Document snippet:
 """
     prompt = PromptTemplate(input_variables=["context", "question"], template=template)
 
-    llm = ChatGroq(
-        groq_api_key=config.GROQ_API_KEY,
-        model_name=config.GROQ_MODEL,
-        temperature=0
+    llm = build_chat_model("doc_type")  # shared Groq client: rate limits, retries, breaker
+
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        retriever=retriever,
+        chain_type="stuff",
+        chain_type_kwargs={"prompt": prompt}
     )
 
+
+def build_doc_type_batch_chain():
+    """Classifier for several numbered document snippets in one call (packed mode)."""
+    vectorstore = registry.get_vectorstore()
+    retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+
+    template = f"""
+You are an ADGM document classifier.
+Given the context and several numbered document snippets, determine the type of each document.
+
+Choose ONLY from the following list:
+{json.dumps(ALL_DOC_TYPES)}
+
+Return ONLY a JSON object mapping every document number to its document type string,
+exactly as shown in the list above, for example {{{{"1": "<type>", "2": "<type>"}}}}.
+Never return "Unknown Document Type".
+
+Context:
+{{context}}
+
+Documents:
+{{question}}
+"""
+    prompt = PromptTemplate(input_variables=["context", "question"], template=template)
+
+    llm = build_chat_model("doc_type_batch")  # shared Groq client: rate limits, retries, breaker
+
     return RetrievalQA.from_chain_type(
         llm=llm,
         retriever=retriever,
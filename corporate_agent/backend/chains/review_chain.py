@@ -1,20 +1,11 @@
-import config
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+import registry
+from llm_client import build_chat_model
 from langchain.chains import RetrievalQA
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 
 def build_review_chain():
-    # Load embeddings
-    embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDINGS_MODEL)
-
-    # Load FAISS index
-    vectorstore = FAISS.load_local(
-        config.VECTORSTORE_DIR,
-        embeddings,
-        allow_dangerous_deserialization=True
-    )
+    # Shared FAISS index (loaded once per process)
+    vectorstore = registry.get_vectorstore()
 
     # Retriever (smaller k for efficiency)
     retriever = vectorstore.as_retriever(search_kwargs={"k": 4})
@@ -44,11 +35,7 @@ Document content:
     )
 
     # Groq LLM
-    llm = ChatGroq(
-        groq_api_key=config.GROQ_API_KEY,
-        model_name=config.GROQ_MODEL,
-        temperature=0
-    )
+    llm = build_chat_model("review")  # shared Groq client: rate limits, retries, breaker
 
     # RetrievalQA chain
     review_chain = RetrievalQA.from_chain_type(
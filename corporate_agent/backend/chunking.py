@@ -0,0 +1,134 @@
+import re
+
+# Numbered clauses: "5. Directors", "5.2 The", "12) (a)", "Article 7", "Clause 3", "PART II", "Schedule 1".
+# A bare number must be short and followed by a capitalized word, so "2020 accounts were..." or
+# "100 Shares of..." opening an ordinary paragraph does not start a section
+_CLAUSE_RE = re.compile(
+    r"^\s*(?:(?:article|clause|section|part|schedule)\s+[\dIVXLC]+\b"
+    r"|\d{1,2}(?:\.\d{1,3})*(?:[.)]\s*|\s+)(?-i:[A-Z(\"\u201c]))",
+    re.IGNORECASE
+)
+
+
+def _is_section_start(block):
+    """True for headings, top-level numbered items and clause-numbered paragraphs.
+
+    Table cells never start a section, so a table stays with the text introducing it.
+    """
+    text = block["text"].strip()
+    if not text or block["kind"] == "table_cell":
+        return False
+    if block["kind"] == "heading":
+        return True
+    if block["kind"] == "list_item" and not block["level"]:
+        return True
+    return _CLAUSE_RE.match(text) is not None
+
+
+def find_sections(blocks):
+    """Block index lists of the document's sections, in order, covering every block."""
+    sections = []
+    current = []
+    for idx, block in enumerate(blocks):
+        if current and _is_section_start(block):
+            sections.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        sections.append(current)
+    return sections
+
+
+def split_into_sections(blocks, text, max_chars=4000, sections=None):
+    """Split a document's blocks (see docx_blocks) into section-aware chunks of ~max_chars.
+
+    Sections start at headings and numbered clauses; consecutive small sections are
+    packed together and oversized ones are split on block boundaries. Each chunk is
+    {"heading", "block_indices", "text"}, where the indices point into `blocks` and
+    text is the matching slice of the document's full `text` (so a document that
+    fits in one chunk yields exactly its full text). `sections` (from find_sections)
+    restricts chunking to those sections; a chunk never spans a gap between them.
+    """
+    if sections is None:
+        sections = find_sections(blocks)
+
+    # Oversized sections become several block runs
+    pieces = []
+    for section in sections:
+        piece, size = [], 0
+        for idx in section:
+            length = len(blocks[idx]["text"]) + 1
+            if piece and size + length > max_chars:
+                pieces.append(piece)
+                piece, size = [], 0
+            piece.append(idx)
+            size += length
+        if piece:
+            pieces.append(piece)
+
+    # Pack consecutive pieces up to the budget
+    chunks = []
+    current, size = [], 0
+    for piece in pieces:
+        length = sum(len(blocks[i]["text"]) + 1 for i in piece)
+        if current and (size + length > max_chars or piece[0] != current[-1] + 1):
+            chunks.append(current)
+            current, size = [], 0
+        current.extend(piece)
+        size += length
+    if current:
+        chunks.append(current)
+
+    result = []
+    for indices in chunks:
+        heading = next((blocks[i]["text"].strip() for i in indices if blocks[i]["text"].strip()), "")
+        result.append({
+            "heading": heading,
+            "block_indices": indices,
+            "text": text[blocks[indices[0]]["start"]:blocks[indices[-1]]["end"]]
+        })
+    return result
+
+
+# A label's clause reference and title: "Clause 5.2 - Probation", "5.2 Probation", "Article 7: Directors"
+_LABEL_REF_RE = re.compile(
+    r"^\s*(?:(?:article|clause|section|paragraph|schedule|part)\s+)?(\d+(?:\.\d+)*)[.)]?(?:\s*[-\u2013\u2014:(]\s*|\s+|$)",
+    re.IGNORECASE
+)
+
+
+def _find_label(indices, blocks, label):
+    for idx in indices:
+        if blocks[idx]["text"].strip().lower().startswith(label):
+            return idx
+    for idx in indices:
+        if label in blocks[idx]["text"].lower():
+            return idx
+    return None
+
+
+def locate_section(chunk, section, blocks):
+    """(index, matched) of the block in `chunk` that a finding's section refers to.
+
+    Prefers a block that starts with (or contains) the section label. Labels that
+    cite a clause ("Clause 5.2 - Probation") also match a block numbered "5.2", or
+    one holding the title after the number, since automatic numbering is not part
+    of the block text. When nothing matches (document-level findings, "N/A") it
+    falls back to the chunk's first non-empty block with matched=False.
+    """
+    label = (section or "").strip().lower()
+    indices = chunk["block_indices"]
+    if label and label != "n/a":
+        idx = _find_label(indices, blocks, label)
+        if idx is not None:
+            return idx, True
+        ref = _LABEL_REF_RE.match(label)
+        if ref:
+            number = re.compile(rf"^\s*{re.escape(ref.group(1))}(?:[.)]|\s)")
+            idx = next((i for i in indices if number.match(blocks[i]["text"])), None)
+            title = label[ref.end():].strip(" )")
+            if idx is None and len(title) >= 4:
+                idx = _find_label(indices, blocks, title)
+            if idx is not None:
+                return idx, True
+    return next((idx for idx in indices if blocks[idx]["text"].strip()), indices[0]), False
@@ -0,0 +1,116 @@
+import os
+import glob
+import json
+import threading
+import numpy as np
+import config
+import registry
+import docx_blocks
+from chains.doc_type_chain import ALL_DOC_TYPES
+
+# Label -> filename patterns of labelled templates in ADGM_SOURCES_DIR
+with open("doc_type_prototypes.json", "r") as f:
+    PROTOTYPE_SOURCES = json.load(f)
+
+# Same snippet as the shared retrieval query, so its embedding can be reused here
+SNIPPET_CHARS = config.RETRIEVAL_QUERY_CHARS
+
+
+def _docx_text(path):
+    return docx_blocks.full_text(docx_blocks.extract_blocks_from_file(path))
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class PrototypeClassifier:
+    """Nearest-prototype document classifier over labelled ADGM templates.
+
+    A document's label is the label of its most similar template snippet; the
+    confidence is that cosine similarity. Results under `threshold`, or too close to
+    the runner-up label (`min_margin`), are returned without a label so the caller
+    can fall back to the LLM chain, and so is every result while some of
+    `required_labels` (the labels the LLM may choose from) have no prototypes, as
+    documents of those types would be matched to the nearest other label.
+    """
+
+    def __init__(self, sources_dir, prototype_sources, threshold, min_margin, required_labels=()):
+        self.sources_dir = sources_dir
+        self.prototype_sources = prototype_sources
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self.required_labels = list(required_labels)
+        self._lock = threading.Lock()
+        self._labels = None
+        self._matrix = None
+
+    def _build(self):
+        labels, texts = [], []
+        for label, patterns in self.prototype_sources.items():
+            paths = sorted({p for pat in patterns for p in glob.glob(os.path.join(self.sources_dir, pat))})
+            for path in paths:
+                try:
+                    text = _docx_text(path)[:SNIPPET_CHARS]
+                except Exception as e:
+                    print(f"❌ Error reading prototype {path}: {e}")
+                    continue
+                if text.strip():
+                    labels.append(label)
+                    texts.append(text)
+        if texts:
+            embs = registry.get_embeddings().embed_documents(texts)
+            matrix = _normalize_rows(np.asarray(embs, dtype=np.float32))
+        else:
+            matrix = np.zeros((0, 1), dtype=np.float32)
+        print(f"🏷️ Built {len(texts)} document type prototypes for {len(set(labels))} labels")
+        missing = [label for label in self.required_labels if label not in labels]
+        if missing:
+            print(f"⚠️ No prototypes for {', '.join(missing)}; the fast path leaves every document to the LLM")
+        return labels, matrix
+
+    def prototypes(self):
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._labels, self._matrix = self._build()
+        return self._labels, self._matrix
+
+    def classify(self, text, query_vector=None):
+        """Return (label or None, confidence) for a document's text.
+
+        `query_vector` may carry an already computed embedding of the text snippet.
+        """
+        labels, matrix = self.prototypes()
+        if not labels or not text or not text.strip():
+            return None, 0.0
+        if query_vector is None:
+            query_vector = registry.get_embeddings().embed_query(text[:SNIPPET_CHARS])
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        sims = matrix @ query
+
+        # Best score per label, so several templates of one label don't count as a margin
+        best_per_label = {}
+        for label, sim in zip(labels, sims.tolist()):
+            best_per_label[label] = max(sim, best_per_label.get(label, -1.0))
+        ranked = sorted(best_per_label.items(), key=lambda x: x[1], reverse=True)
+        top_label, top_sim = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+
+        if top_sim < self.threshold or top_sim - runner_up < self.min_margin:
+            return None, round(top_sim, 4)
+        if any(label not in best_per_label for label in self.required_labels):
+            return None, round(top_sim, 4)
+        return top_label, round(top_sim, 4)
+
+
+doc_type_classifier = PrototypeClassifier(
+    config.ADGM_SOURCES_DIR,
+    PROTOTYPE_SOURCES,
+    threshold=config.DOC_TYPE_CONFIDENCE_THRESHOLD,
+    min_margin=config.DOC_TYPE_MIN_MARGIN,
+    required_labels=ALL_DOC_TYPES
+)
@@ -8,3 +8,152 @@ GROQ_MODEL = os.getenv("GROQ_MODEL", "meta-llama/llama-4-maverick-17b-128e-instr
 EMBEDDINGS_MODEL = os.getenv("EMBEDDINGS_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 VECTORSTORE_DIR = os.getenv("VECTORSTORE_DIR", "data/adgm_index")
 ADGM_SOURCES_DIR = os.getenv("ADGM_SOURCES_DIR", "data/adgm_sources")
+
+# Embedding runtime: "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime, no PyTorch).
+# ONNX models come from the Hub unless EMBEDDINGS_ONNX_DIR holds tokenizer.json + onnx/model.onnx;
+# int8 copies are cached under EMBEDDINGS_ONNX_CACHE. EMBEDDINGS_THREADS=0 keeps the runtime default.
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "torch")
+EMBEDDINGS_ONNX_DIR = os.getenv("EMBEDDINGS_ONNX_DIR", "")
+EMBEDDINGS_ONNX_CACHE = os.getenv("EMBEDDINGS_ONNX_CACHE", "data/onnx_models")
+EMBEDDINGS_THREADS = int(os.getenv("EMBEDDINGS_THREADS", "0"))
+
+# Batch analysis: files analyzed in parallel (1 = serial) and per LLM call timeout (seconds, also the
+# deadline after which the Groq client stops retrying; each attempt is bounded by LLM_REQUEST_TIMEOUT)
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", "4"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "120"))
+
+# Shared Groq client: connection pool, quota (0 = unlimited), retries with jittered backoff,
+# hedging of slow calls (seconds, 0 = off) and the circuit breaker
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")  # e.g. a local mock server
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", "300"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Sharded deployment: API workers use one shared embedding/retrieval process (model_server.py) over
+# this Unix socket instead of loading the models themselves (empty = in-process); optional connection
+# authkey, and how long workers wait for the server to come up (seconds)
+MODEL_SERVER_SOCKET = os.getenv("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_AUTHKEY = os.getenv("MODEL_SERVER_AUTHKEY", "")
+MODEL_SERVER_CONNECT_TIMEOUT = float(os.getenv("MODEL_SERVER_CONNECT_TIMEOUT", "60"))
+
+# Job queue: worker threads, admission limits, how long finished results are kept (seconds) and the
+# SQLite file holding job state, shared by all API workers
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "16"))
+MAX_PENDING_UPLOAD_BYTES = int(os.getenv("MAX_PENDING_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "data/jobs.sqlite")
+
+# Persistent cache of chain outputs (size in entries, TTL in seconds)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "data/result_cache.sqlite")
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Index building: processes used to parse sources; texts per embedding batch (also the ONNX batch size)
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Source parsing: extracted text cached per file hash; PDF pages per pool task; pages with fewer
+# non-whitespace characters that draw an image are read with unstructured's OCR strategy instead
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "data/parse_cache")
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "50"))
+PDF_OCR_STRATEGY = os.getenv("PDF_OCR_STRATEGY", "ocr_only")
+
+# Embedding fast path for document classification; below these scores the LLM chain decides. Off by
+# default: the threshold is uncalibrated and only answers once every document type has prototypes
+DOC_TYPE_FAST_PATH = os.getenv("DOC_TYPE_FAST_PATH", "false").lower() in ("1", "true", "yes")
+DOC_TYPE_CONFIDENCE_THRESHOLD = float(os.getenv("DOC_TYPE_CONFIDENCE_THRESHOLD", "0.75"))
+DOC_TYPE_MIN_MARGIN = float(os.getenv("DOC_TYPE_MIN_MARGIN", "0.05"))
+
+# LLM classification of a batch: "per_file" (one call per document) or "packed" (several snippets per call)
+DOC_TYPE_BATCH_MODE = os.getenv("DOC_TYPE_BATCH_MODE", "per_file")
+DOC_TYPE_BATCH_SIZE = int(os.getenv("DOC_TYPE_BATCH_SIZE", "10"))
+DOC_TYPE_BATCH_SNIPPET_CHARS = int(os.getenv("DOC_TYPE_BATCH_SNIPPET_CHARS", "1000"))
+
+# Vector index built by preprocess.py: "flat" (exact), "ivfpq" or "hnsw"; build shape, query-time
+# breadth (nprobe / efSearch), minimum recall@10 against exact search, and memory-mapped loading
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))  # 0 = about 4 * sqrt(n_chunks)
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("PQ_M", "48"))
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+PQ_REFINE_FACTOR = int(os.getenv("PQ_REFINE_FACTOR", "4"))  # exact re-rank of k * factor candidates, 0 = off
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+INDEX_MIN_RECALL = float(os.getenv("INDEX_MIN_RECALL", "0.9"))
+INDEX_MMAP = os.getenv("INDEX_MMAP", "true").lower() in ("1", "true", "yes")
+
+# Shared per-document retrieval: chunks fed to every chain, candidates searched, MMR diversification
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "12"))
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "false").lower() in ("1", "true", "yes")
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.5"))
+RETRIEVAL_QUERY_CHARS = int(os.getenv("RETRIEVAL_QUERY_CHARS", "2000"))
+
+# Retrieval mode: "dense" (FAISS only) or "hybrid" (FAISS + BM25 over the same chunks, fused with
+# reciprocal rank fusion); terms per BM25 query, the RRF constant, and optional local cross-encoder
+# reranking of the top fused candidates (0 = all of them)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+LEXICAL_MAX_QUERY_TERMS = int(os.getenv("LEXICAL_MAX_QUERY_TERMS", "64"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RERANKER_ENABLED = os.getenv("RERANKER_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_CANDIDATES = int(os.getenv("RERANKER_CANDIDATES", "12"))
+
+# Prompt assembly: token budget for each chain's whole prompt (template + document text + retrieved
+# context, 0 = unlimited). Context is compacted and trimmed to fit, but keeps at least
+# PROMPT_MIN_CONTEXT_TOKENS; shorter leftovers than PROMPT_MIN_CHUNK_TOKENS are dropped. PROMPT_TOKENIZER
+# is a tokenizer.json path or Hub id for exact counts (empty = about 4 characters per token). Defaults
+# fit the largest document text each chain sends (a 2000-char snippet for doc_type, 4000 chars for review
+# and compliance) plus a full retrieval of about 600 tokens
+PROMPT_TOKEN_BUDGETS = {
+    "doc_type": int(os.getenv("PROMPT_TOKENS_DOC_TYPE", "1400")),
+    "doc_type_batch": int(os.getenv("PROMPT_TOKENS_DOC_TYPE_BATCH", "4000")),
+    "review": int(os.getenv("PROMPT_TOKENS_REVIEW", "2400")),
+    "compliance": int(os.getenv("PROMPT_TOKENS_COMPLIANCE", "2400")),
+}
+PROMPT_MIN_CONTEXT_TOKENS = int(os.getenv("PROMPT_MIN_CONTEXT_TOKENS", "250"))
+PROMPT_MIN_CHUNK_TOKENS = int(os.getenv("PROMPT_MIN_CHUNK_TOKENS", "40"))
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "")
+
+# Whole-document compliance: section-aware chunks checked in parallel and merged
+COMPLIANCE_CHUNKING = os.getenv("COMPLIANCE_CHUNKING", "true").lower() in ("1", "true", "yes")
+COMPLIANCE_CHUNK_CHARS = int(os.getenv("COMPLIANCE_CHUNK_CHARS", "4000"))
+COMPLIANCE_CHUNK_CONCURRENCY = int(os.getenv("COMPLIANCE_CHUNK_CONCURRENCY", "4"))
+
+# Delta re-review: a document sharing at least DELTA_MIN_SIMILARITY of its blocks (Jaccard) with a
+# stored analysis is treated as a new version of it; only its changed sections are checked again
+# (needs COMPLIANCE_CHUNKING). Off by default: uploads without a client_id share one history. Stored
+# analyses are capped in number and kept for the TTL (seconds)
+DELTA_REVIEW = os.getenv("DELTA_REVIEW", "false").lower() in ("1", "true", "yes")
+DELTA_MIN_SIMILARITY = float(os.getenv("DELTA_MIN_SIMILARITY", "0.5"))
+VERSION_STORE_PATH = os.getenv("VERSION_STORE_PATH", "data/versions.sqlite")
+VERSION_STORE_MAX_ENTRIES = int(os.getenv("VERSION_STORE_MAX_ENTRIES", "2000"))
+VERSION_STORE_TTL = int(os.getenv("VERSION_STORE_TTL", str(90 * 24 * 3600)))
+
+# Author name and initials shown on the Word comments added to reviewed documents
+COMMENT_AUTHOR = os.getenv("COMMENT_AUTHOR", "Corporate Agent")
+COMMENT_INITIALS = os.getenv("COMMENT_INITIALS", "AI")
+
+# Temporary storage for reviewed DOCX downloads (shared by all API workers) and retention (seconds)
+REVIEWED_DOCS_DIR = os.getenv("REVIEWED_DOCS_DIR", "data/reviewed_docs")
+REVIEWED_DOCS_TTL = int(os.getenv("REVIEWED_DOCS_TTL", "3600"))
+
+# Upload limits (bytes); larger uploads are rejected with HTTP 413
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(25 * 1024 * 1024)))
+MAX_UPLOAD_BATCH_BYTES = int(os.getenv("MAX_UPLOAD_BATCH_BYTES", str(100 * 1024 * 1024)))
+
+# Add the per-request stage timing breakdown to combined_report
+REPORT_TIMINGS = os.getenv("REPORT_TIMINGS", "false").lower() in ("1", "true", "yes")
@@ -0,0 +1,200 @@
+"""Single-pass extraction of a DOCX body into an ordered list of text blocks.
+
+Every consumer (classification, chunking, comment anchoring) reads the same
+blocks instead of walking doc.paragraphs, and table content is included.
+Each block is a dict:
+
+    id       stable position id: "p12" (12th body paragraph), "t0r3c1" (table 0, row 3, cell 1)
+    kind     "heading", "list_item", "paragraph" or "table_cell"
+    text     the block's text (a cell's paragraphs joined with newlines)
+    start    offset of the text in the document's full text
+    end      start + len(text)
+    style    paragraph style name ("" when unstyled)
+    level    heading level, numbering level (ilvl) or None
+    table    (table, row, cell) indices for table cells, else None
+    element  the w:p element to anchor comments on (None when streamed from a file)
+
+The full text joins blocks with newlines, except that cells of one table row
+are joined with " | " so rows read as records.
+"""
+import io
+import re
+import zipfile
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _w(tag):
+    return f"{{{W_NS}}}{tag}"
+
+
+P, R, TBL, TR, TC, BODY = _w("p"), _w("r"), _w("tbl"), _w("tr"), _w("tc"), _w("body")
+_TEXT_TAGS = (_w("t"), _w("tab"), _w("br"), _w("cr"))
+_HEADING_RE = re.compile(r"^(?:heading|title)\s*(\d*)$", re.IGNORECASE)
+
+
+def _attr(element, path, default=None):
+    """w:val of the first `path` match under `element`."""
+    if element is None:
+        return default
+    found = element.find(path, {"w": W_NS})
+    if found is None:
+        return default
+    return found.get(_w("val"), default)
+
+
+def style_names(styles_element):
+    """{styleId: style name} from a w:styles element (None gives an empty map)."""
+    if styles_element is None:
+        return {}
+    names = {}
+    for style in styles_element.iter(_w("style")):
+        style_id = style.get(_w("styleId"))
+        if style_id:
+            names[style_id] = _attr(style, "w:name", style_id)
+    return names
+
+
+def paragraph_text(p):
+    """Visible text of a w:p.
+
+    Matches python-docx's Paragraph.text, plus runs nested in content controls
+    (checkboxes, placeholders) that Paragraph.text leaves out.
+    """
+    parts = []
+    for node in p.iter(_TEXT_TAGS):
+        if node.tag == _TEXT_TAGS[0]:
+            parts.append(node.text or "")
+        elif node.getparent().tag != R:
+            continue  # tab stops and breaks defined in paragraph properties
+        elif node.tag == _TEXT_TAGS[1]:
+            parts.append("\t")
+        elif node.get(_w("type"), "textWrapping") == "textWrapping":
+            parts.append("\n")  # page and column breaks add no text
+    return "".join(parts)
+
+
+def _paragraph_block(p, block_id, styles):
+    pPr = p.find(_w("pPr"))
+    style_id = _attr(pPr, "w:pStyle", "")
+    style = styles.get(style_id, style_id)
+    kind, level = "paragraph", None
+
+    heading = _HEADING_RE.match(style)
+    outline = _attr(pPr, "w:outlineLvl")
+    if heading:
+        kind, level = "heading", int(heading.group(1) or 0)
+    elif outline is not None and outline.isdigit() and int(outline) < 9:
+        kind, level = "heading", int(outline) + 1
+    elif pPr is not None and pPr.find(_w("numPr")) is not None:
+        kind, level = "list_item", int(_attr(pPr, "w:numPr/w:ilvl", "0") or 0)
+
+    return {"id": block_id, "kind": kind, "text": paragraph_text(p), "style": style,
+            "level": level, "table": None, "element": p}
+
+
+def _table_blocks(tbl, t_idx, styles):
+    blocks = []
+    for r_idx, tr in enumerate(tbl.iterchildren(TR)):
+        for c_idx, tc in enumerate(tr.iterchildren(TC)):
+            # Vertically merged continuation cells repeat nothing new
+            v_merge = tc.find(f"{_w('tcPr')}/{_w('vMerge')}")
+            if v_merge is not None and v_merge.get(_w("val"), "continue") == "continue":
+                continue
+            paragraphs = list(tc.iter(P))  # includes nested tables, flattened
+            if not paragraphs:
+                continue
+            anchor = next((p for p in paragraphs if paragraph_text(p).strip()), paragraphs[0])
+            pPr = paragraphs[0].find(_w("pPr"))
+            style_id = _attr(pPr, "w:pStyle", "")
+            blocks.append({
+                "id": f"t{t_idx}r{r_idx}c{c_idx}",
+                "kind": "table_cell",
+                "text": "\n".join(paragraph_text(p) for p in paragraphs),
+                "style": styles.get(style_id, style_id),
+                "level": None,
+                "table": (t_idx, r_idx, c_idx),
+                "element": anchor,
+            })
+    return blocks
+
+
+def _separator(prev, block):
+    """Cells of one table row are joined with " | ", all other blocks with a newline."""
+    same_row = prev["table"] is not None and block["table"] is not None and prev["table"][:2] == block["table"][:2]
+    return " | " if same_row else "\n"
+
+
+def _body_blocks(children, styles, keep_elements=True):
+    """Blocks for the body-level elements yielded by `children`, with offsets filled in."""
+    blocks = []
+    counts = {"p": 0, "t": 0}
+    offset = 0
+    for child in children:
+        if child.tag == P:
+            new = [_paragraph_block(child, f"p{counts['p']}", styles)]
+            counts["p"] += 1
+        elif child.tag == TBL:
+            new = _table_blocks(child, counts["t"], styles)
+            counts["t"] += 1
+        else:
+            continue  # section properties, bookmarks, content controls
+        for block in new:
+            if blocks:
+                offset += len(_separator(blocks[-1], block))
+            block["start"] = offset
+            offset += len(block["text"])
+            block["end"] = offset
+            if not keep_elements:
+                block["element"] = None
+            blocks.append(block)
+    return blocks
+
+
+def full_text(blocks):
+    """The document text the block offsets point into."""
+    parts = []
+    for i, block in enumerate(blocks):
+        if i:
+            parts.append(_separator(blocks[i - 1], block))
+        parts.append(block["text"])
+    return "".join(parts)
+
+
+def extract_blocks(doc):
+    """Ordered blocks of a parsed python-docx Document, in one walk of its body XML."""
+    body = doc.element.body
+    styles = style_names(doc.styles.element)
+    return _body_blocks(body.iterchildren(), styles)
+
+
+def _stream_body(xml_file):
+    """Yield body-level elements of document.xml as they finish parsing, then free them."""
+    for _, element in etree.iterparse(xml_file, events=("end",), tag=(P, TBL), huge_tree=True):
+        parent = element.getparent()
+        if parent is None or parent.tag != BODY:
+            continue  # paragraphs inside tables are handled with their table
+        yield element
+        element.clear()
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def extract_blocks_from_file(source):
+    """Blocks of a DOCX given as bytes, a path or a binary file object, without python-docx.
+
+    document.xml is streamed, so memory stays flat for large files. Blocks carry no
+    element; use extract_blocks on a parsed Document when comments will be anchored.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)
+    with zipfile.ZipFile(source) as archive:
+        try:
+            styles = style_names(etree.fromstring(archive.read("word/styles.xml")))
+        except KeyError:
+            styles = {}
+        with archive.open("word/document.xml") as xml_file:
+            return _body_blocks(_stream_body(xml_file), styles, keep_elements=False)
@@ -1,20 +1,54 @@
 import io
+import os
+import re
 import json
+import time
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from docx import Document
-from docx.shared import Pt, RGBColor
-from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
-from chains.doc_type_chain import build_doc_type_chain
+from chains.doc_type_chain import build_doc_type_chain, build_doc_type_batch_chain, ALL_DOC_TYPES
 from chains.review_chain import build_review_chain
 from chains.compliance_chain import build_compliance_chain
-from utils import compare_against_checklist, CHECKLISTS
-from langchain_huggingface import HuggingFaceEmbeddings
+from utils import compare_against_checklist, match_checklist_types, score_processes, checklist_type_embeddings, CHECKLISTS
+import registry
+import config
+from cache import result_cache
+from classifier import doc_type_classifier
+from retrieval import embed_query_text, retrieve_context, context_summary
+from chunking import split_into_sections, locate_section, find_sections
+import docx_blocks
+import versions
+import annotation
+import metrics
+import prompt_budget
 
 # === Build chains once ===
 doc_type_chain = build_doc_type_chain()
+doc_type_batch_chain = build_doc_type_batch_chain()
 review_chain = build_review_chain()
 compliance_chain = build_compliance_chain()
-embeddings_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+embeddings_model = registry.get_embeddings()
+checklist_type_embeddings()  # precompute checklist label embeddings at startup
+if config.DOC_TYPE_FAST_PATH:
+    doc_type_classifier.prototypes()  # embed labelled templates at startup
+if config.RERANKER_ENABLED and not registry.is_remote():
+    registry.get_reranker()  # load the cross-encoder before the first request
+
+
+def _prompt_template(chain):
+    """Prompt template text of a RetrievalQA "stuff" chain (part of the cache key)."""
+    try:
+        return chain.combine_documents_chain.llm_chain.prompt.template
+    except AttributeError:
+        return ""
+
+
+CHAIN_TEMPLATES = {
+    "doc_type": _prompt_template(doc_type_chain),
+    "doc_type_batch": _prompt_template(doc_type_batch_chain),
+    "review": _prompt_template(review_chain),
+    "compliance": _prompt_template(compliance_chain),
+}
 
 
 def _safe_parse_json(maybe_json_str):
@@ -32,113 +66,835 @@ def _safe_parse_json(maybe_json_str):
         return None
 
 
-def _add_comment_below_paragraph(paragraph, comment_text):
-    """Add AI comment as a new styled paragraph below matched section."""
-    comment_para = paragraph.insert_paragraph_before(f"[AI COMMENT] {comment_text}")
-    run = comment_para.runs[0]
-    run.italic = True
-    run.font.size = Pt(9)
-    run.font.color.rgb = RGBColor(0, 102, 204)  # blue
+def _normalize_rows(matrix):
+    """L2-normalize each row so dot products are cosine similarities."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
 
 
-def _find_best_matching_paragraph(doc, target_text):
-    """Find paragraph most semantically similar to target_text using embeddings."""
-    if not target_text or len(target_text.strip()) < 5:
-        return None
-    para_texts = [p.text for p in doc.paragraphs if p.text.strip()]
-    if not para_texts:
-        return None
-    target_emb = embeddings_model.embed_query(target_text)
-    para_embs = embeddings_model.embed_documents(para_texts)
-    sims = np.dot(para_embs, target_emb) / (
-        np.linalg.norm(para_embs, axis=1) * np.linalg.norm(target_emb)
+def _embed_blocks(blocks):
+    """Embed every non-empty block (paragraphs and table cells) once, in one batch.
+
+    Returns those blocks and a normalized matrix whose rows line up with them.
+    """
+    blocks = [b for b in blocks if b["text"].strip()]
+    if not blocks:
+        return [], None
+    with metrics.timed("embed_paragraphs"):
+        block_embs = np.asarray(embeddings_model.embed_documents([b["text"] for b in blocks]), dtype=np.float32)
+    return blocks, _normalize_rows(block_embs)
+
+
+def _match_issues_to_blocks(blocks, block_matrix, issues, threshold=0.4):
+    """Find the block most semantically similar to each issue.
+
+    The issue's section is tried first, then its issue text. All targets are embedded
+    in one batch and scored with a single matrix multiply. Returns one block (or None
+    when nothing clears `threshold`) per issue.
+    """
+    matches = [None] * len(issues)
+    if not blocks or not issues:
+        return matches
+
+    targets = []  # (issue index, text), section before issue text
+    for idx, issue in enumerate(issues):
+        sec = issue.get("section", "")
+        issue_text = issue.get("issue", "")
+        if sec and sec != "N/A" and len(sec.strip()) >= 5:
+            targets.append((idx, sec))
+        if issue_text and len(issue_text.strip()) >= 5:
+            targets.append((idx, issue_text))
+    if not targets:
+        return matches
+
+    target_embs = np.asarray(embeddings_model.embed_documents([t for _, t in targets]), dtype=np.float32)
+    sims = _normalize_rows(target_embs) @ block_matrix.T
+    best_idx = np.argmax(sims, axis=1)
+    best_sim = sims[np.arange(len(targets)), best_idx]
+
+    for (issue_idx, _), b_idx, sim in zip(targets, best_idx, best_sim):
+        if matches[issue_idx] is None and sim >= threshold:
+            matches[issue_idx] = blocks[int(b_idx)]
+    return matches
+
+
+def _invoke_chain(chain, chain_name, prompt, call_pool=None, timeout=None, context_docs=None):
+    """Invoke a RetrievalQA chain and return its text answer.
+
+    With `context_docs` the chain's own retriever is skipped and the given documents
+    are compacted and trimmed to the chain's token budget (see prompt_budget), then
+    stuffed into the prompt. Answers are served from the persistent result cache
+    when possible. When a pool is given the call runs on it and the caller waits at
+    most `timeout` seconds; the call itself is bounded by the Groq client's request
+    timeout and retry deadline (llm_client).
+    """
+    if context_docs is None:
+        call, payload = chain.invoke, prompt
+    else:
+        context_docs = prompt_budget.fit_context(chain_name, CHAIN_TEMPLATES[chain_name], prompt, context_docs)
+        call, payload = chain.combine_documents_chain.invoke, {"input_documents": context_docs, "question": prompt}
+
+    cache_key = None
+    if result_cache is not None:
+        cache_key = result_cache.make_key(
+            chain_name, CHAIN_TEMPLATES[chain_name], prompt,
+            context=[d.page_content for d in context_docs] if context_docs is not None else None
+        )
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            metrics.inc("corporate_agent_cache_hits_total", chain=chain_name)
+            return cached
+        metrics.inc("corporate_agent_cache_misses_total", chain=chain_name)
+
+    metrics.inc("corporate_agent_chain_calls_total", chain=chain_name)
+    try:
+        with metrics.timed("llm", chain=chain_name):
+            if call_pool is None:
+                result = call(payload)
+            else:
+                future = metrics.submit(call_pool, call, payload)
+                try:
+                    result = future.result(timeout=timeout)
+                except FuturesTimeoutError:
+                    # Only drops a call still queued for a slot; a running one ends at the
+                    # client's retry deadline
+                    future.cancel()
+                    raise TimeoutError(f"LLM call timed out after {timeout}s")
+    except Exception:
+        metrics.inc("corporate_agent_chain_errors_total", chain=chain_name)
+        raise
+    if isinstance(result, dict):
+        result = result.get("result") or result.get("answer") or result.get("output_text") or str(result)
+
+    if cache_key is not None and result:
+        result_cache.set(cache_key, chain_name, str(result))
+    return result
+
+
+def _classify_fast_path(full_text, query_vector=None):
+    """Prototype classifier result as (label or None, confidence)."""
+    if not config.DOC_TYPE_FAST_PATH:
+        return None, None
+    try:
+        with metrics.timed("classify_fast_path"):
+            return doc_type_classifier.classify(full_text, query_vector)
+    except Exception:
+        return None, None
+
+
+def _classify_with_llm(full_text, call_pool=None, timeout=None, context_docs=None):
+    """Document type from the per-file LLM chain."""
+    try:
+        ai_doc_type = _invoke_chain(doc_type_chain, "doc_type", full_text[:2000], call_pool, timeout, context_docs)
+        ai_doc_type = str(ai_doc_type).strip().strip('"')
+    except Exception:
+        ai_doc_type = None
+    return ai_doc_type or "Classification Error"
+
+
+def _classify_document(full_text, call_pool=None, timeout=None, context_docs=None, query_vector=None):
+    """Document type detection (Embeddings only, no keyword fallback).
+
+    Returns (doc_type, method, confidence). The prototype classifier answers
+    confident cases locally; the rest go to the LLM chain.
+    """
+    label, confidence = _classify_fast_path(full_text, query_vector)
+    if label:
+        return label, "fast_path", confidence
+    return _classify_with_llm(full_text, call_pool, timeout, context_docs), "llm", confidence
+
+
+_DOC_TYPE_LOOKUP = {t.lower(): t for t in ALL_DOC_TYPES}
+
+
+def _parse_packed_labels(answer, n):
+    """Labels from a packed classification answer; None for missing or unknown entries."""
+    labels = [None] * n
+    parsed = _safe_parse_json(str(answer))
+    if not isinstance(parsed, dict):
+        return labels
+    for key, value in parsed.items():
+        number = re.search(r"\d+", str(key))
+        if not number or not isinstance(value, str):
+            continue
+        pos = int(number.group()) - 1
+        if 0 <= pos < n:
+            labels[pos] = _DOC_TYPE_LOOKUP.get(value.strip().strip('"').lower())
+    return labels
+
+
+def _classify_packed(group, call_pool=None, timeout=None):
+    """Classify several prepared documents with one LLM call.
+
+    Each document contributes a numbered snippet and its closest retrieved chunk to
+    the prompt. Returns a label or None per document.
+    """
+    question = "\n\n".join(
+        f"### Document {n}\n{p['snippet'][:config.DOC_TYPE_BATCH_SNIPPET_CHARS]}"
+        for n, p in enumerate(group, start=1)
     )
-    if len(sims) == 0:
+    context_docs, seen = [], set()
+    for p in group:
+        for c in (p["context"] or [])[:1]:
+            if c["id"] not in seen:
+                seen.add(c["id"])
+                context_docs.append(c["document"])
+    try:
+        answer = _invoke_chain(
+            doc_type_batch_chain, "doc_type_batch", question, call_pool, timeout,
+            context_docs[:config.RETRIEVAL_K]
+        )
+    except Exception:
+        return [None] * len(group)
+    return _parse_packed_labels(answer, len(group))
+
+
+def _shared_context(full_text):
+    """Query embedding and shared retrieval for one document.
+
+    Either part is None when it fails (e.g. the model server is unreachable); the
+    chains then fall back to their own retrievers.
+    """
+    try:
+        query_vector = embed_query_text(full_text)
+    except Exception:
+        return None, None
+    try:
+        context = retrieve_context(full_text, query_vector)
+    except Exception:
+        context = None
+    return query_vector, context
+
+
+def _analysis_signature():
+    return versions.analysis_signature(
+        {name: CHAIN_TEMPLATES[name] for name in ("doc_type", "review", "compliance")}
+    )
+
+
+def _find_previous_version(block_fps, version_scope="", versions_before=None):
+    """Stored analysis of an earlier version of this document in `version_scope` (see versions), or None.
+
+    Only analyses recorded before `versions_before` count, so documents of one batch never match each other.
+    """
+    if versions.version_store is None:
         return None
-    best_idx = int(np.argmax(sims))
-    if sims[best_idx] < 0.4:  # similarity threshold
+    try:
+        with metrics.timed("version_lookup"):
+            return versions.version_store.find_previous(
+                block_fps, _analysis_signature(), config.DELTA_MIN_SIMILARITY, version_scope, versions_before
+            )
+    except Exception:
         return None
-    return doc.paragraphs[best_idx]
 
 
-def analyze_and_comment_docx_batch(docx_bytes_list, uploaded_filenames=None):
-    if uploaded_filenames is None:
-        uploaded_filenames = [f"doc_{i+1}.docx" for i in range(len(docx_bytes_list))]
+def _prepare_document(source, version_scope="", versions_before=None):
+    """Parse a document and run everything classification needs short of the LLM.
+
+    Returns {"snippet", "query_vector", "context", "classification", "previous"};
+    classification holds the fast-path result or the type of an earlier version
+    (previous), or None when the LLM has to decide.
+    """
+    with metrics.timed("docx_parse"):
+        blocks = docx_blocks.extract_blocks_from_file(source)
+    full_text = docx_blocks.full_text(blocks)
+    previous = _find_previous_version(versions.block_fingerprints(blocks), version_scope, versions_before)
+    query_vector, context = _shared_context(full_text)
+    if previous is not None:
+        label, confidence = previous["chosen_type"], previous["classification_confidence"]
+        classification = (label, "carried_forward", confidence)
+    else:
+        label, confidence = _classify_fast_path(full_text, query_vector)
+        classification = (label, "fast_path", confidence) if label else None
+    return {
+        "snippet": full_text[:max(2000, config.DOC_TYPE_BATCH_SNIPPET_CHARS)],
+        "query_vector": query_vector,
+        "context": context,
+        "classification": classification,
+        "confidence": confidence,
+        "previous": previous,
+    }
+
+
+def _prepare_document_safe(source, version_scope="", versions_before=None):
+    try:
+        return _prepare_document(source, version_scope, versions_before)
+    except Exception as e:
+        return {"error": _parse_error(e)}
+
+
+def _classify_batch(sources, concurrency=1, timeout=None, version_scope="", versions_before=None):
+    """Classify every document of a batch up front, packing the LLM cases into shared calls.
+
+    Up to DOC_TYPE_BATCH_SIZE documents go into each packed prompt. Documents the
+    packed answer leaves out or labels with an unknown type get their own per-file
+    call. Returns one prepared dict per source, which _analyze_single_doc reuses
+    instead of retrieving and classifying again; a source that cannot be parsed
+    gets {"error": ...} instead and the rest of the batch carries on.
+    """
+    n_workers = max(1, min(concurrency, len(sources)))
+    size = max(1, config.DOC_TYPE_BATCH_SIZE)
+    with ThreadPoolExecutor(max_workers=n_workers) as pool, \
+            ThreadPoolExecutor(max_workers=n_workers) as call_pool:
+        prepared = [
+            f.result()
+            for f in [metrics.submit(pool, _prepare_document_safe, s, version_scope, versions_before) for s in sources]
+        ]
+
+        pending = [i for i, p in enumerate(prepared) if "error" not in p and p["classification"] is None]
+        groups = [pending[i:i + size] for i in range(0, len(pending), size)]
+        group_futures = [
+            metrics.submit(pool, _classify_packed, [prepared[i] for i in group], call_pool, timeout)
+            for group in groups
+        ]
+        failed = []
+        for group, future in zip(groups, group_futures):
+            for i, label in zip(group, future.result()):
+                if label:
+                    prepared[i]["classification"] = (label, "llm_batch", prepared[i]["confidence"])
+                else:
+                    failed.append(i)
+
+        if failed:
+            metrics.inc("corporate_agent_doc_type_batch_fallbacks_total", len(failed))
+            fallback_futures = [
+                metrics.submit(
+                    pool, _classify_with_llm, prepared[i]["snippet"], call_pool, timeout,
+                    [c["document"] for c in prepared[i]["context"]] if prepared[i]["context"] is not None else None
+                )
+                for i in failed
+            ]
+            for i, future in zip(failed, fallback_futures):
+                prepared[i]["classification"] = (future.result(), "llm", prepared[i]["confidence"])
+
+    for p in prepared:
+        p.pop("snippet", None)
+    return prepared
+
+
+def _review_document(ai_doc_type, full_text, call_pool=None, timeout=None, context_docs=None):
+    """Review chain (structured JSON)."""
+    try:
+        review_prompt = f"Review the following {ai_doc_type} for completeness and correctness:\n{full_text[:4000]}"
+        review_result = _invoke_chain(review_chain, "review", review_prompt, call_pool, timeout, context_docs)
+        review_json = _safe_parse_json(str(review_result))
+        if not review_json:
+            review_json = {"summary": str(review_result), "recommendations": []}
+    except Exception as e:
+        review_json = {"summary": f"Error generating review: {e}", "recommendations": []}
+    return review_json
+
+
+def _check_compliance(ai_doc_type, full_text, call_pool=None, timeout=None, context_docs=None):
+    """Compliance chain (strict JSON).
 
-    per_file_info = []
-    detected_types = []
+    Returns (issues, error). A failed call (retries exhausted, circuit open,
+    timeout) gives no issues and its error message, so it is reported as a
+    skipped check rather than as a finding in the document.
+    """
+    try:
+        compliance_prompt = f"Check compliance for {ai_doc_type}:\n{full_text[:4000]}"
+        compliance_result = _invoke_chain(compliance_chain, "compliance", compliance_prompt, call_pool, timeout, context_docs)
+    except Exception as e:
+        return [], str(e) or type(e).__name__
+    compliance_json = _safe_parse_json(str(compliance_result))
+    if not compliance_json:
+        compliance_json = [{
+            "section": "N/A",
+            "issue": str(compliance_result),
+            "severity": "Low",
+            "suggestion": ""
+        }]
+    return compliance_json, None
+
+
+_SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2}
+
+
+def _dedupe_findings(findings):
+    """Drop repeats of the same issue, keeping the highest severity."""
+    merged = []
+    seen = {}
+    for entry in findings:
+        key = re.sub(r"\s+", " ", str(entry.get("issue", ""))).strip().lower()
+        if key in seen:
+            kept = merged[seen[key]]
+            if _SEVERITY_RANK.get(str(entry.get("severity", "")).lower(), 0) > \
+                    _SEVERITY_RANK.get(str(kept.get("severity", "")).lower(), 0):
+                merged[seen[key]] = entry
+            continue
+        seen[key] = len(merged)
+        merged.append(entry)
+    return merged
 
-    for idx, doc_bytes in enumerate(docx_bytes_list):
-        filename = uploaded_filenames[idx]
-        doc = Document(io.BytesIO(doc_bytes))
-        full_text = "\n".join([p.text for p in doc.paragraphs])
 
-        # === 1. Document type detection (Embeddings only, no keyword fallback) ===
+def _anchor_by_similarity(chunks, pending, blocks):
+    """Anchor findings whose section label matched no block to their chunk's closest block.
+
+    `pending` maps chunk positions to their unmatched findings. Uses the same
+    semantic match as comment anchoring, so a finding is carried forward with the
+    section it is commented on.
+    """
+    indices = sorted({i for c in pending for i in chunks[c]["block_indices"]})
+    embedded, block_matrix = _embed_blocks([blocks[i] for i in indices])
+    row = {b["id"]: r for r, b in enumerate(embedded)}
+    for c, entries in pending.items():
+        rows = [row[blocks[i]["id"]] for i in chunks[c]["block_indices"] if blocks[i]["id"] in row]
+        if not rows:
+            continue
+        matches = _match_issues_to_blocks([embedded[r] for r in rows], block_matrix[rows], entries)
+        for entry, match in zip(entries, matches):
+            if match is not None:
+                entry.update(block_id=match["id"], section_matched=True)
+                entry.pop("chunk", None)
+
+
+def _merge_chunk_findings(chunks, chunk_results, blocks):
+    """Merge per-chunk compliance findings, dropping repeats of the same issue.
+
+    Each finding gets the block id of the clause it refers to, so comments can be
+    anchored without another search: by its section label (see locate_section),
+    else by semantic match of the label and issue within its chunk.
+    section_matched tells whether either worked. Findings naming no section
+    ("N/A") stay on the chunk's first block and keep the chunk's block range
+    ("chunk"), as they may concern any of its sections. Duplicates keep the
+    highest severity.
+    """
+    findings = []
+    pending = {}
+    for c, (chunk, issues) in enumerate(zip(chunks, chunk_results)):
+        if isinstance(issues, dict):
+            issues = [issues]
+        for issue in issues:
+            if not isinstance(issue, dict):
+                continue
+            entry = dict(issue)
+            idx, entry["section_matched"] = locate_section(chunk, issue.get("section", ""), blocks)
+            entry["block_id"] = blocks[idx]["id"]
+            if not entry["section_matched"]:
+                entry["chunk"] = [chunk["block_indices"][0], chunk["block_indices"][-1]]
+                if str(issue.get("section", "")).strip().lower() not in ("", "n/a"):
+                    pending.setdefault(c, []).append(entry)
+            findings.append(entry)
+    if pending:
         try:
-            ai_doc_type = doc_type_chain.invoke(full_text[:2000])
-            if isinstance(ai_doc_type, dict):
-                ai_doc_type = ai_doc_type.get("result") or ai_doc_type.get("answer") or str(ai_doc_type)
-            ai_doc_type = str(ai_doc_type).strip().strip('"')
+            _anchor_by_similarity(chunks, pending, blocks)
         except Exception:
-            ai_doc_type = None
+            pass  # those findings keep the chunk they came from
+    return _dedupe_findings(findings)
 
-        if not ai_doc_type:
-            ai_doc_type = "Classification Error"
 
-        detected_types.append(ai_doc_type)
+def _check_compliance_chunked(ai_doc_type, blocks, full_text, call_pool=None, timeout=None, context_docs=None,
+                              sections=None):
+    """Map-reduce compliance over section-aware chunks of the whole document (or of `sections`).
 
-        # === 2. Review chain (structured JSON) ===
-        try:
-            review_prompt = f"Review the following {ai_doc_type} for completeness and correctness:\n{full_text[:4000]}"
-            review_result = review_chain.invoke(review_prompt)
-            if isinstance(review_result, dict):
-                review_result = review_result.get("result") or review_result.get("answer") or str(review_result)
-            review_json = _safe_parse_json(str(review_result))
-            if not review_json:
-                review_json = {"summary": str(review_result), "recommendations": []}
-        except Exception as e:
-            review_json = {"summary": f"Error generating review: {e}", "recommendations": []}
-
-        # === 3. Compliance chain (strict JSON) ===
-        try:
-            compliance_prompt = f"Check compliance for {ai_doc_type}:\n{full_text[:4000]}"
-            compliance_result = compliance_chain.invoke(compliance_prompt)
-            if isinstance(compliance_result, dict):
-                compliance_result = compliance_result.get("result") or compliance_result.get("answer") or str(compliance_result)
-            compliance_json = _safe_parse_json(str(compliance_result))
-            if not compliance_json:
-                compliance_json = [{
-                    "section": "N/A",
-                    "issue": str(compliance_result),
-                    "severity": "Low",
-                    "suggestion": ""
-                }]
-        except Exception as e:
-            compliance_json = [{
-                "section": "N/A",
-                "issue": f"Compliance check failed: {e}",
-                "severity": "Low",
-                "suggestion": ""
-            }]
-
-        per_file_info.append({
+    Returns (findings, errors), with one {"section", "error"} per chunk whose call failed.
+    """
+    chunks = split_into_sections(blocks, full_text, config.COMPLIANCE_CHUNK_CHARS, sections)
+    if not chunks:
+        return [], []
+    if len(chunks) == 1:
+        chunk_results = [_check_compliance(ai_doc_type, chunks[0]["text"], call_pool, timeout, context_docs)]
+    else:
+        # Dedicated pools: each chunk task holds at most one chain-call slot
+        n_workers = min(config.COMPLIANCE_CHUNK_CONCURRENCY, len(chunks))
+        with ThreadPoolExecutor(max_workers=n_workers) as chunk_pool, \
+                ThreadPoolExecutor(max_workers=n_workers) as chunk_call_pool:
+            futures = [
+                metrics.submit(chunk_pool, _check_compliance, ai_doc_type, chunk["text"], chunk_call_pool, timeout, context_docs)
+                for chunk in chunks
+            ]
+            chunk_results = [f.result() for f in futures]
+    errors = [
+        {"section": chunk["heading"][:80], "error": error}
+        for chunk, (_, error) in zip(chunks, chunk_results) if error
+    ]
+    return _merge_chunk_findings(chunks, [issues for issues, _ in chunk_results], blocks), errors
+
+
+def _check_compliance_delta(ai_doc_type, blocks, full_text, previous, call_pool=None, timeout=None,
+                            context_docs=None):
+    """Compliance for a revised version of an analyzed document.
+
+    Sections whose fingerprint matches one of the earlier version keep its findings
+    (provenance "carried_forward", carried_from naming the file they were found in);
+    only the other sections are checked again ("rechecked"). A finding tied to no
+    clause (see _merge_chunk_findings) is only kept while every section of the
+    chunk it came from is unchanged, else the section holding it is checked again
+    too; so is every section when that would take as many calls as a full check.
+    Returns the findings in document order, {"sections_rechecked",
+    "sections_carried_forward"} and the errors of failed chunk calls.
+    """
+    sections = find_sections(blocks)
+    carried, changed = versions.carry_forward(previous, blocks, versions.block_fingerprints(blocks), sections)
+
+    # Scattered sections make small chunks; when that saves no calls, check everything
+    if changed and len(split_into_sections(blocks, full_text, config.COMPLIANCE_CHUNK_CHARS, changed)) >= \
+            len(split_into_sections(blocks, full_text, config.COMPLIANCE_CHUNK_CHARS)):
+        carried, changed = [], sections
+
+    rechecked, errors = [], []
+    if changed:
+        rechecked, errors = _check_compliance_chunked(
+            ai_doc_type, blocks, full_text, call_pool, timeout, context_docs, sections=changed
+        )
+        for entry in rechecked:
+            entry["provenance"] = "rechecked"
+
+    position = {b["id"]: idx for idx, b in enumerate(blocks)}
+    findings = sorted(_dedupe_findings(carried + rechecked), key=lambda f: position.get(f.get("block_id"), 0))
+    counts = {"sections_rechecked": len(changed), "sections_carried_forward": len(sections) - len(changed)}
+    return findings, counts, errors
+
+
+def _section_findings(blocks, block_fps, findings):
+    """{section fingerprint: findings} for the version store; every section gets an entry.
+
+    Findings are located by block id and keep their offset within the section, so a
+    later version can re-anchor them wherever that section moved. Findings tied to
+    no clause also get the fingerprints of their chunk's sections (chunk_fps).
+    """
+    sections = find_sections(blocks)
+    by_fp = {}
+    owner = {}
+    section_of = {}
+    for section in sections:
+        fp = versions.section_fingerprint(block_fps, section)
+        by_fp.setdefault(fp, [])
+        for offset, idx in enumerate(section):
+            owner[blocks[idx]["id"]] = (fp, offset)
+            section_of[idx] = fp
+    for finding in findings:
+        if not isinstance(finding, dict) or finding.get("block_id") not in owner:
+            continue
+        fp, offset = owner[finding["block_id"]]
+        entry = {k: v for k, v in finding.items() if k not in ("block_id", "provenance", "chunk")}
+        entry["block_offset"] = offset
+        if "chunk" in finding:
+            first, last = finding["chunk"]
+            entry["chunk_fps"] = sorted({section_of[i] for i in range(first, last + 1)})
+        by_fp[fp].append(entry)
+    return by_fp
+
+
+def _record_version(blocks, block_fps, filename, info, version_scope=""):
+    """Store this analysis for delta re-review of later versions, unless a chain call failed."""
+    if versions.version_store is None or info["chosen_type"] == "Classification Error":
+        return
+    if str(info["review_json"].get("summary", "")).startswith("Error generating review"):
+        return
+    if info["skipped_checks"]:
+        return
+    try:
+        versions.version_store.record(block_fps, _analysis_signature(), filename, {
+            "chosen_type": info["chosen_type"],
+            "classification_confidence": info["classification_confidence"],
+            "review_json": info["review_json"],
+            "compliance_issues": info["compliance_issues"],
+            "block_fps": block_fps,
+            "sections": _section_findings(blocks, block_fps, info["compliance_issues"]),
+        }, version_scope)
+    except Exception as e:
+        print(f"⚠️ Could not record analysis of {filename} for delta review: {e}")
+
+
+def _redact_previous_filenames(info):
+    """Drop earlier uploads' filenames from a document's results (carried_from, previous_version)."""
+    info["compliance_issues"] = [
+        dict(issue, carried_from=None) if isinstance(issue, dict) and issue.get("carried_from") else issue
+        for issue in info["compliance_issues"]
+    ]
+    if info["delta_review"] is not None:
+        info["delta_review"]["previous_version"] = None
+
+
+def _annotate_document(doc, blocks, pf):
+    """Add the AI review summary and one Word comment per issue to a parsed document.
+
+    Every anchor is resolved against `blocks` (the document as extracted, before any
+    edit); annotation.apply_review then writes the summary and comments in one pass.
+    """
+    # Anchor against the original blocks, before the summary is appended.
+    # Chunked findings carry their block id; the rest need a semantic match.
+    by_id = {b["id"]: b for b in blocks}
+    anchors = [
+        by_id.get(issue.get("block_id")) if isinstance(issue, dict) else None
+        for issue in pf["compliance_issues"]
+    ]
+    unanchored = [i for i, a in enumerate(anchors) if a is None]
+    if unanchored:
+        embedded, block_matrix = _embed_blocks(blocks)
+        matches = _match_issues_to_blocks(
+            embedded, block_matrix, [pf["compliance_issues"][i] for i in unanchored]
+        )
+        for i, match in zip(unanchored, matches):
+            anchors[i] = match
+
+    # === Apply every edit in one pass ===
+    annotation.apply_review(doc, pf, [b["element"] if b is not None else None for b in anchors])
+
+
+def _save_reviewed(doc, index, filename, output_dir=None):
+    """Save an annotated document to `output_dir` (returns the path) or to bytes."""
+    if output_dir:
+        path = os.path.join(output_dir, f"{index}_reviewed_{os.path.basename(filename)}")
+        doc.save(path)
+        return path
+    out_stream = io.BytesIO()
+    doc.save(out_stream)
+    out_stream.seek(0)
+    return out_stream.read()
+
+
+def _parse_error(error):
+    metrics.inc("corporate_agent_documents_skipped_total")
+    return f"Could not read the document as DOCX ({type(error).__name__}: {error})"
+
+
+def _open_docx(source):
+    """Parse a DOCX given as bytes, a file path or a binary file object."""
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    elif hasattr(source, "seek"):
+        source.seek(0)  # file objects may already have been read by the classification pass
+    return Document(source)
+
+
+def _analyze_single_doc(source, filename, index=0, call_pool=None, timeout=None, output_dir=None, prepared=None,
+                        version_scope="", versions_before=None):
+    """Run classification, review and compliance for one DOCX, then annotate and save it.
+
+    With a `call_pool`, review and compliance run concurrently once the type is known.
+    All three chains share one retrieval over the ADGM index. `prepared` (from
+    _classify_batch) supplies that retrieval and the document type. The parsed
+    document is released before returning; only the results and the saved output
+    are kept.
+
+    When an earlier version of the document was analyzed in the same `version_scope`
+    before `versions_before` (see versions), its type is reused, an identical version keeps all of its findings, and a revised one is
+    re-checked only in the sections that changed.
+
+    A document that cannot be parsed returns {"filename", "error"} instead.
+    """
+    if prepared is not None and "error" in prepared:
+        return {"filename": filename, "error": prepared["error"]}
+    try:
+        with metrics.timed("docx_parse"):
+            doc = _open_docx(source)
+            blocks = docx_blocks.extract_blocks(doc)
+    except Exception as e:
+        return {"filename": filename, "error": _parse_error(e)}
+    full_text = docx_blocks.full_text(blocks)
+    block_fps = versions.block_fingerprints(blocks)
+    previous = (prepared["previous"] if prepared is not None
+                else _find_previous_version(block_fps, version_scope, versions_before))
+
+    # === 0. Shared retrieval (one embedding + one FAISS search per document) ===
+    if prepared is None:
+        query_vector, context = _shared_context(full_text)
+    else:
+        query_vector, context = prepared["query_vector"], prepared["context"]
+    context_docs = [c["document"] for c in context] if context is not None else None
+
+    # === 1. Document type detection ===
+    if prepared is None and previous is not None:
+        ai_doc_type, classification_method, classification_confidence = (
+            previous["chosen_type"], "carried_forward", previous["classification_confidence"]
+        )
+    elif prepared is None:
+        ai_doc_type, classification_method, classification_confidence = _classify_document(
+            full_text, call_pool, timeout, context_docs, query_vector
+        )
+    else:
+        ai_doc_type, classification_method, classification_confidence = prepared["classification"]
+
+    # === 2./3. Review and compliance chains ===
+    delta = None
+    if previous is not None:
+        delta = {
             "filename": filename,
-            "chosen_type": ai_doc_type,
-            "review_json": review_json,
-            "compliance_issues": compliance_json,
-            "doc_object": doc
-        })
+            "previous_version": previous["filename"],
+            "previous_analyzed_at": previous["analyzed_at"],
+            "similarity": previous["similarity"],
+            "blocks": versions.diff_blocks(previous["block_fps"], block_fps),
+        }
+
+    def check(pool=None):
+        if previous is not None and previous["exact"]:
+            carried = [
+                dict(issue, provenance="carried_forward", carried_from=issue.get("carried_from") or previous["filename"])
+                for issue in previous["compliance_issues"]
+            ]
+            delta.update({"sections_rechecked": 0, "sections_carried_forward": len(find_sections(blocks))})
+            return carried, []
+        if previous is not None and config.COMPLIANCE_CHUNKING:
+            findings, counts, errors = _check_compliance_delta(
+                ai_doc_type, blocks, full_text, previous, pool, timeout, context_docs
+            )
+            delta.update(counts)
+            return findings, errors
+        if config.COMPLIANCE_CHUNKING:
+            return _check_compliance_chunked(ai_doc_type, blocks, full_text, pool, timeout, context_docs)
+        issues, error = _check_compliance(ai_doc_type, full_text, pool, timeout, context_docs)
+        return issues, [{"section": "N/A", "error": error}] if error else []
+
+    # The review reads the whole document, so only an identical version reuses it
+    if previous is not None and previous["exact"]:
+        review_json = previous["review_json"]
+        compliance_json, compliance_errors = check()
+    elif call_pool is None:
+        review_json = _review_document(ai_doc_type, full_text, context_docs=context_docs)
+        compliance_json, compliance_errors = check()
+    else:
+        # The review task makes its call itself rather than queueing a second one on the same
+        # pool; the client's retry deadline (llm_client) bounds it, so the future always finishes
+        review_future = metrics.submit(call_pool, _review_document, ai_doc_type, full_text, context_docs=context_docs)
+        compliance_json, compliance_errors = check(call_pool)
+        review_json = review_future.result()
+
+    info = {
+        "filename": filename,
+        "chosen_type": ai_doc_type,
+        "classification_method": classification_method,
+        "classification_confidence": classification_confidence,
+        "review_json": review_json,
+        "compliance_issues": compliance_json,
+        # Chain calls that failed; reported, but never written into the document as findings
+        "skipped_checks": [dict(error, check="compliance") for error in compliance_errors],
+        "retrieved_context": context_summary(context) if context is not None else [],
+        "delta_review": delta,
+    }
+    if previous is None or not previous["exact"]:
+        _record_version(blocks, block_fps, filename, info, version_scope)
+    if not version_scope:
+        # Uploads without a client id share one history; never show another uploader's filenames
+        _redact_previous_filenames(info)
+
+    # === Annotate and write out this document ===
+    with metrics.timed("annotate"):
+        _annotate_document(doc, blocks, info)
+    with metrics.timed("docx_save"):
+        info["reviewed"] = _save_reviewed(doc, index, filename, output_dir)
+    metrics.inc("corporate_agent_documents_total")
+    return info
+
+
+def analyze_and_comment_docx_batch(docx_bytes_list, uploaded_filenames=None, concurrency=None, call_timeout=None,
+                                   progress_callback=None, output_dir=None, include_timings=None,
+                                   version_scope=""):
+    """Analyze a batch of DOCX files and return (reviewed_docs, combined_report).
+
+    Stage latencies are recorded for /metrics; with `include_timings` (defaults to
+    config.REPORT_TIMINGS) the report also gets this request's per-stage breakdown.
+    See _analyze_batch for the other arguments.
+    """
+    if include_timings is None:
+        include_timings = config.REPORT_TIMINGS
+    recorder, token = metrics.start_request()
+    try:
+        reviewed_docs, combined_report = _analyze_batch(
+            docx_bytes_list, uploaded_filenames, concurrency, call_timeout, progress_callback, output_dir,
+            version_scope
+        )
+    finally:
+        metrics.end_request(token)
+    if include_timings:
+        combined_report["timings"] = recorder.summary()
+    return reviewed_docs, combined_report
+
+
+def _analyze_batch(docx_bytes_list, uploaded_filenames=None, concurrency=None, call_timeout=None,
+                   progress_callback=None, output_dir=None, version_scope=""):
+    """Analyze a batch of DOCX files and return (reviewed_docs, combined_report).
+
+    Items of `docx_bytes_list` may be bytes, file paths or binary file objects. Each
+    document is parsed, analyzed, annotated and written out by its own task, so at
+    most `concurrency` documents are held in memory. With `output_dir`, reviewed
+    files are saved there and reviewed_docs holds (filename, path) pairs instead of
+    (filename, bytes).
+
+    `concurrency` caps how many files are analyzed in parallel (defaults to
+    config.ANALYSIS_CONCURRENCY); 1 keeps the original serial path. `call_timeout`
+    bounds each LLM chain call in seconds in the concurrent mode. With
+    DOC_TYPE_BATCH_MODE="packed", all documents are classified in a first pass that
+    packs the LLM cases into shared prompts. `progress_callback`,
+    if given, receives a dict event as each document finishes analysis (possibly
+    from a worker thread). `version_scope` (e.g. a client id) limits which earlier
+    analyses count as previous versions of the uploads (see versions). Only analyses
+    stored before the batch started count, so the report never depends on the order
+    in which files of the same batch finish.
+    """
+    if uploaded_filenames is None:
+        uploaded_filenames = [f"doc_{i+1}.docx" for i in range(len(docx_bytes_list))]
+    if concurrency is None:
+        concurrency = config.ANALYSIS_CONCURRENCY
+    if call_timeout is None:
+        call_timeout = config.LLM_CALL_TIMEOUT
+    versions_before = time.time()
+
+    prepared = [None] * len(docx_bytes_list)
+    if config.DOC_TYPE_BATCH_MODE == "packed" and len(docx_bytes_list) > 1:
+        with metrics.timed("classify_batch"):
+            prepared = _classify_batch(docx_bytes_list, concurrency, call_timeout, version_scope, versions_before)
+
+    def _analyze_and_report(idx, doc_bytes, call_pool=None):
+        info = _analyze_single_doc(
+            doc_bytes, uploaded_filenames[idx], idx, call_pool, call_timeout, output_dir, prepared[idx],
+            version_scope, versions_before
+        )
+        if progress_callback and "error" in info:
+            progress_callback({
+                "event": "document_skipped",
+                "index": idx,
+                "filename": info["filename"],
+                "error": info["error"]
+            })
+        elif progress_callback:
+            progress_callback({
+                "event": "document_analyzed",
+                "index": idx,
+                "filename": info["filename"],
+                "document_type": info["chosen_type"],
+                "issues": len(info["compliance_issues"])
+            })
+        return info
+
+    if concurrency <= 1 or len(docx_bytes_list) == 0:
+        per_file_info = [
+            _analyze_and_report(idx, doc_bytes)
+            for idx, doc_bytes in enumerate(docx_bytes_list)
+        ]
+    else:
+        # Separate pools so file tasks never wait on a slot held by themselves. An active
+        # file holds at most two call slots at once: its review task and one classification
+        # or single-chunk compliance call (multi-chunk compliance has its own pools).
+        n_files = min(concurrency, len(docx_bytes_list))
+        with ThreadPoolExecutor(max_workers=n_files * 2) as call_pool, \
+                ThreadPoolExecutor(max_workers=n_files) as file_pool:
+            futures = [
+                metrics.submit(file_pool, _analyze_and_report, idx, doc_bytes, call_pool)
+                for idx, doc_bytes in enumerate(docx_bytes_list)
+            ]
+            # Keep upload order so the report matches the serial path
+            per_file_info = [f.result() for f in futures]
+
+    # Unreadable uploads are reported but take no part in the analysis
+    skipped_docs = [pf for pf in per_file_info if "error" in pf]
+    per_file_info = [pf for pf in per_file_info if "error" not in pf]
+
+    detected_types = [pf["chosen_type"] for pf in per_file_info]
 
     # === 4. Determine process type ===
-    process_scores = {}
-    for proc, required_list in CHECKLISTS.items():
-        score = sum(1 for r in required_list if r in detected_types)
-        process_scores[proc] = score
+    # One similarity pass serves both process scoring and the missing-document check
+    with metrics.timed("checklist"):
+        matched_types = match_checklist_types(detected_types)
+        process_scores = score_processes(matched_types)
 
     chosen_process = max(process_scores.items(), key=lambda x: (x[1], -len(CHECKLISTS.get(x[0], []))))[0]
     required_docs = CHECKLISTS.get(chosen_process, [])
     uploaded_docs_count = len(docx_bytes_list)
-    checklist_result = compare_against_checklist(chosen_process, detected_types)
+    checklist_result = compare_against_checklist(chosen_process, detected_types, matched_types=matched_types)
     missing_docs = checklist_result.get("missing_documents", [])
 
     # === 5. Aggregate issues & reviews ===
@@ -152,7 +908,9 @@ def analyze_and_comment_docx_batch(docx_bytes_list, uploaded_filenames=None):
                 "section": issue.get("section", "N/A"),
                 "issue": issue.get("issue", ""),
                 "severity": issue.get("severity", "Low"),
-                "suggestion": issue.get("suggestion", "")
+                "suggestion": issue.get("suggestion", ""),
+                "provenance": issue.get("provenance", "new"),
+                "carried_from": issue.get("carried_from")
             })
         review_summaries.append({
             "document": pf["chosen_type"],
@@ -161,54 +919,40 @@ def analyze_and_comment_docx_batch(docx_bytes_list, uploaded_filenames=None):
             "recommendations": pf["review_json"].get("recommendations", [])
         })
 
-    # === 6. Annotate DOCX files ===
-    reviewed_docs = []
-    for pf in per_file_info:
-        doc = pf["doc_object"]
-
-        header_para = doc.add_paragraph("=== AI REVIEW SUMMARY ===")
-        header_para.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-        header_para.runs[0].bold = True
-        doc.add_paragraph(f"Document Type: {pf['chosen_type']}")
-        doc.add_paragraph("Summary:")
-        doc.add_paragraph(f"- {pf['review_json'].get('summary', '')}")
-
-        doc.add_paragraph(f"Issues Found ({len(pf['compliance_issues'])}):")
-        for idx, issue in enumerate(pf["compliance_issues"], start=1):
-            doc.add_paragraph(f"{idx}. {issue.get('issue', '')}")
-
-        if pf["review_json"].get("recommendations"):
-            doc.add_paragraph("Recommendations:")
-            for rec in pf["review_json"]["recommendations"]:
-                doc.add_paragraph(f"- {rec}")
-
-        for issue in pf["compliance_issues"]:
-            sec = issue.get("section", "")
-            issue_text = issue.get("issue", "")
-            suggestion = issue.get("suggestion", "")
-            matched_para = None
-            if sec and sec != "N/A":
-                matched_para = _find_best_matching_paragraph(doc, sec)
-            if not matched_para and issue_text:
-                matched_para = _find_best_matching_paragraph(doc, issue_text)
-            comment_text = f"{issue_text} | Suggestion: {suggestion}"
-            if matched_para:
-                _add_comment_below_paragraph(matched_para, comment_text)
-            else:
-                _add_comment_below_paragraph(doc.paragraphs[0], comment_text)
-
-        out_stream = io.BytesIO()
-        doc.save(out_stream)
-        out_stream.seek(0)
-        reviewed_docs.append((pf["filename"], out_stream.read()))
+    # === 6. Reviewed DOCX files (annotated per document during analysis) ===
+    reviewed_docs = [(pf["filename"], pf["reviewed"]) for pf in per_file_info]
 
     combined_report = {
         "process": chosen_process,
         "documents_uploaded": uploaded_docs_count,
         "required_documents": len(required_docs),
         "missing_documents": missing_docs,
+        "skipped_documents": skipped_docs,
+        "skipped_checks": [
+            dict(check, filename=pf["filename"]) for pf in per_file_info for check in pf["skipped_checks"]
+        ],
         "issues_found": issues_found,
-        "reviews": review_summaries
+        "reviews": review_summaries,
+        "retrieved_context": [
+            {"filename": pf["filename"], "chunks": pf["retrieved_context"]}
+            for pf in per_file_info
+        ],
+        # Documents recognised as new versions of earlier uploads (see versions)
+        "delta_review": [pf["delta_review"] for pf in per_file_info if pf["delta_review"] is not None],
+        "classification_stats": {
+            "fast_path": sum(1 for pf in per_file_info if pf["classification_method"] == "fast_path"),
+            "llm": sum(1 for pf in per_file_info if pf["classification_method"] == "llm"),
+            "llm_batch": sum(1 for pf in per_file_info if pf["classification_method"] == "llm_batch"),
+            "carried_forward": sum(1 for pf in per_file_info if pf["classification_method"] == "carried_forward"),
+            "documents": [
+                {
+                    "filename": pf["filename"],
+                    "method": pf["classification_method"],
+                    "confidence": pf["classification_confidence"]
+                }
+                for pf in per_file_info
+            ]
+        }
     }
 
     return reviewed_docs, combined_report
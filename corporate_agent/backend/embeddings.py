@@ -0,0 +1,222 @@
+"""ONNX Runtime embedding backend, optionally int8-quantized, plus a parity check.
+
+Selected with EMBEDDINGS_BACKEND=onnx or onnx-int8 (see registry.get_embeddings).
+It runs the same sentence-transformers model without importing PyTorch. To
+compare a backend against the PyTorch embeddings:
+
+    python embeddings.py --backend onnx-int8 --samples 300
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+from langchain_core.embeddings import Embeddings
+import config
+
+
+def _repo_id(model_name):
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def resolve_model_dir(model_name):
+    """Local directory with tokenizer.json and the ONNX export of `model_name`.
+
+    EMBEDDINGS_ONNX_DIR wins when set (offline nodes); otherwise the files are
+    fetched from the Hugging Face Hub cache.
+    """
+    if config.EMBEDDINGS_ONNX_DIR:
+        return config.EMBEDDINGS_ONNX_DIR
+    from huggingface_hub import snapshot_download
+    return snapshot_download(
+        _repo_id(model_name),
+        allow_patterns=["tokenizer.json", "modules.json", "sentence_bert_config.json", "onnx/model.onnx"]
+    )
+
+
+def _onnx_path(model_dir):
+    for candidate in ("onnx/model.onnx", "model.onnx"):
+        path = os.path.join(model_dir, candidate)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"No model.onnx found in {model_dir}")
+
+
+def quantized_model_path(model_name, model_dir):
+    """Path of an int8 (dynamically quantized) copy of the model, created on first use."""
+    target_dir = os.path.join(config.EMBEDDINGS_ONNX_CACHE, _repo_id(model_name).replace("/", "__"))
+    target = os.path.join(target_dir, "model_int8.onnx")
+    if not os.path.exists(target):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        os.makedirs(target_dir, exist_ok=True)
+        tmp = target + ".tmp"
+        quantize_dynamic(_onnx_path(model_dir), tmp, weight_type=QuantType.QInt8)
+        os.replace(tmp, target)
+        print(f"🗜️ Quantized {_repo_id(model_name)} to int8 at {target}")
+    return target
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers style embeddings (mean pooling) on ONNX Runtime.
+
+    Texts are tokenized and run in batches of `batch_size`, sorted by length so
+    each batch pads as little as possible. `threads` caps ONNX Runtime's intra-op
+    threads (0 keeps its default). Vectors are L2-normalized when the model's
+    modules.json includes a Normalize step, matching SentenceTransformer output.
+    """
+
+    def __init__(self, model_name, quantize=False, batch_size=64, threads=0):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(f"EMBEDDINGS_BACKEND={config.EMBEDDINGS_BACKEND} needs onnxruntime and tokenizers: {e}")
+
+        model_dir = resolve_model_dir(model_name)
+        model_path = quantized_model_path(model_name, model_dir) if quantize else _onnx_path(model_dir)
+
+        modules = _read_json(os.path.join(model_dir, "modules.json"), [])
+        self.normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+        max_length = _read_json(os.path.join(model_dir, "sentence_bert_config.json"), {}).get("max_seq_length", 256)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = max(1, batch_size)
+        self.model_path = model_path
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def _embed(self, texts):
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        out = None
+        for start in range(0, len(texts), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            vectors = self._embed_batch([texts[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[idx] = vectors
+        return out
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self._embed([text])[0].tolist()
+
+
+# === Parity check ===
+def _sample_texts(n):
+    """Non-empty paragraphs and table cells from the DOCX templates in ADGM_SOURCES_DIR."""
+    from docx_blocks import extract_blocks_from_file
+    texts = []
+    for name in sorted(os.listdir(config.ADGM_SOURCES_DIR)):
+        if name.lower().endswith(".docx"):
+            blocks = extract_blocks_from_file(os.path.join(config.ADGM_SOURCES_DIR, name))
+            texts.extend(b["text"].strip() for b in blocks if len(b["text"].strip()) > 20)
+        if len(texts) >= n:
+            break
+    return texts[:n]
+
+
+def _timed_embed(model, texts):
+    start = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float32)
+    return vectors, time.perf_counter() - start
+
+
+def parity_check(backend, samples=300, k=5):
+    """Compare `backend` embeddings with the PyTorch ones on template paragraphs.
+
+    Reports per-text cosine similarity, agreement of each text's top-k nearest
+    neighbours within the sample, and the time each backend took.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    texts = _sample_texts(samples)
+    if not texts:
+        raise SystemExit(f"No sample paragraphs found in {config.ADGM_SOURCES_DIR}")
+
+    start = time.perf_counter()
+    reference = HuggingFaceEmbeddings(model_name=config.EMBEDDINGS_MODEL)
+    reference_load = time.perf_counter() - start
+    start = time.perf_counter()
+    candidate = OnnxEmbeddings(
+        config.EMBEDDINGS_MODEL, quantize=backend == "onnx-int8",
+        batch_size=config.EMBED_BATCH_SIZE, threads=config.EMBEDDINGS_THREADS
+    )
+    candidate_load = time.perf_counter() - start
+
+    ref, ref_seconds = _timed_embed(reference, texts)
+    cand, cand_seconds = _timed_embed(candidate, texts)
+
+    def unit(m):
+        return m / np.clip(np.linalg.norm(m, axis=1, keepdims=True), 1e-12, None)
+
+    cosines = np.sum(unit(ref) * unit(cand), axis=1)
+    k = min(k, len(texts) - 1)
+    overlap = None
+    if k > 0:
+        def neighbours(m):
+            sims = unit(m) @ unit(m).T
+            np.fill_diagonal(sims, -np.inf)
+            return np.argsort(-sims, axis=1)[:, :k]
+        ref_nn, cand_nn = neighbours(ref), neighbours(cand)
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_nn, cand_nn)]))
+
+    return {
+        "backend": backend,
+        "samples": len(texts),
+        "cosine_mean": round(float(cosines.mean()), 5),
+        "cosine_min": round(float(cosines.min()), 5),
+        f"top{k}_neighbour_overlap": round(overlap, 4) if overlap is not None else None,
+        "load_seconds": {"torch": round(reference_load, 3), backend: round(candidate_load, 3)},
+        "embed_seconds": {"torch": round(ref_seconds, 3), backend: round(cand_seconds, 3)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check an embedding backend against the PyTorch model.")
+    parser.add_argument("--backend", choices=("onnx", "onnx-int8"), default="onnx-int8")
+    parser.add_argument("--samples", type=int, default=300, help="Template paragraphs to embed.")
+    parser.add_argument("--min-cosine", type=float, default=0.98,
+                        help="Exit non-zero if any text's cosine similarity falls below this.")
+    args = parser.parse_args()
+
+    report = parity_check(args.backend, args.samples)
+    print(json.dumps(report, indent=2))
+    if report["cosine_min"] < args.min_cosine:
+        print(f"❌ Parity below {args.min_cosine}; rebuild the index with this backend before switching.")
+        raise SystemExit(1)
+    print("✅ Embeddings match the PyTorch backend.")
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from docx_processing import analyze_and_comment_docx_batch
+import config
+
+
+class QueueFullError(Exception):
+    """Raised when a new job would exceed the queued-jobs or upload-bytes limits."""
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobManager:
+    """Job queue running batch analyses on a bounded worker pool, with state in SQLite.
+
+    A job runs in the process that accepted it, but its status, progress events
+    and result live in a SQLite file shared by every API worker, so any worker can
+    answer /jobs requests. Each job owns a working directory holding its spooled
+    uploads and reviewed outputs, removed when the job expires. Admission is
+    limited by both the number of unfinished jobs and their total upload size,
+    across all workers.
+    """
+
+    def __init__(self, path, workers, max_pending_jobs, max_pending_bytes, result_ttl):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-job")
+        self._lock = threading.Lock()
+        self.max_pending_jobs = max_pending_jobs
+        self.max_pending_bytes = max_pending_bytes
+        self.result_ttl = result_ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Several processes write here: wait for their locks instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT, filenames TEXT, documents_total INTEGER, "
+            "documents_done INTEGER, error TEXT, result TEXT, upload_bytes INTEGER, workdir TEXT, "
+            "created_at REAL, finished_at REAL, pid INTEGER);"
+            "CREATE TABLE IF NOT EXISTS job_events (job_id TEXT, event TEXT);"
+            "CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id);"
+        )
+
+    def submit(self, doc_paths, filenames, upload_bytes, workdir, version_scope=""):
+        """Queue a batch of spooled uploads for analysis and return its job id.
+
+        The job takes ownership of `workdir`; it is deleted when the job expires or
+        is rejected.
+        """
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            # One write transaction, so concurrent workers cannot both pass the limits
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._evict_expired()
+                pending, pending_bytes = self._conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(upload_bytes), 0) FROM jobs WHERE status IN ('queued', 'running')"
+                ).fetchone()
+                if pending >= self.max_pending_jobs:
+                    raise QueueFullError(f"Too many pending jobs ({pending}), try again later")
+                if pending_bytes + upload_bytes > self.max_pending_bytes:
+                    raise QueueFullError("Pending upload size limit reached, try again later")
+                self._conn.execute(
+                    "INSERT INTO jobs (job_id, status, filenames, documents_total, documents_done, upload_bytes, "
+                    "workdir, created_at, pid) VALUES (?, 'queued', ?, ?, 0, ?, ?, ?, ?)",
+                    (job_id, json.dumps(list(filenames)), len(doc_paths), upload_bytes, workdir, time.time(),
+                     os.getpid())
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                shutil.rmtree(workdir, ignore_errors=True)
+                raise
+
+        self._pool.submit(self._run, job_id, doc_paths, filenames, version_scope)
+        return job_id
+
+    def _run(self, job_id, doc_paths, filenames, version_scope=""):
+        self._update(job_id, status="running")
+
+        def on_progress(event):
+            with self._lock:
+                if event.get("event") in ("document_analyzed", "document_skipped"):
+                    self._conn.execute(
+                        "UPDATE jobs SET documents_done = documents_done + 1 WHERE job_id = ?", (job_id,)
+                    )
+                self._conn.execute("INSERT INTO job_events (job_id, event) VALUES (?, ?)",
+                                   (job_id, json.dumps(event)))
+
+        try:
+            output_dir = os.path.join(self._workdir(job_id), "reviewed")
+            os.makedirs(output_dir, exist_ok=True)
+            reviewed_docs, combined_report = analyze_and_comment_docx_batch(
+                doc_paths,
+                uploaded_filenames=filenames,
+                progress_callback=on_progress,
+                output_dir=output_dir,
+                version_scope=version_scope
+            )
+            # Reviewed documents are files in the job's workdir, readable by every worker
+            self._finish(job_id, "completed", result={
+                "reviewed_docs": [[fname, path] for fname, path in reviewed_docs],
+                "combined_report": combined_report
+            })
+        except Exception as e:
+            self._finish(job_id, "failed", error=str(e))
+
+    def _workdir(self, job_id):
+        with self._lock:
+            return self._conn.execute("SELECT workdir FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE job_id = ?",
+                list(fields.values()) + [job_id]
+            )
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            self._conn.execute("INSERT INTO job_events (job_id, event) VALUES (?, ?)",
+                               (job_id, json.dumps({"event": status, "error": error})))
+
+    def _evict_expired(self):
+        expired = self._conn.execute(
+            "SELECT job_id, workdir FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+            (time.time() - self.result_ttl,)
+        ).fetchall()
+        for job_id, workdir in expired:
+            shutil.rmtree(workdir, ignore_errors=True)
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            self._conn.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+
+    def _fail_orphaned(self, job_id, status, pid):
+        # The worker running the job exited (crash or restart); nobody will finish it
+        if status in ("queued", "running") and pid != os.getpid() and not _pid_alive(pid):
+            self._finish(job_id, "failed", error="The API worker running this job exited")
+            return True
+        return False
+
+    def get(self, job_id):
+        """Return the job record (without result payload) or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, filenames, documents_total, documents_done, error, upload_bytes, "
+                "created_at, finished_at, pid FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        if self._fail_orphaned(job_id, row[1], row[9]):
+            return self.get(job_id)
+        job = dict(zip(("job_id", "status", "filenames", "documents_total", "documents_done", "error",
+                        "upload_bytes", "created_at", "finished_at"), row[:9]))
+        job["filenames"] = json.loads(job["filenames"])
+        job["events"] = self._events(job_id)
+        return job
+
+    def _events(self, job_id, offset=0):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT event FROM job_events WHERE job_id = ? ORDER BY rowid LIMIT -1 OFFSET ?", (job_id, offset)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_result(self, job_id):
+        """Return (reviewed_docs, combined_report) for a completed job, else None."""
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        result = json.loads(row[0])
+        return [tuple(d) for d in result["reviewed_docs"]], result["combined_report"]
+
+    def events_since(self, job_id, offset):
+        """Return (new_events, finished) for streaming progress from `offset`."""
+        job = self.get(job_id)
+        if job is None:
+            return [], True
+        return job["events"][offset:], job["status"] in ("completed", "failed")
+
+
+job_manager = JobManager(
+    config.JOB_STORE_PATH,
+    workers=config.JOB_WORKERS,
+    max_pending_jobs=config.MAX_PENDING_JOBS,
+    max_pending_bytes=config.MAX_PENDING_UPLOAD_BYTES,
+    result_ttl=config.JOB_RESULT_TTL
+)
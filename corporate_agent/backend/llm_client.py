@@ -0,0 +1,272 @@
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any
+import httpx
+import groq
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_groq import ChatGroq
+import config
+import metrics
+from metrics import LLMMetricsHandler
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling Groq while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`.
+
+    A rate of 0 disables the bucket. Requests larger than the capacity are clipped to
+    it so they wait for a full bucket rather than forever.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self, amount):
+        """Take `amount` now if possible; otherwise return the seconds to wait."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= amount:
+            self._tokens -= amount
+            return 0.0
+        return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available; returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = self._reserve(amount)
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def try_acquire(self, amount=1):
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            return self._reserve(min(amount, self.capacity)) <= 0
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive transient failures.
+
+    While open, calls fail fast for `reset_seconds`; then one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold > 0:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return {"state": self._state(), "consecutive_failures": self._failures}
+
+
+# === Shared client state (one Groq account, one pool for every chain) ===
+http_client = httpx.Client(
+    limits=httpx.Limits(
+        max_connections=config.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=config.LLM_MAX_CONNECTIONS
+    ),
+    timeout=config.LLM_REQUEST_TIMEOUT
+)
+request_bucket = TokenBucket(config.LLM_REQUESTS_PER_MINUTE)
+token_bucket = TokenBucket(config.LLM_TOKENS_PER_MINUTE)
+circuit_breaker = CircuitBreaker(config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET_SECONDS)
+_hedge_pool = ThreadPoolExecutor(max_workers=config.LLM_MAX_CONNECTIONS, thread_name_prefix="llm-call")
+
+_RETRYABLE_STATUS = (408, 409, 429)
+
+
+def _is_retryable(exc):
+    if isinstance(exc, (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in _RETRYABLE_STATUS or (status is not None and status >= 500)
+
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header on a Groq error, if any."""
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _estimate_tokens(messages):
+    # About 4 characters per token plus the completion we expect back
+    return sum(len(str(m.content)) for m in messages) // 4 + config.LLM_EXPECTED_COMPLETION_TOKENS
+
+
+class ResilientChatModel(BaseChatModel):
+    """Chat model wrapper adding rate limiting, retries, hedging and a circuit breaker.
+
+    Every call waits for the shared request and token buckets, then runs on the
+    wrapped model. Transient errors (connection problems, 429, 5xx) are retried
+    with jittered exponential backoff, honouring Retry-After. A call still running
+    after LLM_HEDGE_AFTER seconds gets a duplicate request, and the first answer
+    wins. Repeated transient failures open the shared circuit breaker, after which
+    calls fail fast with CircuitOpenError.
+    """
+
+    inner: Any
+    chain_name: str
+
+    @property
+    def _llm_type(self):
+        return f"resilient-{self.inner._llm_type}"
+
+    def _call_inner(self, messages, stop, **kwargs):
+        return self.inner._generate(messages, stop=stop, **kwargs)
+
+    def _call_hedged(self, messages, stop, estimate, **kwargs):
+        if config.LLM_HEDGE_AFTER <= 0:
+            return self._call_inner(messages, stop, **kwargs)
+        primary = _hedge_pool.submit(self._call_inner, messages, stop, **kwargs)
+        done, _ = wait([primary], timeout=config.LLM_HEDGE_AFTER)
+        if done or not (request_bucket.try_acquire() and token_bucket.try_acquire(estimate)):
+            return primary.result()
+
+        metrics.inc("corporate_agent_llm_hedges_total", chain=self.chain_name)
+        pending = {primary, _hedge_pool.submit(self._call_inner, messages, stop, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        estimate = _estimate_tokens(messages)
+        # No retry starts after LLM_CALL_TIMEOUT, so a call (and the pool slot running it) ends
+        # within about LLM_CALL_TIMEOUT + LLM_REQUEST_TIMEOUT even when every attempt hangs
+        deadline = time.monotonic() + config.LLM_CALL_TIMEOUT if config.LLM_CALL_TIMEOUT > 0 else None
+        for attempt in range(config.LLM_MAX_RETRIES + 1):
+            if not circuit_breaker.allow():
+                metrics.inc("corporate_agent_llm_circuit_rejections_total", chain=self.chain_name)
+                raise CircuitOpenError("Groq circuit breaker is open; call skipped")
+
+            waited = request_bucket.acquire() + token_bucket.acquire(estimate)
+            if waited:
+                metrics.observe("rate_limit_wait", waited, chain=self.chain_name)
+            try:
+                result = self._call_hedged(messages, stop, estimate, **kwargs)
+            except Exception as e:
+                if not _is_retryable(e):
+                    circuit_breaker.record_success()  # the service answered; the request was bad
+                    raise
+                circuit_breaker.record_failure()
+                if attempt == config.LLM_MAX_RETRIES:
+                    raise
+                retry_after = _retry_after(e)
+                if isinstance(e, groq.RateLimitError):
+                    request_bucket.pause(retry_after or config.LLM_BACKOFF_BASE)
+                # Full jitter, but never sooner than the server asked for
+                delay = random.uniform(0, min(config.LLM_BACKOFF_MAX, config.LLM_BACKOFF_BASE * 2 ** attempt))
+                delay = max(delay, retry_after or 0)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                metrics.inc("corporate_agent_llm_retries_total", chain=self.chain_name, reason=type(e).__name__)
+                time.sleep(delay)
+                continue
+            circuit_breaker.record_success()
+            return result
+
+
+def build_chat_model(chain_name):
+    """Groq chat model for one chain, sharing the HTTP pool, rate limits and breaker."""
+    inner = ChatGroq(
+        groq_api_key=config.GROQ_API_KEY,
+        groq_api_base=config.GROQ_BASE_URL,
+        model_name=config.GROQ_MODEL,
+        temperature=0,
+        max_retries=0,  # retries are handled by ResilientChatModel
+        request_timeout=config.LLM_REQUEST_TIMEOUT,
+        http_client=http_client
+    )
+    return ResilientChatModel(
+        inner=inner,
+        chain_name=chain_name,
+        callbacks=[LLMMetricsHandler(chain_name)]  # token counts for /metrics
+    )
+
+
+def get_stats():
+    """Breaker state and limiter settings for /health."""
+    return {
+        "circuit_breaker": circuit_breaker.stats(),
+        "requests_per_minute": config.LLM_REQUESTS_PER_MINUTE,
+        "tokens_per_minute": config.LLM_TOKENS_PER_MINUTE,
+        "max_connections": config.LLM_MAX_CONNECTIONS,
+    }
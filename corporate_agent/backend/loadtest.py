@@ -0,0 +1,308 @@
+"""Load test of the two deployment modes against a local mock Groq API.
+
+Starts mock_groq.py, then for each topology launches the backend, sends
+concurrent /analyze-documents requests (or /jobs with --flow jobs), downloads
+every reviewed document they link to, and records throughput, latency and the
+resident memory of every process it started:
+
+    uvicorn  - `uvicorn main:app --workers N` (every worker loads the models)
+    sharded  - `python serve.py --api-workers N` (one model server, light workers)
+
+    python loadtest.py --api-workers 4 --requests 32 --concurrency 8 --batch-size 2
+    python loadtest.py --modes sharded --latency 0.5 --output data/benchmarks/sharded.json
+    python loadtest.py --modes uvicorn --flow jobs --api-workers 4
+
+No Groq account or network access is needed; the result cache and delta review
+are disabled so every request does the full work.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import signal
+import argparse
+import platform
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import httpx
+import config
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _children():
+    """{parent pid: [child pids]} for every process on the machine (Linux /proc)."""
+    tree = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # The command may contain spaces; fields after it are fixed
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        tree.setdefault(ppid, []).append(int(entry))
+    return tree
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return 0.0
+
+
+def _role(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+    except OSError:
+        return "unknown"
+    if "model_server.py" in cmdline:
+        return "model_server"
+    if "serve.py" in cmdline:
+        return "launcher"
+    if "resource_tracker" in cmdline:
+        return "resource_tracker"
+    if "multiprocessing" in cmdline:
+        return "api_worker"
+    if "uvicorn" in cmdline:
+        return "uvicorn_supervisor"
+    return "other"
+
+
+def process_memory(root_pid):
+    """Role and RSS of `root_pid` and all of its descendants."""
+    tree = _children()
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(tree.get(pid, []))
+    return [{"pid": pid, "role": _role(pid), "rss_mb": _rss_mb(pid)} for pid in sorted(pids)]
+
+
+def _memory_summary(processes):
+    workers = [p["rss_mb"] for p in processes if p["role"] == "api_worker"]
+    return {
+        "total_rss_mb": round(sum(p["rss_mb"] for p in processes), 1),
+        "api_workers": len(workers),
+        "api_worker_rss_mb": round(float(np.mean(workers)), 1) if workers else None,
+        "model_server_rss_mb": next((p["rss_mb"] for p in processes if p["role"] == "model_server"), None),
+        "processes": processes,
+    }
+
+
+def _start(command, env):
+    # Own process group, so the whole topology can be stopped at once
+    return subprocess.Popen(command, cwd=_HERE, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _stop(process):
+    if process.poll() is None:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def _wait_healthy(base_url, process, timeout):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"❌ Backend exited with code {process.returncode} during startup")
+        try:
+            if httpx.get(f"{base_url}/health", timeout=5).status_code == 200:
+                return round(time.perf_counter() - start, 2)
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"❌ Backend did not become healthy within {timeout}s")
+
+
+def _download_links(client, base_url, body):
+    # Every worker must serve links handed out by any other worker
+    for doc in body["reviewed_docs"]:
+        response = client.get(f"{base_url}{doc['download_url']}")
+        response.raise_for_status()
+
+
+def _post_batch(client, base_url, names, payloads, flow="analyze"):
+    files = [("files", (name, data, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
+             for name, data in zip(names, payloads)]
+    start = time.perf_counter()
+    if flow == "jobs":
+        # Frontend flow: submit, poll status and fetch the result, each possibly on a different worker
+        response = client.post(f"{base_url}/jobs", files=files)
+        response.raise_for_status()
+        job_id = response.json()["job_id"]
+        while True:
+            response = client.get(f"{base_url}/jobs/{job_id}")
+            response.raise_for_status()
+            if response.json()["status"] in ("completed", "failed"):
+                break
+            time.sleep(0.2)
+        response = client.get(f"{base_url}/jobs/{job_id}/result", params={"response_format": "links"})
+    else:
+        response = client.post(f"{base_url}/analyze-documents", params={"response_format": "links"}, files=files)
+    response.raise_for_status()
+    _download_links(client, base_url, response.json())
+    return time.perf_counter() - start
+
+
+def run_load(base_url, batches, concurrency, timeout, flow="analyze"):
+    """Send every batch with `concurrency` requests in flight; returns throughput and latency.
+
+    A request counts as done once every reviewed document it links to has been downloaded.
+    """
+    latencies, errors = [], []
+    documents = [0]
+    lock = threading.Lock()
+
+    def send(batch):
+        with httpx.Client(timeout=timeout) as client:
+            try:
+                seconds = _post_batch(client, base_url, *batch, flow=flow)
+                with lock:
+                    latencies.append(seconds)
+                    documents[0] += len(batch[0])
+            except httpx.HTTPError as e:
+                with lock:
+                    errors.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, batches))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": len(batches),
+        "errors": len(errors),
+        "elapsed_seconds": round(elapsed, 3),
+        "documents_per_second": round(documents[0] / elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 3),
+        "latency_p50": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+        "latency_p95": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def _commands(mode, api_workers, port):
+    if mode == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(api_workers)]
+    return [sys.executable, "serve.py", "--api-workers", str(api_workers), "--port", str(port),
+            "--socket", f"/tmp/corporate_agent_loadtest_{port}.sock"]
+
+
+def run_topology(mode, args, batches, env):
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"🚀 Starting {mode} with {args.api_workers} API workers...")
+    process = _start(_commands(mode, args.api_workers, port), env)
+    try:
+        startup = _wait_healthy(base_url, process, args.startup_timeout)
+        # Warm every worker (models, prototypes, connections) before timing
+        run_load(base_url, batches[:max(args.api_workers * 2, 1)], args.concurrency, args.request_timeout, args.flow)
+        load = run_load(base_url, batches, args.concurrency, args.request_timeout, args.flow)
+        memory = _memory_summary(process_memory(process.pid))
+    finally:
+        _stop(process)
+    result = dict(load, startup_seconds=startup, memory=memory)
+    print(f"   {load['documents_per_second']} docs/s, p50 {load['latency_p50']}s, p95 {load['latency_p95']}s, "
+          f"{load['errors']} errors | RSS total {memory['total_rss_mb']} MB, "
+          f"per API worker {memory['api_worker_rss_mb']} MB, model server {memory['model_server_rss_mb']} MB")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare uvicorn workers against the sharded deployment.")
+    parser.add_argument("--modes", default="uvicorn,sharded", help="Comma-separated topologies to run.")
+    parser.add_argument("--api-workers", type=int, default=4, help="API worker processes per topology.")
+    parser.add_argument("--requests", type=int, default=32, help="Timed requests per topology.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight.")
+    parser.add_argument("--batch-size", type=int, default=2, help="Documents per request.")
+    parser.add_argument("--flow", choices=["analyze", "jobs"], default="analyze",
+                        help="POST /analyze-documents, or submit /jobs and poll them like the frontend.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock Groq latency per call (seconds).")
+    parser.add_argument("--port", type=int, default=7300, help="Backend port.")
+    parser.add_argument("--mock-port", type=int, default=7390, help="Mock Groq port.")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--output", default=None, help="Where to save the JSON results.")
+    args = parser.parse_args(argv)
+
+    files = sorted(glob.glob(os.path.join(config.ADGM_SOURCES_DIR, "*.docx")))
+    if not files:
+        raise SystemExit("❌ No DOCX templates found in ADGM_SOURCES_DIR")
+    docs = [(os.path.basename(f), open(f, "rb").read()) for f in files]
+    batches = []
+    for i in range(args.requests):
+        chosen = [docs[(i * args.batch_size + j) % len(docs)] for j in range(args.batch_size)]
+        batches.append(([name for name, _ in chosen], [data for _, data in chosen]))
+
+    env = dict(
+        os.environ,
+        GROQ_API_KEY="loadtest",
+        GROQ_BASE_URL=f"http://127.0.0.1:{args.mock_port}",
+        RESULT_CACHE_ENABLED="false",
+        DELTA_REVIEW="false",
+        LLM_REQUESTS_PER_MINUTE="0",
+    )
+    env.pop("MODEL_SERVER_SOCKET", None)
+
+    mock = _start([sys.executable, "mock_groq.py", "--port", str(args.mock_port), "--latency", str(args.latency)],
+                  env)
+    results = {}
+    try:
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            results[mode] = run_topology(mode, args, batches, env)
+    finally:
+        _stop(mock)
+
+    timestamp = time.strftime("%Y%m%d-%H%M%S")
+    output = {
+        "created_at": timestamp,
+        "settings": {k: v for k, v in vars(args).items() if k != "output"},
+        "pipeline": {
+            "embeddings_model": config.EMBEDDINGS_MODEL,
+            "embeddings_backend": config.EMBEDDINGS_BACKEND,
+            "index_type": config.INDEX_TYPE,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if "uvicorn" in results and "sharded" in results:
+        base, sharded = results["uvicorn"], results["sharded"]
+        output["gains"] = {
+            "throughput_ratio": round(sharded["documents_per_second"] / base["documents_per_second"], 3),
+            "total_rss_saved_mb": round(base["memory"]["total_rss_mb"] - sharded["memory"]["total_rss_mb"], 1),
+            "api_worker_rss_saved_mb": round(
+                (base["memory"]["api_worker_rss_mb"] or 0) - (sharded["memory"]["api_worker_rss_mb"] or 0), 1
+            ),
+        }
+        print(f"📊 Sharded vs uvicorn: throughput x{output['gains']['throughput_ratio']}, "
+              f"total RSS saved {output['gains']['total_rss_saved_mb']} MB, "
+              f"saved per API worker {output['gains']['api_worker_rss_saved_mb']} MB")
+
+    path = args.output or os.path.join("data", "benchmarks", f"loadtest_{timestamp}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"🎯 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
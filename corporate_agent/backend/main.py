@@ -1,7 +1,20 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from docx_processing import analyze_and_comment_docx_batch
+from jobs import job_manager, QueueFullError
+from cache import result_cache
+from storage import reviewed_store, iter_zip, read_reviewed, DOCX_MIME
+import config
+import metrics
+import registry
+import llm_client
+import asyncio
 import json
+import os
+import shutil
+import tempfile
 import uvicorn
 
 
@@ -16,23 +29,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/analyze-documents")
-async def analyze_documents(files: list[UploadFile] = File(...)):
-    doc_bytes_list = []
+
+UPLOAD_ENDPOINTS = ("/analyze-documents", "/jobs")
+UPLOAD_READ_CHUNK = 1024 * 1024
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse oversized batches from Content-Length before the body is parsed
+    if request.method == "POST" and request.url.path in UPLOAD_ENDPOINTS:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > config.MAX_UPLOAD_BATCH_BYTES:
+            return JSONResponse(status_code=413, content={"detail": "Upload batch too large"})
+    return await call_next(request)
+
+
+async def _spool_uploads(files, spool_dir):
+    """Copy uploads to files in `spool_dir` in chunks, enforcing per-file and per-batch limits.
+
+    Returns (paths, filenames, total_bytes).
+    """
+    paths = []
     filenames = []
-    for file in files:
-        content = await file.read()
-        doc_bytes_list.append(content)
+    total = 0
+    for idx, file in enumerate(files):
+        path = os.path.join(spool_dir, f"upload_{idx}.docx")
+        size = 0
+        with open(path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_READ_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                total += len(chunk)
+                if size > config.MAX_UPLOAD_FILE_BYTES:
+                    raise HTTPException(status_code=413, detail=f"{file.filename} exceeds the per-file size limit")
+                if total > config.MAX_UPLOAD_BATCH_BYTES:
+                    raise HTTPException(status_code=413, detail="Upload batch too large")
+                out.write(chunk)
+        await file.close()
+        paths.append(path)
         filenames.append(file.filename)
+    return paths, filenames, total
 
-    reviewed_docs, combined_report = analyze_and_comment_docx_batch(
-        doc_bytes_list,
-        uploaded_filenames=filenames
-    )
+
+async def _spool_to_new_dir(files):
+    spool_dir = tempfile.mkdtemp(prefix="corporate_agent_")
+    try:
+        paths, filenames, total = await _spool_uploads(files, spool_dir)
+    except BaseException:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        raise
+    return spool_dir, paths, filenames, total
+
+
+def _build_response(reviewed_docs, combined_report, response_format="json"):
+    # "json": reviewed DOCX as hex inside the JSON body (original behaviour)
+    # "links": small JSON report with download URLs served from temporary storage
+    # "zip": streamed zip with combined_report.json first, then the reviewed DOCX files
+    if response_format == "zip":
+        return StreamingResponse(
+            iter_zip(reviewed_docs, combined_report),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="reviewed_documents.zip"'}
+        )
+
+    if response_format == "links":
+        links = []
+        for fname, reviewed in reviewed_docs:
+            doc_id = reviewed_store.put(fname, reviewed)
+            links.append({"filename": fname, "download_url": f"/reviewed/{doc_id}"})
+        return {
+            "combined_report": combined_report,
+            "reviewed_docs": links
+        }
 
     # Convert reviewed_docs into base64 for API return
     reviewed_docs_base64 = []
-    for fname, bytes_data in reviewed_docs:
+    for fname, reviewed in reviewed_docs:
+        bytes_data = read_reviewed(reviewed)
         reviewed_docs_base64.append({
             "filename": fname,
             "content": bytes_data.hex()  # return as hex string
@@ -42,5 +117,112 @@ async def analyze_documents(files: list[UploadFile] = File(...)):
         "combined_report": combined_report,
         "reviewed_docs": reviewed_docs_base64
     }
+
+
+@app.get("/health")
+async def health():
+    # Load time and memory of the shared embedder / FAISS index
+    return {
+        "status": "ok",
+        "registry": registry.get_stats(),
+        "result_cache": result_cache.stats() if result_cache else None,
+        "llm": llm_client.get_stats()
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # Stage latency histograms, chain calls/errors, cache hits and token counts
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.post("/analyze-documents")
+async def analyze_documents(
+    background_tasks: BackgroundTasks,
+    files: list[UploadFile] = File(...),
+    response_format: str = Query("json", pattern="^(json|links|zip)$"),
+    include_timings: bool = Query(None),
+    client_id: str = Query("", max_length=200)
+):
+    spool_dir, paths, filenames, _ = await _spool_to_new_dir(files)
+    try:
+        output_dir = os.path.join(spool_dir, "reviewed")
+        os.makedirs(output_dir, exist_ok=True)
+
+        # Run the blocking analysis off the event loop
+        reviewed_docs, combined_report = await run_in_threadpool(
+            analyze_and_comment_docx_batch,
+            paths,
+            uploaded_filenames=filenames,
+            output_dir=output_dir,
+            include_timings=include_timings,
+            version_scope=client_id
+        )
+        response = _build_response(reviewed_docs, combined_report, response_format)
+    except BaseException:
+        # Background tasks only run after a successful response
+        shutil.rmtree(spool_dir, ignore_errors=True)
+        raise
+    # Spooled uploads and reviewed outputs are removed once the response is sent
+    background_tasks.add_task(shutil.rmtree, spool_dir, True)
+    return response
+
+@app.post("/jobs", status_code=202)
+async def submit_job(files: list[UploadFile] = File(...), client_id: str = Query("", max_length=200)):
+    spool_dir, paths, filenames, total = await _spool_to_new_dir(files)
+    try:
+        job_id = job_manager.submit(paths, filenames, total, spool_dir, client_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        # Server-sent events: one per analyzed document, then a final status event
+        offset = 0
+        while True:
+            events, finished = job_manager.events_since(job_id, offset)
+            for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+            offset += len(events)
+            if finished and not events:
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, response_format: str = Query("json", pattern="^(json|links|zip)$")):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    result = job_manager.get_result(job_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Job result expired")
+    reviewed_docs, combined_report = result
+    return _build_response(reviewed_docs, combined_report, response_format)
+
+@app.get("/reviewed/{doc_id}")
+async def download_reviewed(doc_id: str):
+    entry = reviewed_store.get(doc_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Reviewed document not found or expired")
+    path, fname = entry
+    return FileResponse(path, media_type=DOCX_MIME, filename=f"reviewed_{fname}")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="127.0.0.1", port=7000)
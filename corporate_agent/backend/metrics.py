@@ -0,0 +1,182 @@
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Latency buckets (seconds) shared by every stage histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> {"buckets": [...], "sum": float, "count": int}
+_counters = {}    # (name, labels) -> float
+_help = {
+    "corporate_agent_stage_seconds": ("histogram", "Latency of pipeline stages"),
+    "corporate_agent_chain_calls_total": ("counter", "LLM chain calls (cache misses)"),
+    "corporate_agent_chain_errors_total": ("counter", "Failed LLM chain calls"),
+    "corporate_agent_cache_hits_total": ("counter", "Result cache hits per chain"),
+    "corporate_agent_cache_misses_total": ("counter", "Result cache misses per chain"),
+    "corporate_agent_llm_tokens_total": ("counter", "LLM tokens by chain and direction"),
+    "corporate_agent_prompt_tokens_total": ("counter", "Prompt tokens assembled per chain (counted locally)"),
+    "corporate_agent_context_tokens_trimmed_total": ("counter", "Retrieved context tokens cut to fit prompt budgets"),
+    "corporate_agent_documents_total": ("counter", "Documents analyzed"),
+    "corporate_agent_documents_skipped_total": ("counter", "Uploads skipped because they could not be parsed"),
+    "corporate_agent_doc_type_batch_fallbacks_total": ("counter", "Packed classifications retried per file"),
+    "corporate_agent_llm_retries_total": ("counter", "Groq calls retried after a transient error"),
+    "corporate_agent_llm_hedges_total": ("counter", "Duplicate requests sent for slow Groq calls"),
+    "corporate_agent_llm_circuit_rejections_total": ("counter", "Groq calls skipped by the open circuit breaker"),
+}
+
+# Per-request stage totals; worker tasks inherit it through submit()
+_current_request = contextvars.ContextVar("current_request_timings", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(stage, seconds, **labels):
+    """Record one stage latency in the histogram and the current request's breakdown."""
+    labels = dict(labels, stage=stage)
+    with _lock:
+        hist = _histograms.setdefault(
+            _key("corporate_agent_stage_seconds", labels),
+            {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0}
+        )
+        idx = bisect.bisect_left(BUCKETS, seconds)
+        if idx < len(BUCKETS):
+            hist["buckets"][idx] += 1
+        hist["sum"] += seconds
+        hist["count"] += 1
+    recorder = _current_request.get()
+    if recorder is not None:
+        name = stage if "chain" not in labels else f"{stage}:{labels['chain']}"
+        recorder.add(name, seconds)
+
+
+@contextmanager
+def timed(stage, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, **labels)
+
+
+class RequestTimings:
+    """Thread-safe per-request accumulation of stage counts and seconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._stages = {}
+        self._tokens = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def add_tokens(self, chain, kind, amount):
+        with self._lock:
+            entry = self._tokens.setdefault(chain, {})
+            entry[kind] = entry.get(kind, 0) + amount
+
+    def summary(self):
+        with self._lock:
+            stages = {
+                name: {"count": v["count"], "seconds": round(v["seconds"], 4)}
+                for name, v in sorted(self._stages.items())
+            }
+            tokens = {chain: dict(v) for chain, v in sorted(self._tokens.items())}
+        return {"total_seconds": round(time.perf_counter() - self._start, 4), "stages": stages, "tokens": tokens}
+
+
+def start_request():
+    """Begin a per-request timing breakdown in this context; returns (recorder, token)."""
+    recorder = RequestTimings()
+    return recorder, _current_request.set(recorder)
+
+
+def end_request(token):
+    _current_request.reset(token)
+
+
+def add_request_tokens(chain, kind, amount):
+    """Add token counts to the current request's breakdown, if one is being recorded."""
+    recorder = _current_request.get()
+    if recorder is not None and amount:
+        recorder.add_tokens(chain, kind, amount)
+
+
+def submit(pool, fn, *args, **kwargs):
+    """pool.submit that carries the caller's request context into the worker thread."""
+    ctx = contextvars.copy_context()
+    return pool.submit(ctx.run, fn, *args, **kwargs)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Counts prompt and completion tokens for one chain's LLM."""
+
+    def __init__(self, chain_name):
+        self.chain_name = chain_name
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("prompt_tokens"):
+            inc("corporate_agent_llm_tokens_total", usage["prompt_tokens"], chain=self.chain_name, type="prompt")
+            add_request_tokens(self.chain_name, "prompt", usage["prompt_tokens"])
+        if usage.get("completion_tokens"):
+            inc("corporate_agent_llm_tokens_total", usage["completion_tokens"], chain=self.chain_name, type="completion")
+            add_request_tokens(self.chain_name, "completion", usage["completion_tokens"])
+
+
+def counter_values(name):
+    """Current values of one counter as {labels dict as tuple: value}."""
+    with _lock:
+        return {labels: value for (metric, labels), value in _counters.items() if metric == name}
+
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + body + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: {"buckets": list(v["buckets"]), "sum": v["sum"], "count": v["count"]}
+                      for k, v in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    names = sorted({name for name, _ in histograms} | {name for name, _ in counters})
+    for name in names:
+        kind, help_text = _help.get(name, ("counter", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (metric, labels), hist in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, hist["buckets"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {hist['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,122 @@
+"""Local stand-in for the Groq chat completions API, with fault injection.
+
+Point the backend at it to exercise retries, rate limiting, hedging and the
+circuit breaker without a Groq account:
+
+    python mock_groq.py --port 7100 --rate-limit-rate 0.2 --error-rate 0.1 --slow-rate 0.05
+    GROQ_BASE_URL=http://127.0.0.1:7100 uvicorn main:app --port 7000
+
+GET /stats returns how many requests were served and how many faults injected.
+"""
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+app = FastAPI(title="Mock Groq API")
+
+settings = {
+    "latency": 0.2,          # seconds per normal response
+    "slow_rate": 0.0,        # share of responses delayed by slow_latency
+    "slow_latency": 10.0,
+    "error_rate": 0.0,       # share answered with HTTP 500
+    "rate_limit_rate": 0.0,  # share answered with HTTP 429
+    "retry_after": 1.0,      # Retry-After seconds sent with 429s
+}
+stats = {"requests": 0, "ok": 0, "slow": 0, "errors": 0, "rate_limited": 0}
+_rng = random.Random(0)
+
+
+def _labels(prompt):
+    match = re.search(r"Choose ONLY from the following list:\s*(\[.*?\])", prompt, re.S)
+    try:
+        return json.loads(match.group(1)) if match else []
+    except ValueError:
+        return []
+
+
+def _reply(prompt):
+    """An answer in the shape each of our chains expects."""
+    labels = _labels(prompt) or ["Unknown"]
+    numbers = re.findall(r"^### Document (\d+)", prompt, re.M)
+    if numbers:
+        return json.dumps({n: labels[int(n) % len(labels)] for n in numbers})
+    if "document classifier" in prompt:
+        return labels[len(prompt) % len(labels)]
+    if "compliance assistant" in prompt:
+        return json.dumps([{
+            "section": "N/A",
+            "issue": "Mock compliance issue",
+            "severity": "Low",
+            "suggestion": "Mock suggestion",
+            "citation_if_any": ""
+        }])
+    return json.dumps({"summary": "Mock review.", "recommendations": ["Mock recommendation"]})
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    roll = _rng.random()
+    if roll < settings["rate_limit_rate"]:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after": str(settings["retry_after"])},
+            content={"error": {"message": "Rate limit reached (mock)", "type": "tokens", "code": "rate_limit_exceeded"}}
+        )
+    roll -= settings["rate_limit_rate"]
+    if roll < settings["error_rate"]:
+        stats["errors"] += 1
+        return JSONResponse(status_code=500, content={"error": {"message": "Internal error (mock)"}})
+    roll -= settings["error_rate"]
+
+    latency = settings["latency"]
+    if roll < settings["slow_rate"]:
+        stats["slow"] += 1
+        latency = settings["slow_latency"]
+    await asyncio.sleep(latency)
+
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    content = _reply(prompt)
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+    stats["ok"] += 1
+    return {
+        "id": f"chatcmpl-mock-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return {"settings": settings, "stats": stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Groq chat completions server.")
+    parser.add_argument("--port", type=int, default=7100)
+    for name, value in settings.items():
+        parser.add_argument("--" + name.replace("_", "-"), type=float, default=value)
+    parser.add_argument("--seed", type=int, default=0, help="Seed for fault injection.")
+    args = parser.parse_args()
+    settings.update({name: getattr(args, name) for name in settings})
+    _rng.seed(args.seed)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,191 @@
+"""Shared embedding and retrieval server for sharded deployments.
+
+One process holds the embedding model, the FAISS index with its docstore and
+the optional reranker. Any number of lightweight API workers reach it over a
+Unix socket, so scaling out no longer loads one copy of the models per worker:
+
+    python model_server.py --socket /tmp/corporate_agent_models.sock
+    MODEL_SERVER_SOCKET=/tmp/corporate_agent_models.sock uvicorn main:app --port 7000 --workers 4
+
+`python serve.py` starts both. API workers switch to the server whenever
+MODEL_SERVER_SOCKET is set (see registry.is_remote).
+"""
+import os
+import time
+import argparse
+import threading
+from multiprocessing.connection import Listener, Client
+from typing import List
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+import config
+
+
+# === Client side (API workers) ===
+class ModelClient:
+    """Calls the model server; each calling thread keeps its own connection."""
+
+    def __init__(self, address, authkey=None, connect_timeout=None):
+        self.address = address
+        self.authkey = authkey or None
+        self.connect_timeout = config.MODEL_SERVER_CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+        self._local = threading.local()
+
+    def _connect(self):
+        # The server may still be loading its models when workers start
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"Model server at {self.address} is not reachable")
+                time.sleep(0.2)
+
+    def call(self, op, *args, **kwargs):
+        """Run operation `op` on the server and return its result."""
+        for attempt in (0, 1):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = self._connect()
+            try:
+                conn.send((op, args, kwargs))
+                status, result = conn.recv()
+                break
+            except (EOFError, OSError):
+                # Server restarted: reconnect once
+                self._local.conn = None
+                if attempt:
+                    raise ConnectionError(f"Lost the connection to the model server at {self.address}")
+        if status == "error":
+            raise RuntimeError(f"Model server '{op}' failed: {result}")
+        return result
+
+
+class RemoteEmbeddings(Embeddings):
+    """Embeddings computed by the model server."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.call("embed_documents", list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.call("embed_query", text)
+
+
+class RemoteVectorStore(VectorStore):
+    """Read-only view of the server's FAISS index (backs the chains' fallback retrievers)."""
+
+    def __init__(self, client):
+        self.client = client
+        self._embeddings = RemoteEmbeddings(client)
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return self.client.call("similarity_search", query, k)
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("The shared index is built with preprocess.py")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("The shared index is built with preprocess.py")
+
+
+# === Server side ===
+_server_stats = {"connections": 0, "requests": 0, "errors": 0, "started_at": None}
+_stats_lock = threading.Lock()
+
+
+def _operations():
+    import registry
+    import retrieval
+
+    def embed_documents(texts):
+        return registry.get_embeddings().embed_documents(texts)
+
+    def embed_query(text):
+        return registry.get_embeddings().embed_query(text)
+
+    def similarity_search(query, k):
+        return registry.get_vectorstore().similarity_search(query, k=k)
+
+    def stats():
+        with _stats_lock:
+            server = dict(_server_stats)
+        return dict(registry.get_stats(), server=server, pid=os.getpid())
+
+    return {
+        "embed_documents": embed_documents,
+        "embed_query": embed_query,
+        "retrieve": retrieval.retrieve_context,
+        "similarity_search": similarity_search,
+        "stats": stats,
+    }
+
+
+def _serve_connection(conn, operations):
+    with conn:
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = ("ok", operations[op](*args, **kwargs))
+            except Exception as e:
+                reply = ("error", f"{type(e).__name__}: {e}")
+            with _stats_lock:
+                _server_stats["requests"] += 1
+                _server_stats["errors"] += reply[0] == "error"
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+def serve(address, authkey=None):
+    """Load every shared model, then answer API workers on `address` until interrupted."""
+    import registry
+
+    # This process is the server: it must load the models, not connect to itself
+    config.MODEL_SERVER_SOCKET = ""
+    registry.get_embeddings()
+    registry.get_vectorstore()
+    registry.get_vectors()
+    if config.RERANKER_ENABLED:
+        registry.get_reranker()
+    operations = _operations()
+
+    if os.path.exists(address):
+        os.remove(address)  # stale socket from an earlier run
+    listener = Listener(address, family="AF_UNIX", authkey=authkey or None)
+    os.chmod(address, 0o600)
+    _server_stats["started_at"] = time.time()
+    print(f"🛰️ Model server listening on {address} (RSS {registry.get_stats()['rss_now_mb']} MB)", flush=True)
+    try:
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                continue  # failed handshake (e.g. wrong authkey)
+            with _stats_lock:
+                _server_stats["connections"] += 1
+            threading.Thread(target=_serve_connection, args=(conn, operations), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve embeddings and retrieval to API workers over a Unix socket.")
+    parser.add_argument("--socket", default=config.MODEL_SERVER_SOCKET or "/tmp/corporate_agent_models.sock",
+                        help="Unix socket path (defaults to MODEL_SERVER_SOCKET)")
+    args = parser.parse_args()
+    serve(args.socket, config.MODEL_SERVER_AUTHKEY.encode() if config.MODEL_SERVER_AUTHKEY else None)
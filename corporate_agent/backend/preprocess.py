@@ -1,73 +1,487 @@
 import os
 import glob
 import json
+import time
+import hashlib
+import argparse
+import tempfile
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 from tqdm import tqdm
+from pypdf import PdfReader, PdfWriter
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import UnstructuredPDFLoader, PyPDFLoader, Docx2txtLoader
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_community.document_loaders import UnstructuredPDFLoader, Docx2txtLoader
 import config
+import registry
+import vector_index
+from cache import invalidate_results
+
+MANIFEST_FILE = "manifest.json"
+SOURCE_PATTERNS = ["*.docx", "*.doc", "*.pdf"]
+
+
+def list_source_files(source_dir):
+    """All PDF and DOCX files under the sources directory, in a stable order."""
+    paths = []
+    for pat in SOURCE_PATTERNS:
+        paths.extend(sorted(glob.glob(os.path.join(source_dir, pat))))
+    return paths
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# Bump when extraction changes so cached parses are not reused
+PARSER_VERSION = 1
+
+
+def _is_text_poor(page, text):
+    """A page with almost no extractable text that draws an image or form (likely scanned)."""
+    if len("".join(text.split())) >= config.PDF_MIN_PAGE_CHARS:
+        return False
+    resources = page.get("/Resources")
+    if resources is None:
+        return False
+    return bool(resources.get_object().get("/XObject"))
+
+
+def _ocr_pages(path, page_numbers):
+    """{page number: text} for the given PDF pages, read by unstructured (OCR).
+
+    The pages are copied into one temporary PDF so the rest of the file is never
+    rasterized. Returns None when unstructured (or its OCR dependencies) fails.
+    """
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for number in page_numbers:
+        writer.add_page(reader.pages[number])
+    fd, tmp_path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer.write(f)
+        loaded = UnstructuredPDFLoader(tmp_path, mode="paged", strategy=config.PDF_OCR_STRATEGY).load()
+    except Exception as e:
+        print(f"⚠️ OCR of {len(page_numbers)} page(s) of {os.path.basename(path)} failed, keeping their text layer: {e}")
+        return None
+    finally:
+        os.remove(tmp_path)
+    texts = {}
+    for d in loaded:
+        # page_number is 1-based within the temporary PDF
+        number = page_numbers[int(d.metadata.get("page_number", 1)) - 1]
+        texts[number] = (texts[number] + "\n" + d.page_content) if number in texts else d.page_content
+    return texts
+
+
+def _load_pdf_pages(path, first, last):
+    """Pages first..last-1 of a PDF as documents; text-poor pages go through OCR.
+
+    Returns (documents, OCR-ed page count, complete), where complete is False when
+    OCR was needed but unavailable.
+    """
+    reader = PdfReader(path)
+    labels = reader.page_labels
+    pages = []
+    for number in range(first, last):
+        page = reader.pages[number]
+        text = (page.extract_text() or "").strip()
+        pages.append((number, page, text))
+
+    poor = [number for number, page, text in pages if _is_text_poor(page, text)]
+    ocr = _ocr_pages(path, poor) if poor else {}
+    docs = []
+    for number, page, text in pages:
+        if ocr and ocr.get(number, "").strip():
+            text = ocr[number].strip()
+        docs.append(Document(page_content=text, metadata={
+            "page": number,
+            "page_label": labels[number],
+            "total_pages": len(labels)
+        }))
+    return docs, len(ocr or {}), ocr is not None
+
+
+def _load_part(task):
+    """Parse one loading task: (path, first page, last page) for PDFs, (path, None, None) otherwise.
+
+    Runs in the worker processes. Returns (documents, OCR-ed pages, complete);
+    errors yield no documents.
+    """
+    path, first, last = task
+    try:
+        if first is not None:
+            return _load_pdf_pages(path, first, last)
+        return Docx2txtLoader(path).load(), 0, True
+    except Exception as e:
+        print(f"❌ Error reading {path}: {e}")
+        return None, 0, False
+
+
+def _parse_cache_path(sha256):
+    """Cache file for a source's extracted text, keyed by content and extraction settings."""
+    key = json.dumps([sha256, PARSER_VERSION, config.PDF_MIN_PAGE_CHARS, config.PDF_OCR_STRATEGY])
+    return os.path.join(config.PARSE_CACHE_DIR, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def _read_parse_cache(sha256):
+    """Cached documents of a source, or None.
+
+    Parses that needed OCR while unstructured was missing are redone once it is installed.
+    """
+    if not config.PARSE_CACHE_ENABLED:
+        return None
+    try:
+        with open(_parse_cache_path(sha256), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+        if not entry["complete"] and importlib.util.find_spec("unstructured") is not None:
+            return None
+        return [Document(page_content=text, metadata=meta) for text, meta in entry["documents"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_parse_cache(sha256, docs, complete):
+    if not config.PARSE_CACHE_ENABLED:
+        return
+    os.makedirs(config.PARSE_CACHE_DIR, exist_ok=True)
+    path = _parse_cache_path(sha256)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"complete": complete, "documents": [[d.page_content, d.metadata] for d in docs]}, f)
+    os.replace(tmp_path, path)
+
+
+def _loading_tasks(path):
+    """Page-range tasks for a PDF (so one long manual spreads over the pool), one task otherwise."""
+    if not path.lower().endswith(".pdf"):
+        return [(path, None, None)]
+    try:
+        n_pages = len(PdfReader(path).pages)
+    except Exception as e:
+        print(f"❌ Error reading {path}: {e}")
+        return []
+    step = max(1, config.PDF_PAGES_PER_TASK)
+    return [(path, first, min(first + step, n_pages)) for first in range(0, n_pages, step)]
+
+
+def load_files(paths, workers=None, hashes=None):
+    """Parses files in a process pool; returns {path: documents}.
+
+    Extracted text is cached on disk per file hash (PARSE_CACHE_DIR), so a rebuild
+    only parses new or changed files. PDFs are read page by page with pypdf and
+    split into page ranges across the workers; only text-poor pages (scans) go
+    through the slower unstructured OCR path.
+    """
+    if not paths:
+        return {}
+    workers = workers or config.PREPROCESS_WORKERS
+    if hashes is None:
+        hashes = {path: file_sha256(path) for path in paths}
+
+    loaded, tasks = {}, []
+    for path in paths:
+        cached = _read_parse_cache(hashes[path])
+        if cached is not None:
+            loaded[path] = cached
+        else:
+            tasks.extend(_loading_tasks(path))
+
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_load_part(task) for task in tqdm(tasks, desc="Loading sources")]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(tqdm(pool.map(_load_part, tasks), total=len(tasks), desc="Loading sources"))
+
+    # Reassemble page ranges per file, in order
+    parts = {}
+    for task, result in zip(tasks, results):
+        parts.setdefault(task[0], []).append(result)
+    n_cached, n_ocr = len(loaded), 0
+    for path in paths:
+        if path in loaded or path not in parts:
+            loaded.setdefault(path, [])
+            continue
+        if any(docs is None for docs, _, _ in parts[path]):
+            loaded[path] = []
+            continue
+        loaded[path] = [d for docs, _, _ in parts[path] for d in docs]
+        n_ocr += sum(pages for _, pages, _ in parts[path])
+        _write_parse_cache(hashes[path], loaded[path], all(complete for _, _, complete in parts[path]))
+
+    print(f"📄 Parsed {len(parts)} source files ({len(tasks)} tasks, {n_ocr} pages OCR-ed), "
+          f"{n_cached} from the parse cache.")
+    for path, docs in loaded.items():
+        for d in docs:
+            d.metadata["source"] = os.path.basename(path)
+    return {path: loaded[path] for path in paths}
+
+
+def load_file(path):
+    """Loads a single PDF or DOCX file into LangChain documents."""
+    return load_files([path], workers=1)[path]
 
 
 def load_documents(source_dir):
     """Loads PDF and DOCX files from the given directory."""
     docs = []
-    patterns = ["*.docx", "*.doc", "*.pdf"]
-
-    for pat in patterns:
-        for path in tqdm(glob.glob(os.path.join(source_dir, pat)), desc=f"Loading {pat}"):
-            if path.lower().endswith(".pdf"):
-                try:
-                    loader = PyPDFLoader(path)  # Faster, better for text PDFs
-                except Exception:
-                    loader = UnstructuredPDFLoader(path)  # Fallback for scanned/image PDFs
-            else:
-                loader = Docx2txtLoader(path)
-
-            try:
-                loaded = loader.load()
-                for d in loaded:
-                    d.metadata["source"] = os.path.basename(path)
-                docs.extend(loaded)
-            except Exception as e:
-                print(f"❌ Error reading {path}: {e}")
-
+    for loaded in load_files(list_source_files(source_dir)).values():
+        docs.extend(loaded)
     return docs
 
 
-def build_index():
+def _split_file_chunks(loaded_by_path, hashes):
+    """Split each file's documents into chunks with stable ids derived from its name and hash."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    chunks, ids, per_file_ids = [], [], {}
+    for path, docs in loaded_by_path.items():
+        file_chunks = splitter.split_documents(docs)
+        # Sources contain byte-identical copies, so the name is part of the id
+        file_key = hashlib.sha256(f"{os.path.basename(path)}:{hashes[path]}".encode("utf-8")).hexdigest()[:16]
+        file_ids = [f"{file_key}-{i}" for i in range(len(file_chunks))]
+        chunks.extend(file_chunks)
+        ids.extend(file_ids)
+        per_file_ids[os.path.basename(path)] = file_ids
+    return chunks, ids, per_file_ids
+
+
+def _embed_in_batches(texts):
+    embeddings = registry.get_embeddings()
+    vectors = []
+    batch_size = config.EMBED_BATCH_SIZE
+    for start in tqdm(range(0, len(texts), batch_size), desc="Embedding chunks"):
+        vectors.extend(embeddings.embed_documents(texts[start:start + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def _read_manifest():
+    try:
+        with open(os.path.join(config.VECTORSTORE_DIR, MANIFEST_FILE), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _index_backend():
+    """Embedding backend recorded in the index meta (older indexes were built with torch)."""
+    try:
+        with open(os.path.join(config.VECTORSTORE_DIR, "meta.json"), "r") as f:
+            return json.load(f).get("embeddings_backend", "torch")
+    except (OSError, ValueError):
+        return "torch"
+
+
+def _read_meta():
+    try:
+        with open(os.path.join(config.VECTORSTORE_DIR, "meta.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _build_checked_index(vectors, timings, index_type=None, min_recall=None):
+    """Build the FAISS index and measure its recall@10 against exact search.
+
+    Raises before anything is saved when an approximate index misses `min_recall`.
+    """
+    min_recall = config.INDEX_MIN_RECALL if min_recall is None else min_recall
+    start = time.perf_counter()
+    index, built_type = vector_index.build_faiss_index(vectors, index_type)
+    timings["index"] = round(time.perf_counter() - start, 3)
+    if built_type == "flat":
+        return index, built_type, 1.0
+
+    start = time.perf_counter()
+    recall = vector_index.recall_at_k(index, vectors, k=10)
+    timings["recall_check"] = round(time.perf_counter() - start, 3)
+    print(f"📏 {built_type} recall@10 against exact search: {recall:.3f}")
+    if recall < min_recall:
+        raise RuntimeError(
+            f"❌ {built_type} recall@10 {recall:.3f} is below {min_recall}; index not saved. "
+            "Raise IVF_NPROBE / PQ_REFINE_FACTOR / HNSW_EF_SEARCH, or use INDEX_TYPE=flat."
+        )
+    return index, built_type, round(recall, 4)
+
+
+def _save_index(index, vectors, ids, documents, manifest, timings, index_type, recall, requested_type=None):
+    start = time.perf_counter()
+    vector_index.save_index_files(config.VECTORSTORE_DIR, index, vectors, ids, documents)
+    with open(os.path.join(config.VECTORSTORE_DIR, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    timings["save"] = round(time.perf_counter() - start, 3)
+
+    # Save meta info
+    n_chunks = sum(len(entry["chunk_ids"]) for entry in manifest["files"].values())
+    n_docs = sum(entry["n_docs"] for entry in manifest["files"].values())
+    meta = {
+        "n_chunks": n_chunks,
+        "n_docs": n_docs,
+        "index_version": str(time.time()),
+        "embeddings_backend": config.EMBEDDINGS_BACKEND,
+        "index_type": index_type,
+        # What was asked for, so --incremental does not rebuild an index that fell back to flat
+        "requested_index_type": requested_type or index_type,
+        "index_fallback": (
+            f"{len(vectors)} vectors are too few to train {requested_type}"
+            if requested_type and requested_type != index_type else None
+        ),
+        "recall_at_10": recall,
+        "timings": timings
+    }
+    with open(os.path.join(config.VECTORSTORE_DIR, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Cached chain outputs were grounded in the old index
+    invalidate_results()
+    return meta
+
+
+def build_index(workers=None, index_type=None, min_recall=None):
     """Splits documents, creates embeddings, and saves FAISS index."""
     print("📂 Loading ADGM source documents from:", config.ADGM_SOURCES_DIR)
-    docs = load_documents(config.ADGM_SOURCES_DIR)
+    timings = {}
 
-    if not docs:
+    start = time.perf_counter()
+    paths = list_source_files(config.ADGM_SOURCES_DIR)
+    hashes = {path: file_sha256(path) for path in paths}
+    timings["hash"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    loaded_by_path = load_files(paths, workers, hashes)
+    timings["load"] = round(time.perf_counter() - start, 3)
+    n_docs = sum(len(docs) for docs in loaded_by_path.values())
+
+    if not n_docs:
         raise RuntimeError("❌ No ADGM source docs found. Put PDFs/DOCX into data/adgm_sources/")
 
-    print(f"✅ Loaded {len(docs)} documents. Splitting into chunks...")
+    print(f"✅ Loaded {n_docs} documents. Splitting into chunks...")
 
     # Split text into chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    chunks = splitter.split_documents(docs)
+    start = time.perf_counter()
+    chunks, ids, per_file_ids = _split_file_chunks(loaded_by_path, hashes)
+    timings["split"] = round(time.perf_counter() - start, 3)
 
     print(f"✅ Created {len(chunks)} chunks. Generating embeddings...")
 
     # Create embeddings
-    embeddings = HuggingFaceEmbeddings(model_name=config.EMBEDDINGS_MODEL)
+    start = time.perf_counter()
+    texts = [c.page_content for c in chunks]
+    vectors = _embed_in_batches(texts)
+    timings["embed"] = round(time.perf_counter() - start, 3)
 
     # Build FAISS index
-    vectorstore = FAISS.from_documents(chunks, embeddings)
+    index, built_type, recall = _build_checked_index(vectors, timings, index_type, min_recall)
 
-    # Save index
-    os.makedirs(config.VECTORSTORE_DIR, exist_ok=True)
-    vectorstore.save_local(config.VECTORSTORE_DIR)
+    manifest = {"files": {
+        os.path.basename(path): {
+            "sha256": hashes[path],
+            "n_docs": len(loaded_by_path[path]),
+            "chunk_ids": per_file_ids[os.path.basename(path)]
+        }
+        for path in paths
+    }}
+    _save_index(index, vectors, ids, chunks, manifest, timings, built_type, recall, index_type or config.INDEX_TYPE)
 
-    # Save meta info
-    meta = {"n_chunks": len(chunks), "n_docs": len(docs)}
-    with open(os.path.join(config.VECTORSTORE_DIR, "meta.json"), "w") as f:
-        json.dump(meta, f)
+    print(f"🎯 {built_type} index built with {len(chunks)} chunks from {n_docs} documents.")
+
+
+def update_index(workers=None, index_type=None, min_recall=None):
+    """Re-embeds only new or changed source files and rebuilds the FAISS index.
+
+    Stored vectors of unchanged files are reused, so only the (cheap) index build
+    is repeated; this also applies a changed INDEX_TYPE. Falls back to a full build
+    when there is no manifest or stored vectors from a previous build.
+    """
+    index_type = index_type or config.INDEX_TYPE
+    manifest = _read_manifest()
+    if manifest is None or not vector_index.is_sqlite_format(config.VECTORSTORE_DIR):
+        print("ℹ️ No index manifest or stored vectors found, running a full build.")
+        return build_index(workers, index_type, min_recall)
+    if _index_backend() != config.EMBEDDINGS_BACKEND:
+        # Vectors from different embedding backends must not be mixed in one index
+        print(f"ℹ️ Index was built with '{_index_backend()}' embeddings, running a full build.")
+        return build_index(workers, index_type, min_recall)
+
+    timings = {}
+    start = time.perf_counter()
+    paths = list_source_files(config.ADGM_SOURCES_DIR)
+    hashes = {path: file_sha256(path) for path in paths}
+    timings["hash"] = round(time.perf_counter() - start, 3)
 
-    print(f"🎯 Index built with {len(chunks)} chunks from {len(docs)} documents.")
+    known = manifest["files"]
+    current_names = {os.path.basename(p) for p in paths}
+    changed = [p for p in paths if known.get(os.path.basename(p), {}).get("sha256") != hashes[p]]
+    removed = [name for name in known if name not in current_names]
+    meta = _read_meta()
+    if not changed and not removed and meta.get("requested_index_type", meta.get("index_type", "flat")) == index_type:
+        print("✅ Index is up to date.")
+        return
+
+    print(f"🔄 {len(changed)} new/changed and {len(removed)} removed source files.")
+
+    start = time.perf_counter()
+    docstore = vector_index.SQLiteDocstore(os.path.join(config.VECTORSTORE_DIR, vector_index.DOCSTORE_FILE))
+    old_ids, old_documents = docstore.all_documents()
+    old_vectors = vector_index.load_vectors(config.VECTORSTORE_DIR, mmap=False)
+    timings["load_index"] = round(time.perf_counter() - start, 3)
+
+    # Drop vectors of removed files and of the previous version of changed files
+    start = time.perf_counter()
+    stale_names = removed + [os.path.basename(p) for p in changed if os.path.basename(p) in known]
+    stale_ids = {cid for name in stale_names for cid in known[name]["chunk_ids"]}
+    keep = [row for row, cid in enumerate(old_ids) if cid not in stale_ids]
+    for name in stale_names:
+        del known[name]
+    timings["delete"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    loaded_by_path = load_files(changed, workers, hashes)
+    timings["load"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    chunks, ids, per_file_ids = _split_file_chunks(loaded_by_path, hashes)
+    timings["split"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    texts = [c.page_content for c in chunks]
+    vectors = _embed_in_batches(texts)
+    timings["embed"] = round(time.perf_counter() - start, 3)
+
+    all_ids = [old_ids[row] for row in keep] + ids
+    all_documents = [old_documents[row] for row in keep] + chunks
+    all_vectors = old_vectors[keep] if len(chunks) == 0 else np.vstack([old_vectors[keep], vectors])
+    index, built_type, recall = _build_checked_index(all_vectors, timings, index_type, min_recall)
+
+    for path in changed:
+        known[os.path.basename(path)] = {
+            "sha256": hashes[path],
+            "n_docs": len(loaded_by_path[path]),
+            "chunk_ids": per_file_ids[os.path.basename(path)]
+        }
+    meta = _save_index(index, all_vectors, all_ids, all_documents, manifest, timings, built_type, recall, index_type)
+
+    print(f"🎯 Index updated: +{len(chunks)} / -{len(stale_ids)} chunks, {meta['n_chunks']} total.")
 
 
 if __name__ == "__main__":
-    build_index()
+    parser = argparse.ArgumentParser(description="Build the ADGM FAISS index.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-embed new or changed source files")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used to parse source files")
+    parser.add_argument("--index-type", choices=("flat", "ivfpq", "hnsw"), default=None,
+                        help="FAISS index to build (defaults to INDEX_TYPE)")
+    parser.add_argument("--min-recall", type=float, default=None,
+                        help="minimum recall@10 against exact search (defaults to INDEX_MIN_RECALL)")
+    args = parser.parse_args()
+
+    if args.incremental:
+        update_index(args.workers, args.index_type, args.min_recall)
+    else:
+        build_index(args.workers, args.index_type, args.min_recall)
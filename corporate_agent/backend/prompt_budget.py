@@ -0,0 +1,142 @@
+"""Token-budgeted prompt assembly for the RetrievalQA chains.
+
+Each chain gets a budget for its whole prompt (PROMPT_TOKEN_BUDGETS): the fixed
+template, the document text (the question) and the retrieved context. The
+document text is never cut here; the context gets what is left. It is first
+compacted (whitespace collapsed, repeated page headers and footers dropped),
+then chunks are kept in retrieval order, and the first chunk that no longer
+fits is reduced to its sentences most relevant to the question.
+
+Tokens are counted locally with PROMPT_TOKENIZER (a tokenizer.json path or Hub
+id, e.g. the Groq model's tokenizer) or estimated at 4 characters per token.
+"""
+import re
+import threading
+from langchain_core.documents import Document
+import config
+import metrics
+from text_utils import STOPWORDS
+
+_tokenizer_lock = threading.Lock()
+_tokenizer = None  # False once loading failed or none is configured
+_template_tokens = {}
+
+_SENTENCE_RE = re.compile(r"(?<=[.;:!?])\s+(?=[A-Z0-9(\"'])")
+
+
+def _get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                _tokenizer = False
+                if config.PROMPT_TOKENIZER:
+                    try:
+                        from tokenizers import Tokenizer
+                        source = config.PROMPT_TOKENIZER
+                        _tokenizer = (Tokenizer.from_file(source) if source.endswith(".json")
+                                      else Tokenizer.from_pretrained(source))
+                    except Exception as e:
+                        print(f"⚠️ Could not load PROMPT_TOKENIZER '{config.PROMPT_TOKENIZER}' ({e}); "
+                              "estimating 4 characters per token.")
+    return _tokenizer or None
+
+
+def count_tokens(text):
+    """Tokens in `text` by the configured tokenizer, else about 4 characters per token."""
+    if not text:
+        return 0
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return (len(text) + 3) // 4
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def template_tokens(chain_name, template):
+    """Tokens of a prompt template without its {context} and {question} slots (counted once)."""
+    if chain_name not in _template_tokens:
+        _template_tokens[chain_name] = count_tokens(template.replace("{context}", "").replace("{question}", ""))
+    return _template_tokens[chain_name]
+
+
+def compact_context(texts):
+    """Collapse whitespace in retrieved chunks and drop lines repeated across them.
+
+    PDF chunks carry runs of blank lines and the same page header or footer on
+    every page; neither helps the model.
+    """
+    seen = set()
+    compacted = []
+    for text in texts:
+        lines = []
+        for line in text.splitlines():
+            line = re.sub(r"\s+", " ", line).strip()
+            if not line:
+                continue
+            key = line.lower()
+            # Short repeated lines are headers/footers; long ones are real overlap between chunks
+            if key in seen and len(line) < 120:
+                continue
+            seen.add(key)
+            lines.append(line)
+        compacted.append("\n".join(lines))
+    return compacted
+
+
+def _words(text):
+    return {w for w in re.findall(r"\w+", text.lower()) if len(w) > 2 and w not in STOPWORDS}
+
+
+def extract_relevant(text, question_words, max_tokens):
+    """The sentences of `text` sharing the most words with the question, in their original order."""
+    sentences = [s for s in _SENTENCE_RE.split(text) if s.strip()]
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: len(_words(sentences[i]) & question_words),
+        reverse=True
+    )
+    chosen, used = [], 0
+    for i in ranked:
+        tokens = count_tokens(sentences[i]) + 1
+        if used + tokens > max_tokens:
+            continue
+        chosen.append(i)
+        used += tokens
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def fit_context(chain_name, template, question, documents):
+    """Retrieved documents compacted and trimmed to the chain's prompt budget.
+
+    Returns new Document objects (metadata kept); documents that do not fit at
+    all are dropped, lowest ranked first.
+    """
+    texts = compact_context([d.page_content for d in documents])
+    budget = config.PROMPT_TOKEN_BUDGETS.get(chain_name, 0)
+    fixed = template_tokens(chain_name, template) + count_tokens(question)
+    available = budget - fixed if budget > 0 else None
+    if available is not None:
+        available = max(available, config.PROMPT_MIN_CONTEXT_TOKENS)
+
+    fitted, used, original = [], 0, 0
+    question_words = None
+    for doc, text in zip(documents, texts):
+        original += count_tokens(doc.page_content)
+        tokens = count_tokens(text) + 2  # chunks are joined by a blank line
+        if available is not None and used + tokens > available:
+            remaining = available - used
+            if remaining < config.PROMPT_MIN_CHUNK_TOKENS:
+                continue
+            question_words = question_words if question_words is not None else _words(question)
+            text = extract_relevant(text, question_words, remaining - 2)
+            if not text:
+                continue
+            tokens = count_tokens(text) + 2
+        fitted.append(Document(page_content=text, metadata=doc.metadata))
+        used += tokens
+
+    metrics.inc("corporate_agent_prompt_tokens_total", fixed + used, chain=chain_name)
+    metrics.inc("corporate_agent_context_tokens_trimmed_total", max(0, original - used), chain=chain_name)
+    metrics.add_request_tokens(chain_name, "prompt_assembled", fixed + used)
+    metrics.add_request_tokens(chain_name, "context_trimmed", max(0, original - used))
+    return fitted
@@ -0,0 +1,187 @@
+import os
+import time
+import resource
+import threading
+import json
+from langchain_community.vectorstores import FAISS
+import config
+
+# === Process-wide shared embedder and vector store ===
+# Loaded lazily on first use so every chain and helper in this worker
+# shares one copy of the model and one deserialized FAISS index. With
+# MODEL_SERVER_SOCKET set they are proxies to the shared model server instead.
+_lock = threading.Lock()
+_client_lock = threading.Lock()
+_client = None
+_embeddings = None
+_vectorstore = None
+_vectors = None
+_reranker = None
+_stats = {
+    "embeddings_model": config.EMBEDDINGS_MODEL,
+    "embeddings_backend": config.EMBEDDINGS_BACKEND,
+    "vectorstore_dir": config.VECTORSTORE_DIR,
+    "embeddings_load_seconds": None,
+    "vectorstore_load_seconds": None,
+    "reranker_load_seconds": None,
+    "rss_before_mb": None,
+    "rss_after_mb": None,
+}
+
+
+def _current_rss_mb():
+    """Resident set size of this process in MB (falls back to peak RSS)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is reported in KB on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def is_remote():
+    """True in API workers of a sharded deployment, which use the model server (see model_server)."""
+    return bool(config.MODEL_SERVER_SOCKET)
+
+
+def get_model_client():
+    """Return the shared connection to the model server."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from model_server import ModelClient
+                _client = ModelClient(config.MODEL_SERVER_SOCKET, config.MODEL_SERVER_AUTHKEY.encode() or None)
+    return _client
+
+
+def _load_embeddings():
+    if is_remote():
+        from model_server import RemoteEmbeddings
+        return RemoteEmbeddings(get_model_client())
+    # PyTorch is only imported for the "torch" backend
+    backend = config.EMBEDDINGS_BACKEND
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=config.EMBEDDINGS_MODEL)
+    if backend in ("onnx", "onnx-int8"):
+        from embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(
+            config.EMBEDDINGS_MODEL,
+            quantize=backend == "onnx-int8",
+            batch_size=config.EMBED_BATCH_SIZE,
+            threads=config.EMBEDDINGS_THREADS
+        )
+    raise ValueError(f"Unknown EMBEDDINGS_BACKEND '{backend}' (expected torch, onnx or onnx-int8)")
+
+
+def _check_index_backend():
+    """Warn when the index was built with a different embedding backend."""
+    try:
+        with open(os.path.join(config.VECTORSTORE_DIR, "meta.json"), "r") as f:
+            built_with = json.load(f).get("embeddings_backend", "torch")
+    except (OSError, ValueError):
+        return
+    if built_with != config.EMBEDDINGS_BACKEND:
+        print(f"⚠️ Index was built with '{built_with}' embeddings but EMBEDDINGS_BACKEND is "
+              f"'{config.EMBEDDINGS_BACKEND}'; run the parity check (python embeddings.py) or rebuild it.")
+
+
+def get_embeddings():
+    """Return the shared embeddings model, loading it on first call."""
+    global _embeddings
+    if _embeddings is None:
+        with _lock:
+            if _embeddings is None:
+                if _stats["rss_before_mb"] is None:
+                    _stats["rss_before_mb"] = _current_rss_mb()
+                start = time.perf_counter()
+                _embeddings = _load_embeddings()
+                _stats["embeddings_load_seconds"] = round(time.perf_counter() - start, 3)
+                _stats["rss_after_mb"] = _current_rss_mb()
+                if is_remote():
+                    return _embeddings
+                print(f"🧠 Loaded {config.EMBEDDINGS_BACKEND} embeddings '{config.EMBEDDINGS_MODEL}' in "
+                      f"{_stats['embeddings_load_seconds']}s (RSS {_stats['rss_after_mb']} MB)")
+    return _embeddings
+
+
+def get_vectorstore():
+    """Return the shared FAISS store over the ADGM index, loading it on first call."""
+    global _vectorstore
+    if _vectorstore is None:
+        embeddings = get_embeddings()
+        with _lock:
+            if _vectorstore is None:
+                if is_remote():
+                    from model_server import RemoteVectorStore
+                    _vectorstore = RemoteVectorStore(get_model_client())
+                    return _vectorstore
+                import vector_index  # FAISS itself is only imported where the index lives
+                start = time.perf_counter()
+                if vector_index.is_sqlite_format(config.VECTORSTORE_DIR):
+                    _vectorstore = vector_index.load_vectorstore(config.VECTORSTORE_DIR, embeddings)
+                else:
+                    # Indexes built before the SQLite docstore: pickled docstore in index.pkl
+                    _vectorstore = FAISS.load_local(
+                        config.VECTORSTORE_DIR,
+                        embeddings,
+                        allow_dangerous_deserialization=True
+                    )
+                _stats["index_type"] = type(_vectorstore.index).__name__
+                _stats["vectorstore_load_seconds"] = round(time.perf_counter() - start, 3)
+                _check_index_backend()
+                _stats["rss_after_mb"] = _current_rss_mb()
+                print(f"📚 Loaded FAISS index from {config.VECTORSTORE_DIR} in "
+                      f"{_stats['vectorstore_load_seconds']}s (RSS {_stats['rss_after_mb']} MB)")
+    return _vectorstore
+
+
+def get_vectors():
+    """Exact vectors by FAISS row (memory-mapped), or None for legacy indexes and API workers."""
+    global _vectors
+    if is_remote():
+        return None
+    if _vectors is None:
+        with _lock:
+            if _vectors is None:
+                import vector_index
+                _vectors = vector_index.load_vectors(config.VECTORSTORE_DIR)
+                if _vectors is None:
+                    _vectors = False
+    return _vectors if _vectors is not False else None
+
+
+def get_reranker():
+    """Return the shared cross-encoder used to rerank retrieved chunks, loading it on first call."""
+    global _reranker
+    if _reranker is None:
+        with _lock:
+            if _reranker is None:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError as e:
+                    raise ImportError(f"RERANKER_ENABLED needs sentence-transformers: {e}")
+                start = time.perf_counter()
+                _reranker = CrossEncoder(config.RERANKER_MODEL)
+                _stats["reranker_load_seconds"] = round(time.perf_counter() - start, 3)
+                _stats["rss_after_mb"] = _current_rss_mb()
+                print(f"🔀 Loaded reranker '{config.RERANKER_MODEL}' in "
+                      f"{_stats['reranker_load_seconds']}s (RSS {_stats['rss_after_mb']} MB)")
+    return _reranker
+
+
+def get_stats():
+    """Load timings and memory figures for the shared resources."""
+    stats = dict(_stats)
+    stats["embeddings_loaded"] = _embeddings is not None
+    stats["vectorstore_loaded"] = _vectorstore is not None
+    stats["reranker_loaded"] = _reranker is not None
+    stats["rss_now_mb"] = _current_rss_mb()
+    if is_remote():
+        try:
+            stats["model_server"] = get_model_client().call("stats")
+        except Exception as e:
+            stats["model_server"] = {"error": str(e)}
+    return stats
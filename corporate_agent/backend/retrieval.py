@@ -0,0 +1,197 @@
+import re
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+import config
+import registry
+import metrics
+from text_utils import STOPWORDS
+
+
+def _content_key(text):
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def embed_query_text(full_text):
+    """Embedding of the document snippet used for retrieval (and fast-path classification)."""
+    with metrics.timed("embed_query"):
+        return registry.get_embeddings().embed_query(full_text[:config.RETRIEVAL_QUERY_CHARS])
+
+
+# Statutory references kept together as phrases in BM25 queries ("section 17 2", "form 3"); a plural
+# followed by a 4-digit number is an instrument's year ("Companies Regulations 2020"), not a reference
+_REFERENCE_RE = re.compile(
+    r"\b(?:article|section|regulation|rule|schedule|part|chapter|clause|paragraph|form)(?:s(?!\s+\d{4}\b))?\s+"
+    r"\d+[a-z]?(?:[.(]\w+\)?)*",
+    re.IGNORECASE
+)
+_lexical_warned = False
+
+
+def lexical_query(text, max_terms=None):
+    """FTS5 MATCH expression for a document snippet.
+
+    Statutory references become exact phrases; the remaining distinctive words
+    (most frequent first) are added as single terms, all OR-ed together.
+    """
+    max_terms = max_terms or config.LEXICAL_MAX_QUERY_TERMS
+    parts = []
+    for match in _REFERENCE_RE.finditer(text):
+        phrase = '"' + " ".join(re.findall(r"\w+", match.group(0).lower())) + '"'
+        if phrase not in parts:
+            parts.append(phrase)
+    counts = {}
+    for word in re.findall(r"\w+", text.lower()):
+        if (len(word) > 2 or (word.isdigit() and len(word) > 1)) and word not in STOPWORDS:
+            counts[word] = counts.get(word, 0) + 1
+    words = sorted(counts, key=lambda w: -counts[w])  # stable: ties keep first appearance
+    parts.extend(f'"{w}"' for w in words)
+    return " OR ".join(parts[:max_terms])
+
+
+def _dense_hits(vectorstore, query, fetch_k):
+    """[(row, L2 distance)] from FAISS, closest first."""
+    with metrics.timed("faiss_search"):
+        distances, indices = vectorstore.index.search(query, fetch_k)
+    return [(int(i), float(dist)) for dist, i in zip(distances[0], indices[0]) if i != -1]
+
+
+def _lexical_hits(vectorstore, full_text, fetch_k):
+    """[(row, BM25 score)] from the docstore's inverted index, or None when there is none."""
+    global _lexical_warned
+    docstore = vectorstore.docstore
+    if not getattr(docstore, "has_lexical_index", False):
+        if not _lexical_warned:
+            _lexical_warned = True
+            print("⚠️ RETRIEVAL_MODE=hybrid but the index has no BM25 table; "
+                  "rebuild it with preprocess.py. Using dense retrieval only.")
+        return None
+    match = lexical_query(full_text[:config.RETRIEVAL_QUERY_CHARS])
+    if not match:
+        return []
+    with metrics.timed("bm25_search"):
+        return docstore.lexical_search(match, fetch_k)
+
+
+def reciprocal_rank_fusion(rankings, k=None):
+    """{row: fused score} for ranked row lists: the sum of 1 / (k + rank) over the lists."""
+    k = config.RRF_K if k is None else k
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def _fetch_rows(vectorstore, rows):
+    """{row: (chunk id, Document)} for FAISS rows."""
+    if hasattr(vectorstore.docstore, "get_rows"):
+        # SQLite docstore: fetch every candidate in one query
+        return vectorstore.docstore.get_rows(rows)
+    found = {}
+    for i in rows:
+        chunk_id = vectorstore.index_to_docstore_id[i]
+        found[i] = (chunk_id, vectorstore.docstore.search(chunk_id))
+    return found
+
+
+def _rerank(full_text, candidates, k):
+    """Order candidates by a local cross-encoder's relevance to the document; keep the top k."""
+    if config.RERANKER_CANDIDATES > 0:
+        candidates = candidates[:config.RERANKER_CANDIDATES]
+    query = full_text[:config.RETRIEVAL_QUERY_CHARS]
+    with metrics.timed("rerank"):
+        scores = registry.get_reranker().predict([(query, c["document"].page_content) for c in candidates])
+    for c, score in zip(candidates, scores):
+        c["rerank_score"] = float(score)
+    return sorted(candidates, key=lambda c: c["rerank_score"], reverse=True)[:k]
+
+
+def retrieve_context(full_text, query_vector=None, k=None, fetch_k=None, use_mmr=None, mode=None, rerank=None):
+    """Retrieves the shared context for a document.
+
+    "dense" mode runs one FAISS search; "hybrid" also runs a BM25 search over the
+    same chunks and merges both rankings with reciprocal rank fusion. Candidates
+    are then reranked by the cross-encoder (RERANKER_ENABLED), diversified with
+    MMR, or cut to k. Returns a list of {"id", "document", "distance"} (L2
+    distance, lower is closer; None for chunks only BM25 found), plus "score"
+    (fused) in hybrid mode and "rerank_score" when reranked, with duplicate chunk
+    texts removed.
+    """
+    if registry.is_remote():
+        # API worker of a sharded deployment: the model server holds the index
+        with metrics.timed("remote_retrieve"):
+            return registry.get_model_client().call(
+                "retrieve", full_text, query_vector, k=k, fetch_k=fetch_k, use_mmr=use_mmr, mode=mode, rerank=rerank
+            )
+
+    k = k or config.RETRIEVAL_K
+    fetch_k = max(fetch_k or config.RETRIEVAL_FETCH_K, k)
+    use_mmr = config.RETRIEVAL_MMR if use_mmr is None else use_mmr
+    mode = mode or config.RETRIEVAL_MODE
+    rerank = config.RERANKER_ENABLED if rerank is None else rerank
+
+    vectorstore = registry.get_vectorstore()
+    if query_vector is None:
+        query_vector = embed_query_text(full_text)
+    query = np.asarray([query_vector], dtype=np.float32)
+
+    dense = _dense_hits(vectorstore, query, fetch_k)
+    distances = dict(dense)
+    order = [row for row, _ in dense]
+    fused = {}
+    if mode == "hybrid":
+        lexical = _lexical_hits(vectorstore, full_text, fetch_k)
+        if lexical is not None:
+            fused = reciprocal_rank_fusion([order, [row for row, _ in lexical]])
+            order = sorted(fused, key=lambda row: fused[row], reverse=True)
+    elif mode != "dense":
+        raise ValueError(f"Unknown RETRIEVAL_MODE '{mode}' (expected dense or hybrid)")
+
+    found = _fetch_rows(vectorstore, order)
+    candidates, seen = [], set()
+    for i in order:
+        if i not in found:
+            continue
+        chunk_id, doc = found[i]
+        key = _content_key(doc.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        candidate = {"id": chunk_id, "document": doc, "distance": distances.get(i), "row": i}
+        if fused:
+            candidate["score"] = fused[i]
+        candidates.append(candidate)
+
+    if rerank and len(candidates) > 1:
+        candidates = _rerank(full_text, candidates, k)
+    elif use_mmr and len(candidates) > k:
+        stored = registry.get_vectors()
+        if stored is not None:
+            # Exact vectors: quantized indexes can only reconstruct approximations
+            vectors = np.asarray(stored[[c["row"] for c in candidates]], dtype=np.float32)
+        else:
+            vectors = np.asarray([vectorstore.index.reconstruct(c["row"]) for c in candidates])
+        selected = maximal_marginal_relevance(query[0], vectors, k=k, lambda_mult=config.RETRIEVAL_MMR_LAMBDA)
+        candidates = [candidates[i] for i in selected]
+    else:
+        candidates = candidates[:k]
+
+    for c in candidates:
+        del c["row"]
+    return candidates
+
+
+def context_summary(context):
+    """JSON-friendly view of retrieved chunks for the combined report."""
+    summary = []
+    for c in context:
+        entry = {
+            "id": c["id"],
+            "source": c["document"].metadata.get("source", ""),
+            "distance": round(c["distance"], 4) if c["distance"] is not None else None
+        }
+        for score in ("score", "rerank_score"):
+            if score in c:
+                entry[score] = round(c[score], 4)
+        summary.append(entry)
+    return summary
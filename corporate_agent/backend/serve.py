@@ -0,0 +1,98 @@
+"""Launch the sharded deployment: one model server plus uvicorn API workers.
+
+    python serve.py --api-workers 4 --port 7000
+
+The model server (model_server.py) loads the embeddings, FAISS index and reranker
+once; the API workers only hold the chains and reach it over a Unix socket.
+Stopping the launcher (Ctrl+C / SIGTERM) stops both, and so does either one
+exiting.
+"""
+import os
+import sys
+import time
+import signal
+import secrets
+import argparse
+import subprocess
+from multiprocessing.connection import Client
+import config
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _wait_for_server(process, address, authkey, timeout):
+    """Block until the model server answers, or fail if it exits or takes too long."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if process.poll() is not None:
+            raise RuntimeError(f"❌ Model server exited with code {process.returncode}")
+        try:
+            # Same request as model_server.ModelClient, without importing the model stack here
+            with Client(address, family="AF_UNIX", authkey=authkey) as conn:
+                conn.send(("stats", (), {}))
+                return conn.recv()[1]
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"❌ Model server did not come up within {timeout}s")
+            time.sleep(0.5)
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def _stop(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def launch(api_workers, host, port, socket_path, startup_timeout):
+    """Run the topology until interrupted; returns the exit code."""
+    authkey = config.MODEL_SERVER_AUTHKEY or secrets.token_hex(16)
+    env = dict(os.environ, MODEL_SERVER_SOCKET=socket_path, MODEL_SERVER_AUTHKEY=authkey)
+
+    server = subprocess.Popen([sys.executable, "model_server.py", "--socket", socket_path], cwd=_HERE, env=env)
+    processes = [server]
+    # SIGTERM takes the same path as Ctrl+C so the children are always stopped
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        stats = _wait_for_server(server, socket_path, authkey.encode(), startup_timeout)
+        print(f"✅ Model server ready (pid {stats['pid']}, RSS {stats['rss_now_mb']} MB); "
+              f"starting {api_workers} API workers on {host}:{port}", flush=True)
+        api = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", host, "--port", str(port),
+             "--workers", str(api_workers)],
+            cwd=_HERE, env=env
+        )
+        processes.append(api)
+        while all(p.poll() is None for p in processes):
+            time.sleep(1)
+        failed = next(p for p in processes if p.poll() is not None)
+        print(f"⚠️ {'Model server' if failed is server else 'API workers'} exited "
+              f"with code {failed.returncode}; stopping.", flush=True)
+        return failed.returncode or 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        _stop(processes)
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run one model server and several lightweight API workers.")
+    parser.add_argument("--api-workers", type=int, default=4, help="uvicorn worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--socket", default=config.MODEL_SERVER_SOCKET or "/tmp/corporate_agent_models.sock",
+                        help="Unix socket shared by the server and the workers")
+    parser.add_argument("--startup-timeout", type=float, default=300,
+                        help="seconds to wait for the model server to load")
+    args = parser.parse_args()
+    sys.exit(launch(args.api_workers, args.host, args.port, args.socket, args.startup_timeout))
@@ -0,0 +1,140 @@
+import os
+import io
+import re
+import json
+import time
+import uuid
+import shutil
+import zipfile
+import threading
+import config
+
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class ReviewedDocStore:
+    """On-disk storage for reviewed DOCX files served by download endpoints.
+
+    Everything lives in the directory itself ({doc_id}.docx plus {doc_id}.json
+    holding the original filename), so any API worker sharing `root` can serve
+    a file another worker stored. Expiry uses the file's modification time.
+    """
+
+    _ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+    def __init__(self, root, ttl_seconds):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _paths(self, doc_id):
+        base = os.path.join(self.root, doc_id)
+        return base + ".docx", base + ".json"
+
+    def put(self, filename, data):
+        """Store one reviewed file (bytes, or a path to copy into the store) and return its id."""
+        doc_id = uuid.uuid4().hex
+        path, meta_path = self._paths(doc_id)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"filename": filename}, f)
+        # Written under a temporary name so other workers never serve a partial file
+        tmp_path = path + ".tmp"
+        if isinstance(data, (bytes, bytearray)):
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        else:
+            shutil.copyfile(data, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._evict_expired()
+        return doc_id
+
+    def get(self, doc_id):
+        """Return (path, filename) for a stored file, or None if unknown or expired."""
+        if not self._ID_RE.match(doc_id or ""):
+            return None
+        path, meta_path = self._paths(doc_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(meta_path, "r", encoding="utf-8") as f:
+                filename = json.load(f)["filename"]
+        except (OSError, ValueError, KeyError):
+            return None
+        return path, filename
+
+    def _evict_expired(self):
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl_seconds:
+                    os.remove(path)
+            except OSError:
+                pass  # already removed by another worker
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.root, ignore_errors=True)
+            os.makedirs(self.root, exist_ok=True)
+
+
+reviewed_store = ReviewedDocStore(config.REVIEWED_DOCS_DIR, config.REVIEWED_DOCS_TTL)
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink that remembers its position, for streaming zips."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def read_reviewed(data):
+    """Bytes of a reviewed document given as bytes or as a file path."""
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    with open(data, "rb") as f:
+        return f.read()
+
+
+def iter_zip(reviewed_docs, combined_report):
+    """Yield a zip archive with combined_report.json first, then each reviewed DOCX.
+
+    Members are yielded as soon as they are written, so the report reaches the
+    client before the documents and only one document is buffered at a time.
+    Documents may be given as bytes or file paths.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("combined_report.json", json.dumps(combined_report, indent=2))
+        yield stream.pop()
+        used_names = set()
+        for fname, data in reviewed_docs:
+            name = f"reviewed_{os.path.basename(fname)}"
+            while name in used_names:
+                name = "_" + name
+            used_names.add(name)
+            if isinstance(data, (bytes, bytearray)):
+                zf.writestr(name, data)
+            else:
+                zf.write(data, arcname=name)
+            yield stream.pop()
+    yield stream.pop()
@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+
+# Backend modules import each other flat (import config), as when run from corporate_agent/backend.
+# Keep module-level stores from opening files under data/ while tests import them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("RESULT_CACHE_ENABLED", "false")
+os.environ.setdefault("DELTA_REVIEW", "false")
+os.environ.setdefault("GROQ_API_KEY", "offline-test")
+
+
+@pytest.fixture(scope="session")
+def pipeline():
+    """docx_processing with every chain's LLM swapped for benchmark's fake model.
+
+    Needs the embedding model and the ADGM index (python preprocess.py); skipped without them.
+    """
+    import config
+    if not os.path.exists(os.path.join(config.VECTORSTORE_DIR, "index.faiss")):
+        pytest.skip("ADGM index not built")
+    try:
+        import benchmark
+        benchmark.install_fake_llm(latency=0, jitter=0)
+    except Exception as e:
+        pytest.skip(f"Analysis pipeline unavailable: {e}")
+    import docx_processing
+    return docx_processing
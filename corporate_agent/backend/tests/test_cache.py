@@ -0,0 +1,16 @@
+from cache import ResultCache
+
+
+def _cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache.sqlite"), max_entries=100, ttl_seconds=3600)
+
+
+def test_key_depends_on_stuffed_context(tmp_path):
+    cache = _cache(tmp_path)
+    key = cache.make_key("compliance", "template", "Check clause 3", "v1", context=["Regulation 12 applies."])
+    assert key == cache.make_key("compliance", "template", "Check  clause 3", "v1", context=["Regulation 12 applies."])
+    assert key != cache.make_key("compliance", "template", "Check clause 3", "v1", context=["Regulation 13 applies."])
+    assert key != cache.make_key("compliance", "template", "Check clause 3", "v1", context=["Regulation 12", "applies."])
+    # The chain's own retriever is a different prompt from an empty shared context
+    assert cache.make_key("compliance", "template", "Check clause 3", "v1") != \
+        cache.make_key("compliance", "template", "Check clause 3", "v1", context=[])
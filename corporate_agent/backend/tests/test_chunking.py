@@ -0,0 +1,71 @@
+from chunking import find_sections, split_into_sections, locate_section
+
+
+def _blocks(texts):
+    blocks, offset = [], 0
+    for i, text in enumerate(texts):
+        kind = "heading" if text.isupper() else "paragraph"
+        blocks.append({"id": f"p{i}", "kind": kind, "text": text, "start": offset, "end": offset + len(text),
+                       "level": None})
+        offset += len(text) + 1
+    return blocks, "\n".join(texts)
+
+
+TEXTS = ["PART I", "1. Name of the company.", "The name is Example Ltd.", "2. Registered office.",
+         "The office is in Abu Dhabi.", "3. Directors.", "There are two directors."]
+
+
+def test_find_sections_cover_every_block_in_order():
+    blocks, _ = _blocks(TEXTS)
+    sections = find_sections(blocks)
+    assert sections == [[0], [1, 2], [3, 4], [5, 6]]
+
+
+def test_single_chunk_is_the_full_text():
+    blocks, text = _blocks(TEXTS)
+    chunks = split_into_sections(blocks, text, max_chars=4000)
+    assert len(chunks) == 1
+    assert chunks[0]["text"] == text
+
+
+def test_restricted_sections_never_span_a_gap():
+    blocks, text = _blocks(TEXTS)
+    sections = find_sections(blocks)
+    chunks = split_into_sections(blocks, text, max_chars=4000, sections=[sections[1], sections[3]])
+    assert [c["block_indices"] for c in chunks] == [[1, 2], [5, 6]]
+    assert chunks[1]["text"] == "3. Directors.\nThere are two directors."
+
+
+def test_oversized_sections_split_on_block_boundaries():
+    blocks, text = _blocks(TEXTS)
+    chunks = split_into_sections(blocks, text, max_chars=30)
+    assert all(c["block_indices"] for c in chunks)
+    assert [i for c in chunks for i in c["block_indices"]] == list(range(len(TEXTS)))
+
+
+def test_locate_section_reports_whether_the_label_matched():
+    blocks, text = _blocks(TEXTS)
+    chunk = split_into_sections(blocks, text, max_chars=4000)[0]
+    assert locate_section(chunk, "2. Registered office", blocks) == (3, True)
+    assert locate_section(chunk, "Abu Dhabi", blocks) == (4, True)
+    assert locate_section(chunk, "N/A", blocks) == (0, False)
+    assert locate_section(chunk, "Missing clause", blocks) == (0, False)
+
+
+def test_locate_section_matches_clause_references():
+    blocks, text = _blocks(["PART I", "1. Name of the company.", "The name is Example Ltd.", "2.1 Registered office.",
+                            "PROBATIONARY PERIOD", "The probation lasts six months."])
+    chunk = split_into_sections(blocks, text, max_chars=4000)[0]
+    assert locate_section(chunk, "Clause 2.1", blocks) == (3, True)
+    assert locate_section(chunk, "Clause 4 - Probationary Period", blocks) == (4, True)
+    assert locate_section(chunk, "Article 1: Name", blocks) == (1, True)
+    assert locate_section(chunk, "Clause 9.9", blocks) == (0, False)
+
+
+def test_numbers_opening_ordinary_paragraphs_do_not_start_sections():
+    texts = ["1. Share capital.", "2020 accounts were filed late.", "100 shares are held by the founder.",
+             "100 Shares of USD 1 each.", "5 directors attended.", "3.5 million shares remain unissued.",
+             "2. Directors.", "2.1\tAppointment", "12) (a) The chair."]
+    blocks, _ = _blocks(texts)
+    assert [[texts[i] for i in s][0] for s in find_sections(blocks)] == [
+        "1. Share capital.", "2. Directors.", "2.1\tAppointment", "12) (a) The chair."]
@@ -0,0 +1,23 @@
+import numpy as np
+from classifier import PrototypeClassifier
+
+LABELS = ["Articles of Association", "Memorandum of Association", "Board Resolution Templates"]
+
+
+def _classifier(monkeypatch, prototype_labels):
+    classifier = PrototypeClassifier("unused", {}, threshold=0.75, min_margin=0.05, required_labels=LABELS)
+    matrix = np.eye(len(prototype_labels), 4, dtype=np.float32)
+    monkeypatch.setattr(classifier, "prototypes", lambda: (prototype_labels, matrix))
+    return classifier
+
+
+def test_articles_fall_through_to_llm_without_their_prototypes(monkeypatch):
+    # Articles of Association close to a resolution prototype: confident, but its own label has no prototype
+    classifier = _classifier(monkeypatch, ["Board Resolution Templates"])
+    assert classifier.classify("The Articles of Association of Example Ltd", [0.9, 0.3, 0.0, 0.0]) == (None, 0.9487)
+
+
+def test_confident_match_with_every_label_covered(monkeypatch):
+    classifier = _classifier(monkeypatch, LABELS)
+    assert classifier.classify("Resolution of the board", [0.1, 0.0, 1.0, 0.0]) == ("Board Resolution Templates", 0.995)
+    assert classifier.classify("Resolution of the board", [1.0, 0.0, 1.0, 0.0])[0] is None  # no margin
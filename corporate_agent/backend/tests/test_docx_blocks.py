@@ -0,0 +1,45 @@
+import io
+from docx import Document
+import docx_blocks
+
+
+def _sample_docx():
+    doc = Document()
+    doc.add_heading("Articles of Association", level=1)
+    doc.add_paragraph("1. The company name is Example Ltd.")
+    doc.add_paragraph("Shareholders", style="List Bullet")
+    table = doc.add_table(rows=2, cols=2)
+    for r, row in enumerate(table.rows):
+        for c, cell in enumerate(row.cells):
+            cell.text = f"cell {r}{c}"
+    doc.add_paragraph("")
+    doc.add_paragraph("2. Registered office in Abu Dhabi.")
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def test_offsets_point_into_full_text():
+    blocks = docx_blocks.extract_blocks(Document(io.BytesIO(_sample_docx())))
+    text = docx_blocks.full_text(blocks)
+    for block in blocks:
+        assert text[block["start"]:block["end"]] == block["text"]
+    assert [b["kind"] for b in blocks[:2]] == ["heading", "paragraph"]
+    assert blocks[2]["style"] == "List Bullet"
+
+
+def test_table_rows_are_joined_as_records():
+    blocks = docx_blocks.extract_blocks(Document(io.BytesIO(_sample_docx())))
+    text = docx_blocks.full_text(blocks)
+    assert "cell 00 | cell 01\ncell 10 | cell 11" in text
+    assert [b["id"] for b in blocks if b["kind"] == "table_cell"] == ["t0r0c0", "t0r0c1", "t0r1c0", "t0r1c1"]
+
+
+def test_streamed_extraction_matches_python_docx():
+    data = _sample_docx()
+    parsed = docx_blocks.extract_blocks(Document(io.BytesIO(data)))
+    streamed = docx_blocks.extract_blocks_from_file(data)
+    assert docx_blocks.full_text(streamed) == docx_blocks.full_text(parsed)
+    keys = ("id", "kind", "text", "start", "end", "style", "level", "table")
+    assert [{k: b[k] for k in keys} for b in streamed] == [{k: b[k] for k in keys} for b in parsed]
+    assert all(b["element"] is None for b in streamed)
@@ -0,0 +1,124 @@
+import io
+import json
+import os
+from docx import Document
+import config
+import versions
+from versions import VersionStore
+
+CONTRACT = "ADGM Standard Employment Contract - ER 2019 - Short Version (May 2024).docx"
+
+
+def _contract():
+    with open(os.path.join(config.ADGM_SOURCES_DIR, CONTRACT), "rb") as f:
+        return f.read()
+
+
+def _edit_paragraph(data, position=0.5):
+    """The document with one long paragraph (at `position` of them) reworded."""
+    doc = Document(io.BytesIO(data))
+    paragraphs = [p for p in doc.paragraphs if len(p.text) > 80 and p.runs]
+    run = paragraphs[int(len(paragraphs) * position)].runs[0]
+    run.text = "Amended: " + run.text
+    out = io.BytesIO()
+    doc.save(out)
+    return out.getvalue()
+
+
+def _use_store(monkeypatch, path):
+    store = VersionStore(str(path), max_entries=100, ttl_seconds=3600)
+    monkeypatch.setattr(versions, "version_store", store)
+    return store
+
+
+def test_versions_in_one_batch_do_not_depend_on_concurrency(pipeline, monkeypatch, tmp_path):
+    v1 = _contract()
+    v2 = _edit_paragraph(v1)
+    reports = []
+    for concurrency in (1, 4):
+        _use_store(monkeypatch, tmp_path / f"versions_{concurrency}.sqlite")
+        _, report = pipeline.analyze_and_comment_docx_batch(
+            [v1, v2], ["v1.docx", "v2.docx"], concurrency=concurrency, include_timings=False,
+            version_scope="client"
+        )
+        reports.append(report)
+    assert reports[0] == reports[1]
+    # Neither file is treated as a version of the other; a later upload is
+    assert reports[0]["delta_review"] == []
+    _, later = pipeline.analyze_and_comment_docx_batch([v2], ["v2.docx"], include_timings=False,
+                                                       version_scope="client")
+    assert later["delta_review"][0]["previous_version"] == "v2.docx"
+
+
+def test_unscoped_uploads_do_not_see_earlier_filenames(pipeline, monkeypatch, tmp_path):
+    _use_store(monkeypatch, tmp_path / "versions.sqlite")
+    v1 = _contract()
+    pipeline.analyze_and_comment_docx_batch([v1], ["other_client.docx"], include_timings=False)
+    _, report = pipeline.analyze_and_comment_docx_batch([_edit_paragraph(v1)], ["v2.docx"], include_timings=False)
+    assert report["delta_review"][0]["previous_version"] is None
+    assert any(issue["provenance"] == "carried_forward" for issue in report["issues_found"])
+    assert "other_client.docx" not in json.dumps(report)
+
+
+def test_one_paragraph_edit_rechecks_only_its_section(pipeline, monkeypatch, tmp_path):
+    # Models name auto-numbered clauses by number ("Clause 4.2"), which is not part of the block text
+    def check_compliance(ai_doc_type, text, *args):
+        lines = [line for line in text.splitlines() if len(line) > 80]
+        return [{"section": f"Clause {n}.2", "issue": f"Unclear wording: {line[:100]}", "severity": "Low",
+                 "suggestion": ""} for n, line in enumerate(lines[:3], start=4)], None
+
+    monkeypatch.setattr(pipeline, "_check_compliance", check_compliance)
+    monkeypatch.setattr(config, "COMPLIANCE_CHUNKING", True)
+    _use_store(monkeypatch, tmp_path / "versions.sqlite")
+    v1 = _contract()
+    pipeline.analyze_and_comment_docx_batch([v1], ["v1.docx"], include_timings=False, version_scope="client")
+    _, report = pipeline.analyze_and_comment_docx_batch([_edit_paragraph(v1)], ["v2.docx"], include_timings=False,
+                                                        version_scope="client")
+    delta = report["delta_review"][0]
+    assert delta["sections_rechecked"] == 1
+    assert any(issue["provenance"] == "carried_forward" for issue in report["issues_found"])
+
+
+def test_fast_path_leaves_articles_to_the_llm(pipeline, monkeypatch):
+    monkeypatch.setattr(config, "DOC_TYPE_FAST_PATH", True)
+    text = ("ARTICLES OF ASSOCIATION OF EXAMPLE LTD. The directors may by resolution of the board appoint a "
+            "secretary. Resolutions of the shareholders are passed by ordinary resolution. ") * 5
+    doc_type, method, _ = pipeline._classify_document(text)
+    assert method == "llm"
+
+
+def test_cached_answers_are_not_reused_with_other_context(pipeline, monkeypatch, tmp_path):
+    from langchain_core.documents import Document
+    from cache import ResultCache
+
+    monkeypatch.setattr(pipeline, "result_cache", ResultCache(str(tmp_path / "cache.sqlite"), 100, 3600))
+    prompt = "Check compliance for Board Resolution Templates:\nThe directors resolve to appoint a secretary."
+
+    def answer(context):
+        return pipeline._invoke_chain(pipeline.compliance_chain, "compliance", prompt,
+                                      context_docs=[Document(page_content=context)])
+
+    first = answer("A resolution must be signed by all directors.")
+    other = answer("The register of secretaries must be updated within 15 days.")
+    assert other != first
+    assert answer("A resolution must be signed by all directors.") == first
+    assert pipeline.result_cache.hits == 1
+
+
+def test_failed_compliance_calls_are_reported_not_annotated(pipeline, monkeypatch, tmp_path):
+    invoke_chain = pipeline._invoke_chain
+
+    def failing(chain, chain_name, *args, **kwargs):
+        if chain_name == "compliance":
+            raise RuntimeError("circuit open")
+        return invoke_chain(chain, chain_name, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "_invoke_chain", failing)
+    store = _use_store(monkeypatch, tmp_path / "versions.sqlite")
+    reviewed, report = pipeline.analyze_and_comment_docx_batch([_contract()], ["v1.docx"], include_timings=False)
+    assert report["issues_found"] == []
+    assert report["skipped_checks"] and {c["error"] for c in report["skipped_checks"]} == {"circuit open"}
+    assert all(c["check"] == "compliance" and c["filename"] == "v1.docx" for c in report["skipped_checks"])
+    text = "\n".join(p.text for p in Document(io.BytesIO(reviewed[0][1])).paragraphs)
+    assert "circuit open" not in text
+    assert store.stats()["analyses"] == 0
@@ -0,0 +1,39 @@
+import json
+import os
+import numpy as np
+from docx import Document
+import config
+import preprocess
+
+
+def _corpus(monkeypatch, tmp_path):
+    sources = tmp_path / "sources"
+    sources.mkdir()
+    doc = Document()
+    doc.add_paragraph("The registered office of the company must be in Abu Dhabi Global Market.")
+    doc.save(str(sources / "small.docx"))
+    monkeypatch.setattr(config, "ADGM_SOURCES_DIR", str(sources))
+    monkeypatch.setattr(config, "VECTORSTORE_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(config, "PARSE_CACHE_ENABLED", False)
+    rng = np.random.default_rng(0)
+    monkeypatch.setattr(preprocess, "_embed_in_batches",
+                        lambda texts: rng.random((len(texts), 8), dtype=np.float32))
+
+
+def _meta():
+    with open(os.path.join(config.VECTORSTORE_DIR, "meta.json")) as f:
+        return json.load(f)
+
+
+def test_incremental_keeps_an_index_that_fell_back_to_flat(monkeypatch, tmp_path):
+    _corpus(monkeypatch, tmp_path)
+    preprocess.build_index(workers=1, index_type="ivfpq")
+    meta = _meta()
+    assert meta["index_type"] == "flat" and meta["requested_index_type"] == "ivfpq"
+    assert "too few" in meta["index_fallback"]
+
+    preprocess.update_index(workers=1, index_type="ivfpq")
+    assert _meta()["index_version"] == meta["index_version"]
+    # Asking for another type still rebuilds
+    preprocess.update_index(workers=1, index_type="hnsw")
+    assert _meta()["index_type"] == "hnsw" and _meta()["index_fallback"] is None
@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+import config
+import prompt_budget
+
+TEMPLATE = "Use the context.\n{context}\nQuestion: {question}\nAnswer:"
+
+
+def _docs(*texts):
+    return [Document(page_content=t, metadata={"rank": i}) for i, t in enumerate(texts)]
+
+
+def test_unlimited_budget_only_compacts(monkeypatch):
+    monkeypatch.setitem(config.PROMPT_TOKEN_BUDGETS, "review", 0)
+    docs = _docs("ADGM Page 1\n\n\nFirst   chunk text.", "ADGM Page 1\nSecond chunk text.")
+    fitted = prompt_budget.fit_context("review", TEMPLATE, "question", docs)
+    assert [d.page_content for d in fitted] == ["ADGM Page 1\nFirst chunk text.", "Second chunk text."]
+    assert [d.metadata for d in fitted] == [{"rank": 0}, {"rank": 1}]
+
+
+def test_budget_keeps_rank_order_and_extracts_relevant_sentences(monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_TOKENIZER", "")
+    monkeypatch.setattr(config, "PROMPT_MIN_CONTEXT_TOKENS", 0)
+    monkeypatch.setattr(config, "PROMPT_MIN_CHUNK_TOKENS", 10)
+    question = "registered office address"
+    first = "The directors manage the company. " * 10                      # ~85 tokens
+    second = ("Filler sentence about nothing. " * 8 +
+              "The registered office address must be in Abu Dhabi. " + "More filler here. " * 8)
+    third = "Dividends are paid yearly. " * 10
+    fixed = prompt_budget.template_tokens("review", TEMPLATE) + prompt_budget.count_tokens(question)
+    monkeypatch.setitem(config.PROMPT_TOKEN_BUDGETS, "review", fixed + 130)
+
+    fitted = prompt_budget.fit_context("review", TEMPLATE, question, _docs(first, second, third))
+    assert fitted[0].page_content == first.strip()
+    assert "registered office address" in fitted[1].page_content
+    assert len(fitted[1].page_content) < len(second)
+    assert len(fitted) == 2
+    assert sum(prompt_budget.count_tokens(d.page_content) + 2 for d in fitted) <= 130
+
+
+def test_min_context_floor_applies_when_question_fills_budget(monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_MIN_CONTEXT_TOKENS", 40)
+    monkeypatch.setitem(config.PROMPT_TOKEN_BUDGETS, "compliance", 10)
+    fitted = prompt_budget.fit_context("compliance", TEMPLATE, "x" * 400, _docs("Short context. " * 4, "y " * 200))
+    assert [d.page_content for d in fitted] == ["Short context. Short context. Short context. Short context."]
+
+
+def test_default_budgets_keep_full_retrieval_for_largest_question(monkeypatch):
+    monkeypatch.setattr(config, "PROMPT_TOKENIZER", "")
+    chunks = [f"Chunk {i} states a distinct requirement. " * 15 for i in range(4)]   # ~150 tokens each
+    for chain, question_chars in (("doc_type", 2000), ("review", 4000), ("compliance", 4000)):
+        fitted = prompt_budget.fit_context(chain, TEMPLATE, "q" * question_chars, _docs(*chunks))
+        assert [d.page_content for d in fitted] == [c.strip() for c in chunks], chain
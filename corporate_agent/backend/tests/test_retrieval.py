@@ -0,0 +1,25 @@
+from retrieval import reciprocal_rank_fusion, lexical_query
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    scores = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=60)
+    assert scores[1] == 1 / 61 + 1 / 62
+    assert max(scores, key=scores.get) == 1
+    assert scores[4] == 1 / 63
+
+
+def test_lexical_query_keeps_references_as_phrases():
+    query = lexical_query("Under Section 17(2) and Form 3 the directors shall file the register.", max_terms=20)
+    parts = query.split(" OR ")
+    assert parts[:2] == ['"section 17 2"', '"form 3"']
+    assert '"directors"' in parts and '"the"' not in parts
+
+
+def test_lexical_query_ignores_instrument_years():
+    query = lexical_query("Companies Regulations 2020 apply to Regulation 12.", max_terms=20)
+    assert '"regulations 2020"' not in query
+    assert query.startswith('"regulation 12"')
+
+
+def test_lexical_query_caps_terms():
+    assert len(lexical_query("alpha beta gamma delta epsilon zeta", max_terms=3).split(" OR ")) == 3
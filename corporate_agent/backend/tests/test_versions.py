@@ -0,0 +1,128 @@
+import time
+import versions
+from versions import VersionStore, diff_blocks, carry_forward, section_fingerprint
+
+
+def _store(tmp_path, common=frozenset()):
+    return VersionStore(str(tmp_path / "versions.sqlite"), max_entries=100, ttl_seconds=3600,
+                        common_fps=lambda: common)
+
+
+def test_diff_blocks_counts_edits():
+    assert diff_blocks(["a", "b", "c", "d"], ["a", "x", "c", "d", "e"]) == {
+        "unchanged": 3, "changed": 1, "added": 1, "removed": 0
+    }
+    assert diff_blocks(["a", "b"], ["b"]) == {"unchanged": 1, "changed": 0, "added": 0, "removed": 1}
+
+
+def test_exact_version_wins(tmp_path):
+    store = _store(tmp_path)
+    fps = ["a", "b", "c", "d"]
+    store.record(fps, "sig", "v1.docx", {"n": 1})
+    found = store.find_previous(fps, "sig", 0.5)
+    assert found["exact"] and found["filename"] == "v1.docx" and found["n"] == 1
+
+
+def test_lookups_ignore_analyses_recorded_after_before(tmp_path):
+    store = _store(tmp_path)
+    store.record(["a", "b", "c", "d"], "sig", "v1.docx", {})
+    assert store.find_previous(["a", "b", "c", "d"], "sig", 0.5, before=0) is None
+    assert store.find_previous(["a", "b", "c", "x"], "sig", 0.5, before=0) is None
+    assert store.find_previous(["a", "b", "c", "x"], "sig", 0.5, before=time.time() + 1)["filename"] == "v1.docx"
+
+
+def test_similar_version_needs_min_similarity(tmp_path):
+    store = _store(tmp_path)
+    store.record(["a", "b", "c", "d"], "sig", "v1.docx", {})
+    found = store.find_previous(["a", "b", "c", "x"], "sig", 0.5)
+    assert not found["exact"] and found["similarity"] == 0.6
+    assert store.find_previous(["a", "b", "c", "x"], "sig", 0.7) is None
+
+
+def test_other_signatures_and_scopes_are_not_matched(tmp_path):
+    store = _store(tmp_path)
+    store.record(["a", "b", "c", "d"], "sig", "acme.docx", {}, scope="acme")
+    assert store.find_previous(["a", "b", "c", "d"], "other", 0.5) is None
+    assert store.find_previous(["a", "b", "c", "d"], "sig", 0.5, scope="beta") is None
+    assert store.find_previous(["a", "b", "c", "x"], "sig", 0.5, scope="beta") is None
+    assert store.find_previous(["a", "b", "c", "x"], "sig", 0.5, scope="acme")["filename"] == "acme.docx"
+
+
+def test_template_blocks_do_not_count(tmp_path):
+    # Two clients' copies of one template: shared boilerplate, different details
+    store = _store(tmp_path, common=frozenset({"t1", "t2", "t3", "t4", "t5", "t6"}))
+    template = ["t1", "t2", "t3", "t4", "t5", "t6"]
+    store.record(template + ["acme name", "acme office"], "sig", "acme.docx", {})
+    assert store.find_previous(template + ["beta name", "beta office"], "sig", 0.5) is None
+    assert store.find_previous(template + ["acme name", "acme office 2"], "sig", 0.3)["filename"] == "acme.docx"
+
+
+def _blocks(texts):
+    return [{"id": f"p{i}", "text": t} for i, t in enumerate(texts)]
+
+
+def _previous(block_fps, sections, findings_by_section):
+    return {
+        "filename": "v1.docx",
+        "sections": {
+            section_fingerprint(block_fps, section): findings_by_section.get(i, [])
+            for i, section in enumerate(sections)
+        },
+    }
+
+
+def test_carry_forward_keeps_label_matched_findings_of_unchanged_sections():
+    old = _blocks(["1. Name", "Example Ltd", "2. Office", "Abu Dhabi", "3. Directors", "Two"])
+    sections = [[0, 1], [2, 3], [4, 5]]
+    previous = _previous(versions.block_fingerprints(old), sections, {
+        0: [{"issue": "name", "section": "1. Name", "section_matched": True, "block_offset": 1}],
+        2: [{"issue": "directors", "section": "3. Directors", "section_matched": True, "block_offset": 0}],
+    })
+    # Section 3 is edited and moves up one block
+    new = _blocks(["1. Name", "Example Ltd", "2. Office", "3. Directors", "Three"])
+    carried, changed = carry_forward(previous, new, versions.block_fingerprints(new), [[0, 1], [2], [3, 4]])
+    assert [(f["issue"], f["block_id"], f["provenance"], f["carried_from"]) for f in carried] == [
+        ("name", "p1", "carried_forward", "v1.docx")
+    ]
+    assert "block_offset" not in carried[0]
+    assert changed == [[2], [3, 4]]
+
+
+def test_carry_forward_rechecks_sections_with_unanchored_findings():
+    blocks = _blocks(["1. Name", "Example Ltd", "2. Office", "Abu Dhabi"])
+    sections = [[0, 1], [2, 3]]
+    block_fps = versions.block_fingerprints(blocks)
+    previous = _previous(block_fps, sections, {
+        0: [{"issue": "missing registered office clause", "section": "N/A", "section_matched": False}],
+        1: [{"issue": "office", "section": "2. Office", "block_offset": 0}],  # stored before section_matched
+    })
+    carried, changed = carry_forward(previous, blocks, block_fps, sections)
+    assert carried == []
+    assert changed == sections
+
+
+def test_carry_forward_keeps_findings_from_earlier_carries():
+    blocks = _blocks(["1. Name", "Example Ltd"])
+    block_fps = versions.block_fingerprints(blocks)
+    previous = _previous(block_fps, [[0, 1]], {
+        0: [{"issue": "name", "section": "1. Name", "section_matched": True, "carried_from": "v0.docx"}],
+    })
+    carried, changed = carry_forward(previous, blocks, block_fps, [[0, 1]])
+    assert carried[0]["carried_from"] == "v0.docx" and changed == []
+
+
+def test_carry_forward_keeps_chunk_findings_while_their_chunk_is_unchanged():
+    old = _blocks(["1. Name", "Example Ltd", "2. Office", "Abu Dhabi", "3. Directors", "Two"])
+    sections = [[0, 1], [2, 3], [4, 5]]
+    old_fps = versions.block_fingerprints(old)
+    chunk = [section_fingerprint(old_fps, s) for s in sections[:2]]
+    previous = _previous(old_fps, sections, {
+        0: [{"issue": "no share capital clause", "section": "N/A", "section_matched": False, "chunk_fps": chunk}],
+    })
+    new = _blocks(["1. Name", "Example Ltd", "2. Office", "Abu Dhabi", "3. Directors", "Three"])
+    carried, changed = carry_forward(previous, new, versions.block_fingerprints(new), sections)
+    assert [f["issue"] for f in carried] == ["no share capital clause"] and changed == [[4, 5]]
+
+    new = _blocks(["1. Name", "Example Ltd", "2. Office", "Dubai", "3. Directors", "Two"])
+    carried, changed = carry_forward(previous, new, versions.block_fingerprints(new), sections)
+    assert carried == [] and changed == [[0, 1], [2, 3]]
@@ -0,0 +1,10 @@
+"""Plain-text helpers shared by retrieval and prompt assembly."""
+
+# Function words ignored when picking query terms or scoring sentence overlap
+STOPWORDS = frozenset(
+    "the and for are was were been being this that these those with from into onto upon shall will "
+    "would should could may might must can not any all each such its their them they his her him "
+    "our your you who whom which what when where while than then there here have has had does did "
+    "done per via out off over under about above below between within without also other only same "
+    "very more most some".split()
+)
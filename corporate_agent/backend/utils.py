@@ -1,32 +1,86 @@
 import json
-from langchain_huggingface import HuggingFaceEmbeddings
+import threading
+import numpy as np
+import registry
 
 # Load checklist mapping
 with open("checklist_mapping.json", "r") as f:
     CHECKLISTS = json.load(f)
 
-# Load embeddings model once
-embeddings_model = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+# Every document type named in any checklist, in a stable order
+CHECKLIST_DOC_TYPES = list(dict.fromkeys(d for docs in CHECKLISTS.values() for d in docs))
 
-def compare_against_checklist(process: str, uploaded_types: list, similarity_threshold=0.75):
+# Process x document-type incidence matrix, used to score all processes at once
+_PROCESS_NAMES = list(CHECKLISTS.keys())
+_PROCESS_MATRIX = np.array(
+    [[1.0 if t in CHECKLISTS[proc] else 0.0 for t in CHECKLIST_DOC_TYPES] for proc in _PROCESS_NAMES]
+).reshape(len(_PROCESS_NAMES), len(CHECKLIST_DOC_TYPES))
+
+_type_lock = threading.Lock()
+_type_matrix = None
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def checklist_type_embeddings():
+    """Normalized embeddings of CHECKLIST_DOC_TYPES, computed once per process."""
+    global _type_matrix
+    if _type_matrix is None:
+        with _type_lock:
+            if _type_matrix is None:
+                embs = registry.get_embeddings().embed_documents(CHECKLIST_DOC_TYPES)
+                _type_matrix = _normalize_rows(np.asarray(embs, dtype=np.float32))
+    return _type_matrix
+
+
+def _embed_types(doc_types):
+    """Normalized embeddings for document type labels, reusing precomputed checklist rows."""
+    type_matrix = checklist_type_embeddings()
+    index = {t: i for i, t in enumerate(CHECKLIST_DOC_TYPES)}
+    unknown = list(dict.fromkeys(t for t in doc_types if t not in index))
+    unknown_rows = {}
+    if unknown:
+        embs = _normalize_rows(np.asarray(registry.get_embeddings().embed_documents(unknown), dtype=np.float32))
+        unknown_rows = dict(zip(unknown, embs))
+    return np.stack([
+        type_matrix[index[t]] if t in index else unknown_rows[t] for t in doc_types
+    ]).reshape(len(doc_types), type_matrix.shape[1])
+
+
+def match_checklist_types(uploaded_types, similarity_threshold=0.75):
+    """Return {checklist document type: matched?} against the uploaded types.
+
+    One similarity matrix (checklist types x uploaded types) is thresholded in a
+    single vectorized step.
+    """
+    if not uploaded_types:
+        return {t: False for t in CHECKLIST_DOC_TYPES}
+    sims = checklist_type_embeddings() @ _embed_types(uploaded_types).T
+    matched = (sims >= similarity_threshold).any(axis=1)
+    return dict(zip(CHECKLIST_DOC_TYPES, matched.tolist()))
+
+
+def score_processes(matched_types):
+    """Number of required documents matched for every process in CHECKLISTS."""
+    matched_vec = np.array([1.0 if matched_types.get(t) else 0.0 for t in CHECKLIST_DOC_TYPES])
+    scores = _PROCESS_MATRIX @ matched_vec
+    return {proc: int(score) for proc, score in zip(_PROCESS_NAMES, scores)}
+
+
+def compare_against_checklist(process: str, uploaded_types: list, similarity_threshold=0.75, matched_types=None):
     """
     Compare uploaded document types against required documents using embeddings.
     Returns missing documents even if names are slightly different.
+    Pass `matched_types` from match_checklist_types to reuse an existing similarity pass.
     """
     required_docs = CHECKLISTS.get(process, [])
-    missing_docs = []
-
-    for req_doc in required_docs:
-        matched = False
-        req_emb = embeddings_model.embed_query(req_doc)
-        for uploaded in uploaded_types:
-            up_emb = embeddings_model.embed_query(uploaded)
-            sim = cosine_similarity(req_emb, up_emb)
-            if sim >= similarity_threshold:
-                matched = True
-                break
-        if not matched:
-            missing_docs.append(req_doc)
+    if matched_types is None:
+        matched_types = match_checklist_types(uploaded_types, similarity_threshold)
+    missing_docs = [req_doc for req_doc in required_docs if not matched_types.get(req_doc)]
 
     return {
         "process": process,
@@ -36,5 +90,4 @@ def compare_against_checklist(process: str, uploaded_types: list, similarity_thr
     }
 
 def cosine_similarity(vec1, vec2):
-    import numpy as np
     return float(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
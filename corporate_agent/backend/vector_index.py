@@ -0,0 +1,254 @@
+import os
+import json
+import math
+import sqlite3
+import threading
+from collections.abc import Mapping
+import numpy as np
+import faiss
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+import config
+
+# === On-disk index format ===
+# index.faiss      FAISS index (flat, IVF-PQ or HNSW), loaded memory-mapped
+# vectors.npy      exact float32 vectors by row, memory-mapped (MMR, incremental rebuilds)
+# docstore.sqlite  chunk id, text and metadata by row, replacing the pickled docstore,
+#                  plus chunks_fts, an FTS5 inverted index over the same rows for BM25 search
+INDEX_FILE = "index.faiss"
+VECTORS_FILE = "vectors.npy"
+DOCSTORE_FILE = "docstore.sqlite"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+LEXICAL_TOKENIZER = "porter unicode61"
+
+
+def is_sqlite_format(directory):
+    return os.path.exists(os.path.join(directory, DOCSTORE_FILE))
+
+
+class SQLiteDocstore(Docstore):
+    """Read-only docstore over docstore.sqlite; each thread gets its own connection."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._count = self._conn().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        self.has_lexical_index = self._conn().execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone() is not None
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _document(content, metadata):
+        return Document(page_content=content, metadata=json.loads(metadata))
+
+    def search(self, search):
+        row = self._conn().execute(
+            "SELECT content, metadata FROM chunks WHERE id = ?", (search,)
+        ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return self._document(*row)
+
+    def id_for_row(self, row):
+        found = self._conn().execute("SELECT id FROM chunks WHERE row = ?", (int(row),)).fetchone()
+        return found[0] if found else None
+
+    def get_rows(self, rows):
+        """{row: (id, Document)} for the given FAISS row numbers, in one query."""
+        rows = [int(r) for r in rows]
+        if not rows:
+            return {}
+        placeholders = ",".join("?" * len(rows))
+        found = self._conn().execute(
+            f"SELECT row, id, content, metadata FROM chunks WHERE row IN ({placeholders})", rows
+        ).fetchall()
+        return {row: (chunk_id, self._document(content, metadata)) for row, chunk_id, content, metadata in found}
+
+    def lexical_search(self, match, limit):
+        """[(row, BM25 score)] best first for an FTS5 MATCH expression (higher is better)."""
+        found = self._conn().execute(
+            "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, int(limit))
+        ).fetchall()
+        return [(row, -score) for row, score in found]  # SQLite's bm25() is lower-is-better
+
+    def all_documents(self):
+        """(ids, documents) in row order."""
+        found = self._conn().execute("SELECT id, content, metadata FROM chunks ORDER BY row").fetchall()
+        return [r[0] for r in found], [self._document(r[1], r[2]) for r in found]
+
+
+class RowIdMap(Mapping):
+    """FAISS row -> chunk id, looked up in the docstore instead of held in memory."""
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    def __getitem__(self, row):
+        chunk_id = self.docstore.id_for_row(row)
+        if chunk_id is None:
+            raise KeyError(row)
+        return chunk_id
+
+    def __iter__(self):
+        return iter(range(len(self.docstore)))
+
+    def __len__(self):
+        return len(self.docstore)
+
+
+def _write_docstore(path, ids, documents):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(
+            "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.executemany(
+            "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+            ((row, chunk_id, doc.page_content, json.dumps(doc.metadata, default=str))
+             for row, (chunk_id, doc) in enumerate(zip(ids, documents)))
+        )
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE chunks_fts USING fts5(content, content='chunks', "
+                f"content_rowid='row', tokenize='{LEXICAL_TOKENIZER}')"
+            )
+            conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ SQLite was built without FTS5, skipping the lexical index: {e}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# === Building ===
+def _pq_shape(n, d):
+    """(m, nbits) for product quantization that n training vectors can support, or None."""
+    nbits = min(config.PQ_NBITS, int(math.log2(max(n, 1) / 39)) if n >= 39 else 0)
+    if nbits < 4:
+        return None
+    m = max(k for k in range(1, min(config.PQ_M, d) + 1) if d % k == 0)
+    return m, nbits
+
+
+def build_faiss_index(vectors, index_type=None):
+    """Build a FAISS index of `index_type` ("flat", "ivfpq" or "hnsw") over float32 vectors.
+
+    Returns (index, index_type actually built). Corpora too small to train IVF-PQ
+    get a flat index instead.
+    """
+    index_type = index_type or config.INDEX_TYPE
+    n, d = vectors.shape
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(d, config.HNSW_M)
+        index.hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+    elif index_type == "ivfpq":
+        shape = _pq_shape(n, d)
+        if shape is None:
+            print(f"ℹ️ {n} vectors are too few to train IVF-PQ, building a flat index.")
+            return build_faiss_index(vectors, "flat")
+        nlist = config.IVF_NLIST or int(4 * math.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(d), d, nlist, *shape)
+        index.train(vectors)
+        if config.PQ_REFINE_FACTOR > 0:
+            # Re-rank PQ candidates with exact distances to recover recall
+            index = faiss.IndexRefineFlat(index)
+    elif index_type == "flat":
+        index = faiss.IndexFlatL2(d)
+    else:
+        raise ValueError(f"Unknown INDEX_TYPE '{index_type}' (expected flat, ivfpq or hnsw)")
+    index.add(vectors)
+    set_search_params(index)
+    return index, index_type
+
+
+def set_search_params(index):
+    """Apply the query-time settings (nprobe, efSearch, refine factor) to an index."""
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = config.HNSW_EF_SEARCH
+        return
+    if isinstance(index, faiss.IndexRefine):
+        index.k_factor = config.PQ_REFINE_FACTOR
+    try:
+        faiss.extract_index_ivf(index).nprobe = config.IVF_NPROBE
+    except RuntimeError:
+        pass  # not an IVF index
+
+
+def recall_at_k(index, vectors, k=10, n_queries=200, seed=0):
+    """Share of the exact top-k neighbours that `index` returns, over sampled stored vectors."""
+    n = vectors.shape[0]
+    k = min(k, n)
+    if n == 0 or k == 0:
+        return 1.0
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(n, size=min(n_queries, n), replace=False)]
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    _, found = index.search(queries, k)
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return hits / (len(queries) * k)
+
+
+def _save_vectors(path, vectors):
+    with open(path, "wb") as f:
+        np.save(f, vectors)
+
+
+def save_index_files(directory, index, vectors, ids, documents):
+    """Write the index, vectors and docstore, each staged then swapped in with os.replace."""
+    os.makedirs(directory, exist_ok=True)
+    staged = []
+    for name, write in (
+        (INDEX_FILE, lambda p: faiss.write_index(index, p)),
+        (VECTORS_FILE, lambda p: _save_vectors(p, vectors)),
+        (DOCSTORE_FILE, lambda p: _write_docstore(p, ids, documents)),
+    ):
+        tmp = os.path.join(directory, f".{name}.tmp")
+        write(tmp)
+        staged.append((tmp, os.path.join(directory, name)))
+    for tmp, target in staged:
+        os.replace(tmp, target)
+    legacy = os.path.join(directory, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy):
+        os.remove(legacy)  # superseded by docstore.sqlite
+
+
+# === Loading ===
+def load_vectorstore(directory, embeddings):
+    """LangChain FAISS store over the on-disk index; memory-mapped when INDEX_MMAP is on."""
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if config.INDEX_MMAP else 0
+    index = faiss.read_index(os.path.join(directory, INDEX_FILE), flags)
+    set_search_params(index)
+    docstore = SQLiteDocstore(os.path.join(directory, DOCSTORE_FILE))
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=RowIdMap(docstore)
+    )
+
+
+def load_vectors(directory, mmap=None):
+    """Exact vectors by row (memory-mapped by default), or None for legacy indexes."""
+    path = os.path.join(directory, VECTORS_FILE)
+    if not os.path.exists(path):
+        return None
+    mmap = config.INDEX_MMAP if mmap is None else mmap
+    return np.load(path, mmap_mode="r" if mmap else None)
@@ -0,0 +1,275 @@
+"""Fingerprints of analyzed documents, so revised versions are re-reviewed as a delta.
+
+Every analysis is stored with the fingerprints of its blocks (see docx_blocks)
+and its compliance findings grouped by section fingerprint (see
+chunking.find_sections). An upload that shares enough blocks with a stored
+analysis made under the same prompts, model and index counts as a new version
+of that document. Its unchanged sections keep their findings, and only the
+changed sections are checked again.
+
+Lookups stay within the caller's scope (e.g. a client id), and blocks that
+occur in the ADGM templates (ADGM_SOURCES_DIR) do not count towards the
+similarity, so two different filled-in copies of one template are not
+mistaken for versions of each other.
+"""
+import os
+import glob
+import json
+import time
+import sqlite3
+import difflib
+import hashlib
+import threading
+import config
+import docx_blocks
+from cache import _normalize, current_index_version
+
+_IN_BATCH = 500  # SQLite host parameters per IN (...) query
+_MATCHING_VERSION = 3  # bump when what is stored per block or how versions are matched changes
+
+_template_lock = threading.Lock()
+_template_fps = None
+
+
+def fingerprint(text):
+    """Short content hash that ignores whitespace differences."""
+    return hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()[:16]
+
+
+def block_fingerprints(blocks):
+    return [fingerprint(b["text"]) for b in blocks]
+
+
+def section_fingerprint(block_fps, section):
+    """Fingerprint of a section (block indices) from its blocks' fingerprints."""
+    return fingerprint(" ".join(block_fps[i] for i in section))
+
+
+def analysis_signature(prompt_templates):
+    """Everything besides the text that decides a document's findings.
+
+    Stored analyses only count as earlier versions when this matches, so editing a
+    prompt, switching model or rebuilding the index forces a full review.
+    """
+    payload = json.dumps([
+        prompt_templates, config.GROQ_MODEL, current_index_version(), config.EMBEDDINGS_BACKEND,
+        config.RETRIEVAL_MODE, config.RERANKER_MODEL if config.RERANKER_ENABLED else None,
+        config.COMPLIANCE_CHUNKING, config.COMPLIANCE_CHUNK_CHARS, config.PROMPT_TOKEN_BUDGETS,
+        config.PROMPT_TOKENIZER, _MATCHING_VERSION
+    ], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def template_fingerprints():
+    """Fingerprints of every block of the ADGM templates, plus the empty block (computed once)."""
+    global _template_fps
+    if _template_fps is None:
+        with _template_lock:
+            if _template_fps is None:
+                fps = {fingerprint("")}
+                for path in glob.glob(os.path.join(config.ADGM_SOURCES_DIR, "*.docx")):
+                    try:
+                        fps.update(block_fingerprints(docx_blocks.extract_blocks_from_file(path)))
+                    except Exception as e:
+                        print(f"⚠️ Could not read template {path} for version matching: {e}")
+                _template_fps = frozenset(fps)
+    return _template_fps
+
+
+def diff_blocks(previous_fps, current_fps):
+    """Block-level diff of two versions as counts of unchanged, changed, added and removed blocks."""
+    counts = {"unchanged": 0, "changed": 0, "added": 0, "removed": 0}
+    matcher = difflib.SequenceMatcher(None, previous_fps, current_fps, autojunk=False)
+    for op, a1, a2, b1, b2 in matcher.get_opcodes():
+        if op == "equal":
+            counts["unchanged"] += a2 - a1
+        elif op == "replace":
+            common = min(a2 - a1, b2 - b1)
+            counts["changed"] += common
+            counts["removed"] += (a2 - a1) - common
+            counts["added"] += (b2 - b1) - common
+        elif op == "delete":
+            counts["removed"] += a2 - a1
+        else:
+            counts["added"] += b2 - b1
+    return counts
+
+
+def _still_holds(finding, current_fps):
+    # Anchored findings concern their own section; the others any section of the chunk they came from
+    if finding.get("section_matched"):
+        return True
+    return bool(finding.get("chunk_fps")) and set(finding["chunk_fps"]) <= current_fps
+
+
+def carry_forward(previous, blocks, block_fps, sections):
+    """Split a revised document's sections into carried findings and sections to check again.
+
+    A section keeps the earlier version's findings (re-anchored, provenance
+    "carried_forward") when its fingerprint is unchanged. Findings anchored to
+    a clause (section_matched) go with their section; the others may concern
+    any section of the chunk they were found in, so they are kept only while
+    all of that chunk's sections (chunk_fps) are unchanged, and their section is
+    checked again otherwise. Returns (carried findings, sections to check).
+    """
+    current = {section_fingerprint(block_fps, section) for section in sections}
+    carried, changed = [], []
+    for section in sections:
+        prior = previous["sections"].get(section_fingerprint(block_fps, section))
+        if prior is None or not all(_still_holds(finding, current) for finding in prior):
+            changed.append(section)
+            continue
+        for finding in prior:
+            entry = dict(finding)
+            offset = min(entry.pop("block_offset", 0), len(section) - 1)
+            entry["block_id"] = blocks[section[offset]]["id"]
+            entry["provenance"] = "carried_forward"
+            entry["carried_from"] = finding.get("carried_from") or previous["filename"]
+            carried.append(entry)
+    return carried, changed
+
+
+class VersionStore:
+    """Persistent SQLite store of earlier analyses, looked up by block fingerprints.
+
+    Entries expire after `ttl_seconds`; beyond `max_entries` the oldest are dropped.
+    `common_fps` returns block fingerprints that never count as shared content
+    (defaults to none).
+    """
+
+    def __init__(self, path, max_entries, ttl_seconds, common_fps=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.common_fps = common_fps or frozenset
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS analyses ("
+            "id INTEGER PRIMARY KEY, document_fp TEXT, signature TEXT, filename TEXT, "
+            "n_blocks INTEGER, created_at REAL, result TEXT, scope TEXT NOT NULL DEFAULT '');"
+            "CREATE INDEX IF NOT EXISTS analyses_document ON analyses (document_fp, signature);"
+            "CREATE TABLE IF NOT EXISTS analysis_blocks (analysis_id INTEGER, block_fp TEXT);"
+            "CREATE INDEX IF NOT EXISTS analysis_blocks_fp ON analysis_blocks (block_fp);"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+        if "scope" not in columns:  # store created before scoped lookups
+            self._conn.execute("ALTER TABLE analyses ADD COLUMN scope TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+
+    def _distinct(self, block_fps):
+        return set(block_fps) - self.common_fps()
+
+    def _load(self, analysis_id, similarity, exact=False):
+        row = self._conn.execute(
+            "SELECT filename, created_at, result FROM analyses WHERE id = ?", (analysis_id,)
+        ).fetchone()
+        previous = json.loads(row[2])
+        previous.update({"filename": row[0], "analyzed_at": row[1], "similarity": round(similarity, 4),
+                         "exact": exact})
+        return previous
+
+    def find_previous(self, block_fps, signature, min_similarity, scope="", before=None):
+        """The closest earlier analysis of this document within `scope`, or None.
+
+        An identical block sequence wins outright ("exact"). Otherwise the
+        stored analysis sharing the most distinct blocks (common ones left out)
+        is returned when its Jaccard similarity reaches `min_similarity`. With
+        `before` (a timestamp), only analyses recorded earlier are considered.
+        """
+        if not block_fps:
+            return None
+        current = self._distinct(block_fps)
+        cutoff = time.time() - self.ttl_seconds
+        before = before if before is not None else float("inf")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM analyses WHERE document_fp = ? AND signature = ? AND scope = ? AND created_at >= ? "
+                "AND created_at < ? ORDER BY created_at DESC LIMIT 1",
+                (fingerprint(" ".join(block_fps)), signature, scope, cutoff, before)
+            ).fetchone()
+            if row is not None:
+                return self._load(row[0], 1.0, exact=True)
+
+            if not current:
+                return None
+
+            shared = {}
+            fps = list(current)
+            for start in range(0, len(fps), _IN_BATCH):
+                batch = fps[start:start + _IN_BATCH]
+                for analysis_id, count in self._conn.execute(
+                    "SELECT b.analysis_id, COUNT(*) FROM analysis_blocks b JOIN analyses a ON a.id = b.analysis_id "
+                    f"WHERE a.signature = ? AND a.scope = ? AND a.created_at >= ? AND a.created_at < ? "
+                    f"AND b.block_fp IN ({','.join('?' * len(batch))}) GROUP BY b.analysis_id",
+                    [signature, scope, cutoff, before] + batch
+                ):
+                    shared[analysis_id] = shared.get(analysis_id, 0) + count
+            if not shared:
+                return None
+            sizes = dict(self._conn.execute(
+                f"SELECT id, n_blocks FROM analyses WHERE id IN ({','.join('?' * len(shared))})", list(shared)
+            ).fetchall())
+            best_id, best = None, 0.0
+            for analysis_id, count in shared.items():
+                similarity = count / (len(current) + sizes[analysis_id] - count)
+                if similarity > best:
+                    best_id, best = analysis_id, similarity
+            if best < min_similarity:
+                return None
+            return self._load(best_id, best)
+
+    def record(self, block_fps, signature, filename, result, scope=""):
+        """Store an analysis under `scope`; `result` must be JSON-serializable."""
+        now = time.time()
+        distinct = self._distinct(block_fps)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO analyses (document_fp, signature, filename, n_blocks, created_at, result, scope) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (fingerprint(" ".join(block_fps)), signature, filename, len(distinct), now, json.dumps(result),
+                 scope)
+            )
+            self._conn.executemany(
+                "INSERT INTO analysis_blocks (analysis_id, block_fp) VALUES (?, ?)",
+                [(cursor.lastrowid, fp) for fp in distinct]
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # Drop expired analyses, then the oldest beyond the size cap, with their blocks
+        self._conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM analyses WHERE id IN ("
+            "SELECT id FROM analyses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self._conn.execute("DELETE FROM analysis_blocks WHERE analysis_id NOT IN (SELECT id FROM analyses)")
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses")
+            self._conn.execute("DELETE FROM analysis_blocks")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        return {"analyses": size}
+
+
+def _open_store():
+    if not config.DELTA_REVIEW:
+        return None
+    return VersionStore(
+        config.VERSION_STORE_PATH,
+        max_entries=config.VERSION_STORE_MAX_ENTRIES,
+        ttl_seconds=config.VERSION_STORE_TTL,
+        common_fps=template_fingerprints
+    )
+
+
+version_store = _open_store()
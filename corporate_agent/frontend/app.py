@@ -1,9 +1,14 @@
 import streamlit as st
 import json
+import time
 import requests
 
 # Backend API configuration
 BACKEND_URL = "http://127.0.0.1:7000"  # Change if backend is hosted elsewhere
+POLL_INTERVAL_SECONDS = 1.0
+REQUEST_TIMEOUT_SECONDS = 60  # per status / result / download request
+UPLOAD_TIMEOUT_SECONDS = 300
+JOB_TIMEOUT_SECONDS = 3600  # give up waiting for a job after this long
 
 # Page Config
 st.set_page_config(page_title="Corporate Agent", layout="wide")
@@ -14,6 +19,8 @@ if "combined_report" not in st.session_state:
     st.session_state.combined_report = None
 if "reviewed_docs" not in st.session_state:
     st.session_state.reviewed_docs = None
+if "reviewed_bytes" not in st.session_state:
+    st.session_state.reviewed_bytes = {}
 
 # File Upload Section
 uploaded_files = st.file_uploader(
@@ -33,15 +40,43 @@ if uploaded_files and st.button("🚀 Analyze Documents"):
     ]
 
     try:
-        response = requests.post(f"{BACKEND_URL}/analyze-documents", files=files_payload)
+        # Submit as a background job, then poll until it finishes
+        response = requests.post(f"{BACKEND_URL}/jobs", files=files_payload, timeout=UPLOAD_TIMEOUT_SECONDS)
 
-        if response.status_code != 200:
+        if response.status_code != 202:
             st.error(f"❌ API Error: {response.status_code} - {response.text}")
         else:
-            data = response.json()
-            # Save results in session state so they persist
-            st.session_state.combined_report = data.get("combined_report", {})
-            st.session_state.reviewed_docs = data.get("reviewed_docs", [])
+            job_id = response.json()["job_id"]
+            progress = st.progress(0.0, text="Queued...")
+            deadline = time.monotonic() + JOB_TIMEOUT_SECONDS
+            while True:
+                status = requests.get(f"{BACKEND_URL}/jobs/{job_id}", timeout=REQUEST_TIMEOUT_SECONDS)
+                if status.status_code == 404:
+                    raise RuntimeError("The backend no longer knows this job (expired or restarted); please resubmit")
+                status.raise_for_status()
+                job = status.json()
+                if "status" not in job:
+                    raise RuntimeError(f"Unexpected job status response: {job}")
+                total = max(job.get("documents_total", 1), 1)
+                done = job.get("documents_done", 0)
+                progress.progress(done / total, text=f"Analyzed {done}/{total} documents ({job.get('status')})")
+                if job.get("status") in ("completed", "failed"):
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"The analysis did not finish within {JOB_TIMEOUT_SECONDS}s")
+                time.sleep(POLL_INTERVAL_SECONDS)
+
+            # Small JSON report first; reviewed files are downloaded separately
+            result = requests.get(f"{BACKEND_URL}/jobs/{job_id}/result", params={"response_format": "links"},
+                                  timeout=REQUEST_TIMEOUT_SECONDS)
+            if result.status_code != 200:
+                st.error(f"❌ API Error: {result.status_code} - {result.text}")
+            else:
+                data = result.json()
+                # Save results in session state so they persist
+                st.session_state.combined_report = data.get("combined_report", {})
+                st.session_state.reviewed_docs = data.get("reviewed_docs", [])
+                st.session_state.reviewed_bytes = {}
 
     except Exception as e:
         st.error(f"❌ Error processing: {str(e)}")
@@ -54,6 +89,12 @@ if st.session_state.combined_report:
     st.subheader("🧾 Combined Analysis Report")
     st.json(combined_report)
 
+    for skipped in combined_report.get("skipped_documents", []):
+        st.warning(f"⚠️ Skipped {skipped['filename']}: {skipped['error']}")
+    for check in combined_report.get("skipped_checks", []):
+        st.warning(f"⚠️ The {check['check']} check of {check['filename']} ({check['section']}) could not run: "
+                   f"{check['error']}")
+
     st.subheader("⚠️ Compliance Issues Found")
     st.json(combined_report.get("issues_found", []))
 
@@ -63,7 +104,16 @@ if st.session_state.combined_report:
     st.subheader("⬇️ Reviewed Documents")
     for doc in reviewed_docs:
         fname = doc.get("filename", "reviewed.docx")
-        bytes_data = bytes.fromhex(doc.get("content", ""))
+        url = doc.get("download_url", "")
+        if url not in st.session_state.reviewed_bytes:
+            try:
+                download = requests.get(f"{BACKEND_URL}{url}", timeout=REQUEST_TIMEOUT_SECONDS)
+                download.raise_for_status()
+            except requests.RequestException as e:
+                st.error(f"❌ Could not download reviewed {fname}: {e}")
+                continue
+            st.session_state.reviewed_bytes[url] = download.content
+        bytes_data = st.session_state.reviewed_bytes[url]
         st.download_button(
             label=f"Download reviewed: {fname}",
             data=bytes_data,